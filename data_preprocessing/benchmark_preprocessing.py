@@ -0,0 +1,462 @@
+import bz2
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import islice
+import numpy as np
+import pandas as pd
+from data_preprocessing_utility import create_pair_id, create_pair_ids, split_dataset, run_pipeline, TripleWriter, UriFilter, RedirectionFixer, EntityFilter, PropertyFilter, EntitySet, PairSet
+from io_utility import read_triple_chunks, read_ntriples, read_table, write_table, open_text_file, parse_ntriples, decompression_command
+from uri_dictionary_utility import build_uri_dictionary, UriDictionary, UriEncoder
+from entity_types_utility import build_entity_types_index, EntityTypesIndex
+
+# Benchmarks for the functions in data_preprocessing_utility.py.
+# Run all benchmarks with "python benchmark_preprocessing.py" or pass the names of single benchmarks as arguments,
+# e.g. "python benchmark_preprocessing.py pair_ids".
+
+
+def random_triples(n_rows, n_entities=None, random_state=42):
+    """
+    Generates a dataframe of random triples with DBpedia-like URIs.
+
+    :param n_rows: number of triples
+    :type n_rows: int
+    :param n_entities: number of distinct entities (defaults to a tenth of the number of triples)
+    :type n_entities: int
+    :param random_state: seed of the random number generator
+    :type random_state: int
+    :return: dataframe with subject, predicate and object columns
+    """
+    if n_entities is None:
+        n_entities = max(n_rows // 10, 1)
+    rng = np.random.default_rng(random_state)
+    entities = pd.Series(np.arange(n_entities)).astype(str)
+    entities = ("http://dbpedia.org/resource/Entity_" + entities).to_numpy(dtype=object)
+    predicates = np.array([f"http://dbpedia.org/ontology/property{i}" for i in range(50)], dtype=object)
+    return pd.DataFrame({
+        "subject": entities[rng.integers(0, n_entities, n_rows)],
+        "predicate": predicates[rng.integers(0, len(predicates), n_rows)],
+        "object": entities[rng.integers(0, n_entities, n_rows)],
+    })
+
+
+def time_function(function, *args, **kwargs):
+    """
+    Returns the wall time in seconds of a single call of the function.
+    """
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def benchmark_pair_ids(n_rows=1000000, n_rows_apply=200000):
+    """
+    Compares the row-wise create_pair_id (applied with DataFrame.apply) with the vectorized create_pair_ids.
+    The apply path is measured on a smaller sample and extrapolated, because it is very slow.
+    """
+    triples = random_triples(n_rows)
+    sample = triples.iloc[:n_rows_apply]
+    # make sure both implementations create identical string IDs
+    assert (sample.apply(create_pair_id, axis=1) == create_pair_ids(sample["subject"], sample["object"])).all()
+
+    seconds_per_million = {
+        "apply (create_pair_id)": time_function(sample.apply, create_pair_id, axis=1) * 1000000 / n_rows_apply,
+        "vectorized string IDs": time_function(create_pair_ids, triples["subject"], triples["object"]) * 1000000 / n_rows,
+        "vectorized hashed IDs": time_function(create_pair_ids, triples["subject"], triples["object"], method="hash") * 1000000 / n_rows,
+    }
+    baseline = seconds_per_million["apply (create_pair_id)"]
+    print("\npair IDs\nmethod\t\t\t\tseconds per million rows\tspeedup")
+    for method, seconds in seconds_per_million.items():
+        print(f"{method:<32}{seconds:.3f}\t\t\t\t{baseline / seconds:.1f}x")
+
+
+def write_ttl(triples, filepath):
+    """
+    Writes triples in the N-Triples format of the DBpedia dumps.
+    """
+    with open(filepath, "w", encoding="utf-8") as f:
+        f.write("# started 2022-12-01T00:00:00Z\n")
+        f.writelines(f"<{s}> <{p}> <{o}> .\n" for s, p, o in zip(triples["subject"], triples["predicate"], triples["object"]))
+        f.write("# completed 2022-12-01T00:00:00Z\n")
+
+
+def benchmark_ttl_reader(n_rows=1000000, chunksize=200000):
+    """
+    Measures the throughput (MB/s) of read_ntriples and of the previous pandas path
+    (pd.read_csv with sep=" " followed by removing "<" and ">" from every column).
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filepath = os.path.join(temp_dir, "triples.ttl")
+        write_ttl(random_triples(n_rows), filepath)
+        size_mb = os.path.getsize(filepath) / 1000000
+
+        def read_pandas():
+            for chunk in pd.read_csv(filepath, sep=" ", header=None, names=["subject", "predicate", "object", "."], chunksize=chunksize, comment="#"):
+                chunk = chunk.drop(columns=".")
+                for col in chunk.columns:
+                    chunk[col] = chunk[col].str[1:-1]
+
+        def read_tokenizer():
+            for chunk in read_ntriples(filepath, chunksize=chunksize):
+                pass
+
+        print(f"\nTTL reader ({size_mb:.1f} MB, {n_rows} triples)\nreader\t\t\t\tMB/s")
+        for name, reader in [("pandas read_csv + str[1:-1]", read_pandas), ("read_ntriples", read_tokenizer)]:
+            print(f"{name:<32}{size_mb / time_function(reader):.1f}")
+
+
+def benchmark_compressed_reader(n_rows=1000000, chunksize=200000):
+    """
+    Measures the throughput (MB/s of uncompressed text) of reading a bz2 compressed TTL file: decompressing the file
+    with "bzip2 -d" before reading it (as in neo4j_setup.sh), streaming it through the installed decompression tool
+    (see io_utility.DECOMPRESSION_COMMANDS) and streaming it through the bz2 module. Reading the uncompressed file is
+    measured as reference.
+    """
+    def read_stream(filepath, use_decompression_tools=True):
+        with open_text_file(filepath, use_decompression_tools=use_decompression_tools) as f:
+            while True:
+                lines = list(islice(f, chunksize))
+                if len(lines) == 0:
+                    break
+                parse_ntriples("".join(lines))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filepath = os.path.join(temp_dir, "triples.ttl")
+        write_ttl(random_triples(n_rows), filepath)
+        size_mb = os.path.getsize(filepath) / 1000000
+        with open(filepath, "rb") as source, bz2.open(filepath + ".bz2", "wb") as target:
+            shutil.copyfileobj(source, target)
+        compressed_size_mb = os.path.getsize(filepath + ".bz2") / 1000000
+
+        def decompress_and_read():
+            decompressed_filepath = os.path.join(temp_dir, "decompressed.ttl")
+            with open(decompressed_filepath, "wb") as f:
+                subprocess.run(["bzip2", "-d", "-c", filepath + ".bz2"], stdout=f, check=True)
+            read_stream(decompressed_filepath)
+            os.remove(decompressed_filepath)
+
+        methods = [("uncompressed file", lambda: read_stream(filepath))]
+        if shutil.which("bzip2") is not None:
+            methods.append(("bzip2 -d + read", decompress_and_read))
+        command = decompression_command("bz2")
+        if command is not None:
+            methods.append((f"streaming ({command[0]})", lambda: read_stream(filepath + ".bz2")))
+        methods.append(("streaming (bz2 module)", lambda: read_stream(filepath + ".bz2", use_decompression_tools=False)))
+
+        print(f"\ncompressed TTL reader ({size_mb:.1f} MB, {compressed_size_mb:.1f} MB compressed, {n_rows} triples)\nmethod\t\t\t\tMB/s")
+        for name, method in methods:
+            print(f"{name:<32}{size_mb / time_function(method):.1f}")
+
+
+def benchmark_parallel_pipeline(n_rows=4000000, chunksize=200000, n_workers_list=(1, 2, 4, 8)):
+    """
+    Measures the scaling of run_pipeline with the number of worker processes. The pipeline filters URIs,
+    fixes redirections and filters entities (the per-chunk work of the preprocessing functions) and writes
+    the result to a CSV file. The outputs of all runs are compared with the serial run.
+    """
+    triples = random_triples(n_rows)
+    entities = pd.unique(triples[["subject", "object"]].to_numpy().ravel())
+    redirections = pd.Series(pd.Categorical(entities[1::10]), index=entities[::10][:len(entities[1::10])], name="redirection")
+    operators = [
+        UriFilter(exclude_patterns=["__CareerStation__"]),
+        RedirectionFixer(redirections),
+        EntityFilter(entities[::2]),
+    ]
+    print(f"\nparallel pipeline ({n_rows} triples, {os.cpu_count()} cores available)\nworkers\tseconds\tspeedup")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        serial_output = None
+        baseline = None
+        for n_workers in n_workers_list:
+            filepath = os.path.join(temp_dir, f"output_{n_workers}.csv")
+            chunks = (triples.iloc[i:i+chunksize] for i in range(0, n_rows, chunksize))
+            seconds = time_function(run_pipeline, chunks, operators, [TripleWriter(filepath)], n_workers=n_workers)
+            with open(filepath, "rb") as f:
+                output = f.read()
+            if serial_output is None:
+                serial_output = output
+                baseline = seconds
+            assert output == serial_output
+            print(f"{n_workers}\t{seconds:.2f}\t{baseline / seconds:.2f}x")
+
+
+def benchmark_storage_formats(n_rows=2000000, n_pairs=20000, n_properties=300):
+    """
+    Compares the disk footprint and load time of CSV, Parquet and Arrow files (see io_utility.write_table) for
+    a triples dataset and for a matrix of property scores like the *_scores.csv files.
+    """
+    scores = random_triples(n_pairs)[["subject", "object"]]
+    rng = np.random.default_rng(42)
+    scores = pd.concat([scores, pd.DataFrame(rng.random((n_pairs, n_properties)), columns=[f"property{i}" for i in range(n_properties)])], axis=1)
+    datasets = {"triples": random_triples(n_rows), "scores": scores}
+    print("\nstorage formats\ndataset\tformat\t\tMB\tload seconds")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, df in datasets.items():
+            for extension in [".csv", ".parquet", ".arrow"]:
+                filepath = os.path.join(temp_dir, name + extension)
+                write_table(df, filepath)
+                seconds = time_function(read_table, filepath)
+                assert read_table(filepath).shape == df.shape
+                print(f"{name}\t{extension}\t{os.path.getsize(filepath) / 1000000:.1f}\t{seconds:.2f}")
+
+
+def benchmark_uri_dictionary(n_rows=1000000):
+    """
+    Compares the memory usage of a chunk of triples and the time of the filter operators for URIs and
+    for int32 IDs of the URI dictionary (see uri_dictionary_utility.py).
+    """
+    triples = random_triples(n_rows)
+    entities = pd.unique(triples[["subject", "object"]].to_numpy().ravel())
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filepath = os.path.join(temp_dir, "triples.csv")
+        triples.to_csv(filepath, index=False)
+        dictionary_dirpath = os.path.join(temp_dir, "uri_dictionary")
+        build_seconds = time_function(build_uri_dictionary, [filepath], ["csv"], dictionary_dirpath)
+        uri_dictionary = UriDictionary(dictionary_dirpath)
+        start = time.perf_counter()
+        encoded, _ = UriEncoder(uri_dictionary)(triples)
+        encode_seconds = time.perf_counter() - start
+
+        predicates = triples["predicate"].unique()[::2]
+        print(f"\nURI dictionary ({n_rows} triples, {len(uri_dictionary)} URIs)")
+        print(f"build: {build_seconds:.2f} seconds, encoding: {encode_seconds:.2f} seconds")
+        print("chunk\t\tMB\tfilter seconds")
+        for name, chunk, dictionary in [("URIs", triples, None), ("int32 IDs", encoded, uri_dictionary)]:
+            operators = [
+                UriFilter(["^http://dbpedia.org/resource/"], uri_dictionary=dictionary),
+                PropertyFilter(predicates, uri_dictionary=dictionary),
+                EntityFilter(entities[::2] if dictionary is None else dictionary.encode(entities[::2])),
+            ]
+            start = time.perf_counter()
+            for operator in operators:
+                operator(chunk)
+            seconds = time.perf_counter() - start
+            print(f"{name:<16}{chunk.memory_usage(deep=True).sum() / 1000000:.1f}\t{seconds:.2f}")
+
+
+def benchmark_entity_set(n_rows=2000000, n_entities=1000000, chunksize=100000):
+    """
+    Compares building the entity set with np.union1d per chunk and filtering with two merges (the previous
+    filter_entities) with building an EntitySet and filtering with membership tests.
+    """
+    triples = random_triples(n_rows, n_entities)
+    chunks = [triples.iloc[i:i+chunksize] for i in range(0, n_rows, chunksize)]
+    entities_df = pd.Series(pd.unique(triples["subject"]), name="entity")
+
+    def build_union1d():
+        entities = np.array([])
+        for chunk in chunks:
+            entities = np.union1d(entities, np.union1d(chunk["subject"].unique(), chunk["object"].unique()))
+        return entities
+
+    def filter_merge():
+        for chunk in chunks:
+            chunk = chunk.merge(entities_df, left_on="subject", right_on="entity").drop(columns="entity")
+            chunk.merge(entities_df, left_on="object", right_on="entity").drop(columns="entity")
+
+    print(f"\nentity set ({n_rows} triples, {n_entities} entities, {len(chunks)} chunks)\nmethod\t\t\t\tbuild seconds\tfilter seconds\tMB")
+    entities = build_union1d()
+    print(f"{'union1d + merge':<32}{time_function(build_union1d):.2f}\t\t{time_function(filter_merge):.2f}\t\t{entities.nbytes / 1000000:.1f} (+ strings)")
+    for hashed in [True, False]:
+        def build_entity_set():
+            entity_set = EntitySet(hashed=hashed)
+            for chunk in chunks:
+                entity_set.add(chunk["subject"])
+                entity_set.add(chunk["object"])
+            entity_set.compact()
+            return entity_set
+        entity_set = build_entity_set()
+        query_set = EntitySet(hashed=hashed)
+        query_set.add(entities_df)
+        query_set.compact()
+
+        def filter_entity_set():
+            for chunk in chunks:
+                chunk = chunk[query_set.contains(chunk["subject"])]
+                chunk[query_set.contains(chunk["object"])]
+
+        name = "EntitySet (hashed)" if hashed else "EntitySet (URIs)"
+        size = f"{entity_set.nbytes / 1000000:.1f}" + ("" if hashed else " (+ strings)")
+        print(f"{name:<32}{time_function(build_entity_set):.2f}\t\t{time_function(filter_entity_set):.2f}\t\t{size}")
+
+
+def benchmark_split(n_rows=1000000, n_properties=300):
+    """
+    Compares the runtime and the drift of the property shares (printed by split_dataset) of the exact and the
+    streaming split on triples with Zipf-distributed properties.
+    """
+    triples = random_triples(n_rows)
+    rng = np.random.default_rng(42)
+    weights = 1 / np.arange(1, n_properties + 1) ** 1.2
+    properties = np.array([f"http://dbpedia.org/ontology/property{i}" for i in range(n_properties)], dtype=object)
+    triples["predicate"] = properties[rng.choice(n_properties, n_rows, p=weights / weights.sum())]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filepath = os.path.join(temp_dir, "triples.csv")
+        triples.to_csv(filepath, index=False)
+        seconds = {}
+        for method in ["exact", "streaming"]:
+            print(f"\n{method} split")
+            split_filepaths = [os.path.join(temp_dir, f"{method}_{part}.csv") for part in ["train", "val", "test"]]
+            seconds[method] = time_function(split_dataset, filepath, *split_filepaths, method=method, chunksize=200000)
+    print(f"\nsplit ({n_rows} triples, {n_properties} properties)\nmethod\t\tseconds")
+    for method, method_seconds in seconds.items():
+        print(f"{method}\t\t{method_seconds:.2f}")
+
+
+def peak_memory(function, *args, **kwargs):
+    """
+    Returns the wall time in seconds and the peak memory in MB (allocations traced by tracemalloc, including
+    numpy arrays) of a single call of the function.
+    """
+    tracemalloc.start()
+    seconds = time_function(function, *args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 1000000
+
+
+def benchmark_pair_set(n_pairs=100000000, n_pairs_concat=2000000, n_queries=10000000, chunksize=2000000):
+    """
+    Compares collecting string pair IDs with pd.concat (the previous read_entity_pairs) with building a PairSet
+    in memory and spilled to disk. The pair keys of the PairSet are generated chunk by chunk, so only the pair
+    set itself counts towards the peak memory. The previous method is only run for n_pairs_concat pairs.
+    """
+    print(f"\npair set\nmethod\t\t\t\tpairs\t\tbuild seconds\tpeak MB\t\tquery seconds ({n_queries} pairs)")
+
+    triples = random_triples(n_pairs_concat, n_entities=n_pairs_concat)
+    chunks = [triples.iloc[i:i+chunksize] for i in range(0, n_pairs_concat, chunksize)]
+
+    def build_concat():
+        entity_pairs = pd.Series(name="pair_id")
+        for chunk in chunks:
+            chunk = create_pair_ids(chunk["subject"], chunk["object"]).drop_duplicates(ignore_index=True)
+            entity_pairs = pd.concat([entity_pairs, chunk])
+        return entity_pairs
+
+    seconds, peak = peak_memory(build_concat)
+    print(f"{'concat string IDs':<32}{n_pairs_concat}\t\t{seconds:.2f}\t\t{peak:.0f}")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for spill_dirpath in [None, temp_dir]:
+            pair_set = None
+
+            def build_pair_set():
+                nonlocal pair_set
+                pair_set = PairSet(spill_dirpath=spill_dirpath)
+                for start in range(0, n_pairs, chunksize):
+                    rng = np.random.default_rng(start)
+                    pair_set.add_keys(rng.integers(0, 2**64, min(chunksize, n_pairs - start), dtype=np.uint64))
+                pair_set.compact()
+
+            seconds, peak = peak_memory(build_pair_set)
+            queries = np.random.default_rng(-1 % 2**32).integers(0, 2**64, n_queries, dtype=np.uint64)
+            query_seconds = time_function(pair_set.contains_keys, queries)
+            name = "PairSet (memory)" if spill_dirpath is None else "PairSet (spilled)"
+            print(f"{name:<32}{len(pair_set)}\t{seconds:.2f}\t\t{peak:.0f}\t\t{query_seconds:.2f}")
+            del pair_set
+
+
+def benchmark_uri_filter(n_rows=2000000, chunksize=500000):
+    """
+    Compares the former two passes of filter_triples_by_uri (regex search for the DBpedia namespace, then for career
+    stations, with an intermediate file) with one pass that checks the prefix and the substring together.
+    """
+    triples = random_triples(n_rows)
+    rng = np.random.default_rng(42)
+    outside = rng.random(n_rows) < 0.02
+    triples.loc[outside, "object"] = "http://www.wikidata.org/entity/Q" + pd.Series(np.flatnonzero(outside)).astype(str).to_numpy()
+    career_station = rng.random(n_rows) < 0.08
+    triples.loc[career_station, "object"] = triples.loc[career_station, "subject"] + "__CareerStation__1"
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filepath = os.path.join(temp_dir, "triples.csv")
+        triples.to_csv(filepath, index=False)
+
+        def two_passes():
+            for input_filepath, output_filepath, uri_filter in [
+                (filepath, os.path.join(temp_dir, "no_outside.csv"), UriFilter(["http://dbpedia.org/resource/"], regex=True)),
+                (os.path.join(temp_dir, "no_outside.csv"), os.path.join(temp_dir, "two_passes.csv"), UriFilter(exclude_patterns=["__CareerStation__"], regex=True))
+            ]:
+                writer = TripleWriter(output_filepath)
+                run_pipeline(read_triple_chunks(input_filepath, "csv", chunksize), [uri_filter], [writer])
+                writer.close()
+
+        def one_pass():
+            writer = TripleWriter(os.path.join(temp_dir, "one_pass.csv"))
+            uri_filter = UriFilter(["^http://dbpedia.org/resource/"], ["__CareerStation__"])
+            run_pipeline(read_triple_chunks(filepath, "csv", chunksize), [uri_filter], [writer])
+            writer.close()
+
+        two_passes_seconds = time_function(two_passes)
+        one_pass_seconds = time_function(one_pass)
+        same = pd.read_csv(os.path.join(temp_dir, "two_passes.csv")).equals(pd.read_csv(os.path.join(temp_dir, "one_pass.csv")))
+    print(f"\nURI filter ({n_rows} triples)\nmethod\t\t\tseconds")
+    print(f"two regex passes\t{two_passes_seconds:.2f}")
+    print(f"one pass\t\t{one_pass_seconds:.2f}")
+    print(f"same result: {same}")
+
+
+def benchmark_entity_types_index(n_entities=1000000, n_types=800, n_lookups=50000, chunksize=200000):
+    """
+    Compares looking up the types of a batch of entities by scanning the types file (like read_entity_types in
+    post_processing_utility.py) with the entity types index (see entity_types_utility.py). The first lookup of a
+    loaded index (cold) includes loading the URI dictionary, the following lookups (warm) don't.
+    """
+    rng = np.random.default_rng(42)
+    n_entity_types = rng.integers(1, 6, n_entities)
+    types = pd.DataFrame({
+        "subject": np.repeat([f"http://dbpedia.org/resource/Entity_{i}" for i in range(n_entities)], n_entity_types),
+        "predicate": "http://www.w3.org/1999/02/22-rdf-syntax-ns#type",
+        "object": [f"http://dbpedia.org/ontology/Type{i}" for i in rng.integers(0, n_types, n_entity_types.sum())]
+    })
+    entities = pd.unique(rng.choice(types["subject"].to_numpy(), n_lookups))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filepath = os.path.join(temp_dir, "types.ttl")
+        write_ttl(types, filepath)
+        index_dirpath = os.path.join(temp_dir, "entity_types_index")
+
+        def scan():
+            lookup = pd.Series(entities, name="entity")
+            chunks = [
+                chunk.drop(columns="predicate").rename(columns={"subject": "entity", "object": "entity_type"}).merge(lookup, on="entity")
+                for chunk in read_ntriples(filepath, chunksize=chunksize)
+            ]
+            return pd.concat(chunks, ignore_index=True)
+
+        scan_seconds = time_function(scan)
+        build_seconds = time_function(build_entity_types_index, {"specific": filepath}, index_dirpath)
+        index = EntityTypesIndex(index_dirpath, "specific")
+        cold_seconds = time_function(index.lookup, entities)
+        warm_seconds = time_function(index.lookup, entities)
+        same = scan().drop_duplicates().sort_values(["entity", "entity_type"], ignore_index=True).equals(
+            index.lookup(entities).sort_values(["entity", "entity_type"], ignore_index=True)
+        )
+    print(f"\nentity types ({len(types)} type triples, lookup of {len(entities)} entities)\nmethod\t\t\tseconds")
+    print(f"scan types file\t\t{scan_seconds:.3f}")
+    print(f"build index\t\t{build_seconds:.3f}")
+    print(f"cold index lookup\t{cold_seconds:.3f}")
+    print(f"warm index lookup\t{warm_seconds:.3f}")
+    print(f"same result: {same}")
+
+
+BENCHMARKS = {
+    "pair_ids": benchmark_pair_ids,
+    "ttl_reader": benchmark_ttl_reader,
+    "uri_filter": benchmark_uri_filter,
+    "compressed_reader": benchmark_compressed_reader,
+    "parallel_pipeline": benchmark_parallel_pipeline,
+    "storage_formats": benchmark_storage_formats,
+    "uri_dictionary": benchmark_uri_dictionary,
+    "entity_set": benchmark_entity_set,
+    "split": benchmark_split,
+    "pair_set": benchmark_pair_set,
+    "entity_types_index": benchmark_entity_types_index,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] if len(sys.argv) > 1 else list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
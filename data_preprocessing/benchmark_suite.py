@@ -0,0 +1,278 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+from data_preprocessing_utility import (
+    filter_triples_by_uri, fix_redirections, filter_properties, filter_entities, remove_entity_pairs, split_dataset,
+    concat_files, create_binary_triples, preprocess_datasets
+)
+from instrumentation_utility import enable_instrumentation, disable_instrumentation
+from synthetic_data_utility import generate_synthetic_datasets, DATASET_FILENAMES
+
+# Benchmark suite that runs all pre-processing functions of data_preprocessing_utility.py on synthetic datasets
+# (see synthetic_data_utility.py) of several sizes and stores the measurements of the instrumentation (wall and CPU
+# time, rows, bytes and peak RSS per step) as JSON file, so the results of two versions of the code can be compared.
+#
+# Run the suite with "python benchmark_suite.py run [n_triples ...]" (defaults to 1M, 10M and 100M triples) and
+# compare two result files with "python benchmark_suite.py compare <baseline_filepath> <results_filepath>".
+
+SCALES = [1000000, 10000000, 100000000]
+RESULTS_DIRPATH = "benchmark_results"
+
+
+def suite_steps(data, temp):
+    """
+    Returns the steps of the suite as list of tuples of a step name, a function and its arguments. The steps follow
+    the data_preprocessing.ipynb notebook and additionally run the streaming split, remove_entity_pairs,
+    create_binary_triples and preprocess_datasets.
+
+    :param data: dictionary with the file paths of the synthetic datasets (see generate_synthetic_datasets)
+    :type data: dict
+    :param temp: function that returns the file path of a file name in the temporary directory
+    :type temp: function
+    :return: list of steps
+    """
+    steps = [
+        ("filter_triples_by_uri", filter_triples_by_uri, dict(
+            dataset_filepath=data["remaining_triples"],
+            processed_dataset_filepath=temp("remaining_triples_filtered_uris.csv"),
+            include_patterns=["^http://dbpedia.org/resource/"],
+            exclude_patterns=["__CareerStation__"]
+        )),
+    ]
+    for name, dataset_filepath in [
+        ("mw_bs", data["mw_both_sides"]),
+        ("mw_os", data["mw_one_side"]),
+        ("mw_no_props", data["mw_no_props"]),
+        ("remaining_triples", temp("remaining_triples_filtered_uris.csv"))
+    ]:
+        steps.append((f"fix_redirections_{name}", fix_redirections, dict(
+            dataset_filepath=dataset_filepath,
+            redirections_filepath=data["redirections"],
+            processed_dataset_filepath=temp(f"{name}_fixed_redirects.csv"),
+            redirections_filetype="ttl",
+            redirections_index_filepath=temp("redirections_index.pkl")
+        )))
+    steps.append(("fix_redirections_types", fix_redirections, dict(
+        dataset_filepath=data["types"],
+        redirections_filepath=data["redirections"],
+        processed_dataset_filepath=temp("types_fixed_redirects.csv"),
+        subjects_only=True,
+        dataset_filetype="ttl",
+        redirections_filetype="ttl",
+        redirections_index_filepath=temp("redirections_index.pkl")
+    )))
+    for name in ["mw_bs", "mw_os", "remaining_triples"]:
+        steps.append((f"filter_properties_{name}", filter_properties, dict(
+            properties_dataset_filepath=temp(f"{name}_fixed_redirects.csv"),
+            filtered_property_types_filepath=data["filtered_property_types"],
+            processed_dataset_filepath=temp(f"filtered_props_{name}.csv")
+        )))
+    steps.append(("remove_entity_pairs_remaining_triples", remove_entity_pairs, dict(
+        dataset_filepath=temp("filtered_props_remaining_triples.csv"),
+        pairs_dataset_filepath=temp("filtered_props_mw_bs.csv"),
+        processed_dataset_filepath=temp("removed_pairs_remaining_triples.csv")
+    )))
+    for name, dataset_filepath, filter_subject_only in [
+        ("mw_bs", temp("filtered_props_mw_bs.csv"), False),
+        ("mw_os", temp("filtered_props_mw_os.csv"), False),
+        ("mw_no_props", temp("mw_no_props_fixed_redirects.csv"), False),
+        ("types", temp("types_fixed_redirects.csv"), True)
+    ]:
+        steps.append((f"filter_entities_{name}", filter_entities, dict(
+            dataset_filepath=dataset_filepath,
+            entities_dataset_filepath=temp("filtered_props_remaining_triples.csv"),
+            processed_dataset_filepath=temp(f"filtered_entities_{name}.csv"),
+            filter_subject_only=filter_subject_only
+        )))
+    for name in ["mw_bs", "mw_os"]:
+        steps.append((f"split_dataset_{name}", split_dataset, dict(
+            dataset_filepath=temp(f"filtered_entities_{name}.csv"),
+            trainset_filepath=temp(f"train_{name}.csv"),
+            valset_filepath=temp(f"val_{name}.csv"),
+            testset_filepath=temp(f"test_{name}.csv")
+        )))
+    steps.append(("split_dataset_streaming_mw_bs", split_dataset, dict(
+        dataset_filepath=temp("filtered_entities_mw_bs.csv"),
+        trainset_filepath=temp("streaming_train_mw_bs.csv"),
+        valset_filepath=temp("streaming_val_mw_bs.csv"),
+        testset_filepath=temp("streaming_test_mw_bs.csv"),
+        method="streaming"
+    )))
+    for name, filepaths in [
+        ("train", ["filtered_props_remaining_triples.csv", "filtered_entities_types.csv", "train_mw_bs.csv", "train_mw_os.csv"]),
+        ("val", ["val_mw_bs.csv", "val_mw_os.csv"]),
+        ("test", ["test_mw_bs.csv", "test_mw_os.csv"])
+    ]:
+        steps.append((f"concat_files_{name}", concat_files, dict(
+            filepaths=[temp(filepath) for filepath in filepaths],
+            filetypes=["csv"] * len(filepaths),
+            processed_dataset_filepath=temp(f"{name}.tsv")
+        )))
+    steps.append(("create_binary_triples", create_binary_triples, dict(
+        train_filepath=temp("train.tsv"),
+        val_filepath=temp("val.tsv"),
+        test_filepath=temp("test.tsv"),
+        binary_dirpath=temp("binary_triples")
+    )))
+    os.makedirs(temp("streaming_results"), exist_ok=True)
+    steps.append(("preprocess_datasets", preprocess_datasets, dict(
+        mw_both_sides_filepath=data["mw_both_sides"],
+        mw_one_side_filepath=data["mw_one_side"],
+        mw_no_props_filepath=data["mw_no_props"],
+        remaining_triples_filepath=data["remaining_triples"],
+        types_filepath=data["types"],
+        filtered_property_types_filepath=data["filtered_property_types"],
+        redirections_filepath=data["redirections"],
+        results_dir_filepath=temp("streaming_results")
+    )))
+    return steps
+
+
+def synthetic_data(n_triples, data_dirpath):
+    """
+    Returns the file paths of the synthetic datasets with n_triples triples in the data directory. The datasets are
+    only generated if they don't exist yet.
+    """
+    dirpath = os.path.join(data_dirpath, f"synthetic_{n_triples}")
+    filepaths = {name: os.path.join(dirpath, filename) for name, filename in DATASET_FILENAMES.items()}
+    if all(os.path.isfile(filepath) for filepath in filepaths.values()):
+        return filepaths
+    print(f"\ngenerate synthetic datasets with {n_triples} triples...")
+    return generate_synthetic_datasets(dirpath, n_triples=n_triples)
+
+
+def run_steps(steps, n_triples):
+    """
+    Runs the steps with enabled instrumentation and returns one result per step (the measurement of the outermost
+    stage of the step).
+    """
+    results = []
+    recorder = enable_instrumentation()
+    try:
+        for step, function, kwargs in steps:
+            print(f"\n[{n_triples} triples] {step}")
+            n_records = len(recorder.records)
+            function(**kwargs)
+            records = [record for record in recorder.records[n_records:] if record["level"] == "stage"]
+            # nested stages (e.g. read_redirections) are recorded before the stage that calls them
+            record = [record for record in records if record["stage"] == function.__name__][-1]
+            results.append({
+                "n_triples": n_triples,
+                "step": step,
+                "function": function.__name__,
+                "wall_seconds": record["wall_seconds"],
+                "cpu_seconds": record["cpu_seconds"],
+                "rows_in": record["rows_in"],
+                "rows_out": record["rows_out"],
+                "rows_per_second": round(record["rows_in"] / record["wall_seconds"], 1) if record["wall_seconds"] > 0 else None,
+                "bytes_read": record["bytes_read"],
+                "bytes_written": record["bytes_written"],
+                "peak_rss_mb": record["peak_rss_mb"]
+            })
+    finally:
+        disable_instrumentation()
+    return results
+
+
+def environment_info():
+    """
+    Returns information about the environment of a benchmark run (git commit, python version and hardware).
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def run_benchmark_suite(scales=SCALES, results_filepath=None, data_dirpath=None):
+    """
+    This function is used to run all pre-processing functions on synthetic datasets of several sizes and store the
+    measurements of every step as JSON file. The synthetic datasets are kept in the data directory (if provided), so
+    later runs measure the code on the same data, otherwise they are generated in a temporary directory.
+
+    :param scales: numbers of property triples of the synthetic datasets
+    :type scales: list
+    :param results_filepath: file path of the JSON results file (defaults to a file with a timestamp in benchmark_results)
+    :type results_filepath: str
+    :param data_dirpath: optional directory in which the synthetic datasets are kept
+    :type data_dirpath: str
+    :return: dataframe with one row per scale and step
+    """
+    if results_filepath is None:
+        os.makedirs(RESULTS_DIRPATH, exist_ok=True)
+        results_filepath = os.path.join(RESULTS_DIRPATH, f"benchmark_suite_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    results = []
+    for n_triples in scales:
+        with tempfile.TemporaryDirectory() as temp_dirpath:
+            data = synthetic_data(n_triples, data_dirpath if data_dirpath is not None else temp_dirpath)
+            output_dirpath = os.path.join(temp_dirpath, "outputs")
+            os.makedirs(output_dirpath)
+            steps = suite_steps(data, lambda filename: os.path.join(output_dirpath, filename))
+            results.extend(run_steps(steps, n_triples))
+        # results are stored after every scale, so they are kept if a larger scale fails
+        with open(results_filepath, "w") as f:
+            json.dump({"environment": environment_info(), "results": results}, f, indent=1)
+    print(f"\nresults are stored in {results_filepath}")
+    results = pd.DataFrame(results)
+    print(results[["n_triples", "step", "wall_seconds", "cpu_seconds", "rows_per_second", "peak_rss_mb"]].to_string(index=False))
+    return results
+
+
+def read_benchmark_results(results_filepath):
+    """
+    Reads the results of a run of the benchmark suite as dataframe.
+    """
+    with open(results_filepath) as f:
+        return pd.DataFrame(json.load(f)["results"])
+
+
+def compare_benchmark_results(baseline_filepath, results_filepath, tolerance=0.1):
+    """
+    This function is used to compare the results of two runs of the benchmark suite. Steps whose wall time or peak
+    RSS increased by more than the tolerance are marked as regressions.
+
+    :param baseline_filepath: file path of the JSON results of the baseline run
+    :type baseline_filepath: str
+    :param results_filepath: file path of the JSON results of the compared run
+    :type results_filepath: str
+    :param tolerance: relative increase that is not considered a regression
+    :type tolerance: float
+    :return: dataframe with the wall times, peak RSS and their ratios per scale and step
+    """
+    baseline = read_benchmark_results(baseline_filepath)
+    results = read_benchmark_results(results_filepath)
+    comparison = baseline.merge(results, on=["n_triples", "step"], suffixes=("_baseline", ""))
+    comparison["wall_ratio"] = (comparison["wall_seconds"] / comparison["wall_seconds_baseline"]).round(2)
+    comparison["rss_ratio"] = (comparison["peak_rss_mb"] / comparison["peak_rss_mb_baseline"]).round(2)
+    comparison["regression"] = (comparison["wall_ratio"] > 1 + tolerance) | (comparison["rss_ratio"] > 1 + tolerance)
+    comparison = comparison[[
+        "n_triples", "step", "wall_seconds_baseline", "wall_seconds", "wall_ratio",
+        "peak_rss_mb_baseline", "peak_rss_mb", "rss_ratio", "regression"
+    ]]
+    print(comparison.to_string(index=False))
+    print(f"\n{comparison['regression'].sum()} of {len(comparison)} steps regressed by more than {tolerance:.0%}")
+    return comparison
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "compare":
+        compare_benchmark_results(sys.argv[2], sys.argv[3])
+    else:
+        scales = [int(n_triples) for n_triples in sys.argv[2:]] if len(sys.argv) > 2 else SCALES
+        run_benchmark_suite(scales)
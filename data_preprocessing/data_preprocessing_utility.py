@@ -1,28 +1,851 @@
+import csv
+import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import StratifiedGroupKFold
+from io_utility import FILETYPES, read_triple_chunks, storage_format, read_table, write_table, ColumnarWriter
+from uri_dictionary_utility import build_uri_dictionary, update_uri_dictionary, UriDictionary, UriEncoder, decode_triples
+from instrumentation_utility import instrumented, instrumentation_enabled, start_measurement, finish_measurement, discard_measurement, current_stage, add_stage_rows
+
+
+# length of the "http://dbpedia.org/resource/" prefix that is removed from URIs in string pair IDs
+URI_PREFIX_LENGTH = 28
 
 
 def create_pair_id(row):
     """
     Creates a columns with an ID for an entity pair, regardless of their position in the triple.
     This function is designed to be applied on the rows of a pandas dataframe with the apply function.
+    It is kept for compatibility, create_pair_ids computes the same IDs for whole columns at once.
     """
-    subject_id = row["subject"][28:]
-    object_id = row["object"][28:]
+    subject_id = row["subject"][URI_PREFIX_LENGTH:]
+    object_id = row["object"][URI_PREFIX_LENGTH:]
     return "+".join(sorted([subject_id, object_id]))
 
 
+def hash_uris(uris):
+    """
+    Hashes URIs to 64-bit integers. The hashes are deterministic, so they can be compared across chunks,
+    files and runs.
+
+    :param uris: URIs that are hashed
+    :type uris: pd.Series or np.ndarray
+    :return: numpy array of unsigned 64-bit integers
+    """
+    # categorize=False hashes every value directly, which gives the same hashes but is faster for mostly unique URIs
+    return pd.util.hash_array(np.asarray(uris, dtype=object), categorize=False)
+
+
+def create_pair_ids(subjects, objects, method="string"):
+    """
+    Creates IDs for entity pairs, regardless of their position in the triple, for whole columns at once.
+    This is the vectorized counterpart of create_pair_id.
+
+    With method="string" the IDs are identical to the ones that are created by create_pair_id.
+    With method="hash" the IDs are 64-bit integers that are derived from hashes of both URIs. They
+    are a lot cheaper to compute, compare and store, but distinct pairs can collide with a small
+    probability (roughly n^2 / 2^65 for n distinct pairs, i.e. below 0.1% for 100 million pairs).
+
+    :param subjects: subjects of the triples
+    :type subjects: pd.Series
+    :param objects: objects of the triples
+    :type objects: pd.Series
+    :param method: either "string" or "hash"
+    :type method: str
+    :return: pandas series containing the pair IDs (same index as subjects)
+    """
+    if method == "string":
+        subject_ids = subjects.str[URI_PREFIX_LENGTH:]
+        object_ids = objects.str[URI_PREFIX_LENGTH:]
+        swap = (subject_ids > object_ids).to_numpy()
+        first_ids = subject_ids.where(~swap, object_ids)
+        second_ids = object_ids.where(~swap, subject_ids)
+        pair_ids = first_ids + "+" + second_ids
+    elif method == "hash":
+        subject_hashes = hash_uris(subjects)
+        object_hashes = hash_uris(objects)
+        # sort the two hashes of a pair so the ID doesn't depend on the position in the triple
+        low = np.minimum(subject_hashes, object_hashes)
+        high = np.maximum(subject_hashes, object_hashes)
+        # combine hashes (boost::hash_combine scheme, uint64 arithmetic wraps around)
+        pair_ids = pd.util.hash_array(low)
+        pair_ids ^= high + np.uint64(0x9E3779B97F4A7C15) + (pair_ids << np.uint64(6)) + (pair_ids >> np.uint64(2))
+        pair_ids = pd.Series(pair_ids, index=subjects.index)
+    else:
+        raise ValueError('method can either be "string" or "hash"')
+    return pair_ids.rename("pair_id")
+
+
+def redirections_source(redirections_filepath, redirections_filetype):
+    """
+    Returns the absolute file path, file type, size and modification time of a redirections dataset, which are
+    stored with the redirections index to detect outdated indexes.
+    """
+    stat = os.stat(redirections_filepath)
+    return {
+        "filepath": os.path.abspath(redirections_filepath),
+        "filetype": redirections_filetype,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns
+    }
+
+
+@instrumented
+def read_redirections(
+        redirections_filepath,
+        redirections_filetype="csv",
+        redirections_index_filepath=None,
+        max_chain_length=64,
+        chunksize=2000000
+    ):
+    """
+    Reads the redirections dataset once and returns an index that maps redirected entities to their final
+    redirection targets. Chains of redirections (A -> B -> C) are resolved, so A is mapped to C. Entities
+    that are redirected in a cycle are not redirected at all. If an entity has multiple redirections, the first
+    one is used. The targets are stored dictionary-encoded (categorical) to keep the index compact.
+
+    If a file path for the index is provided, the index is stored there after it is built and loaded from
+    there in later calls instead of parsing the redirections dataset again. The index is stored with the file path,
+    file type, size and modification time of the redirections dataset and is rebuilt if any of them changed.
+
+    :param redirections_filepath: file path of the redirections dataset
+    :type redirections_filepath: str
+    :param redirections_filetype: file type, either "csv" or "ttl"
+    :type redirections_filetype: str
+    :param redirections_index_filepath: optional file path (pickle) under which the index is stored and reused
+    :type redirections_index_filepath: str
+    :param max_chain_length: maximum number of pointer jumping steps when resolving chains (each step doubles the resolved chain length)
+    :type max_chain_length: int
+    :param chunksize: size of the chunks that are read when iterating over the file
+    :type chunksize: int
+    :return: pandas series with redirected entities as index and their final targets as values
+    """
+    # check file type
+    if redirections_filetype not in FILETYPES:
+        print('File type can either be "csv" or "ttl"')
+        return None
+
+    source = redirections_source(redirections_filepath, redirections_filetype)
+    if redirections_index_filepath is not None and os.path.isfile(redirections_index_filepath):
+        redirections_index = pd.read_pickle(redirections_index_filepath)
+        if isinstance(redirections_index, dict) and redirections_index.get("source") == source:
+            print("load redirections index...")
+            return redirections_index["redirections"]
+        print("redirections index is outdated, rebuild redirections index...")
+
+    # read redirections dataset once
+    redirections = []
+    for i, chunk in enumerate(read_triple_chunks(redirections_filepath, redirections_filetype, chunksize)):
+        print(f"read redirections dataset (chunk {i+1})...")
+        redirections.append(chunk[["subject", "object"]])
+    redirections = pd.concat(redirections, ignore_index=True)
+    redirections = redirections[redirections["subject"] != redirections["object"]]
+    redirections = redirections.drop_duplicates(subset="subject")
+    entities = pd.Index(redirections["subject"])
+    targets = redirections["object"].to_numpy(dtype=object)
+
+    # resolve redirection chains with pointer jumping (targets that are redirected themselves are replaced by their targets)
+    for _ in range(max_chain_length):
+        positions = entities.get_indexer(targets)
+        chained = positions >= 0
+        if not chained.any():
+            break
+        targets[chained] = targets[positions[chained]]
+    # targets that are still redirected are part of cycles, their entities are not redirected
+    in_cycle = entities.get_indexer(targets) >= 0
+    if in_cycle.any():
+        print(f"WARNING: {in_cycle.sum()} redirections are part of cycles and are ignored")
+    redirections = pd.Series(
+        pd.Categorical(targets[~in_cycle]),
+        index=entities[~in_cycle],
+        name="redirection"
+    )
+
+    if redirections_index_filepath is not None:
+        pd.to_pickle({"source": source, "redirections": redirections}, redirections_index_filepath)
+
+    return redirections
+
+
+def redirect_entities(entities, redirections):
+    """
+    Replaces redirected entities with their redirection targets in a single vectorized lookup.
+
+    :param entities: entities that are redirected (if they appear in the redirections index)
+    :type entities: pd.Series
+    :param redirections: index returned by read_redirections
+    :type redirections: pd.Series
+    :return: tuple of the pandas series with redirected entities and the number of redirected entities
+    """
+    positions = redirections.index.get_indexer(entities)
+    redirected = positions >= 0
+    redirected_entities = entities.to_numpy(dtype=object, copy=True)
+    redirected_entities[redirected] = np.asarray(redirections.array[positions[redirected]], dtype=object)
+    return pd.Series(redirected_entities, index=entities.index, name=entities.name), redirected.sum()
+
+
+# The preprocessing steps are implemented as operators that are applied to chunks of triples in memory.
+# An operator is a callable that receives a chunk (dataframe with subject, predicate and object columns)
+# and returns the processed chunk together with a dictionary of statistics for this chunk. Operators don't
+# depend on previous chunks. A pipeline streams chunks through a list of operators and passes the results
+# to a list of sinks (objects with a write method), e.g. files or collectors of entities. The functions
+# below that process a single file are thin wrappers around a pipeline with a single operator, the function
+# preprocess_datasets chains all operators without writing intermediate files.
+# Operators that compare URIs accept an optional URI dictionary (see uri_dictionary_utility.py). If it is
+# provided, the chunks are expected to contain int32 IDs instead of URIs (encoded by UriEncoder).
+
+
+class UriMatcher:
+    """
+    Matches URIs against several patterns in one pass. Patterns are literal substrings, patterns that start with "^"
+    are literal prefixes (e.g. "^http://dbpedia.org/resource/"). All prefixes are checked with one vectorized
+    startswith and all substrings with one multi-pattern search. With regex=True, the patterns are regular expressions.
+    """
+
+    def __init__(self, patterns, regex=False):
+        self.patterns = list(patterns)
+        self.regex = regex
+        self.prefixes = tuple(pattern[1:] for pattern in self.patterns if pattern.startswith("^"))
+        self.substrings = [pattern for pattern in self.patterns if not pattern.startswith("^")]
+
+    def match(self, uris):
+        """
+        Returns a boolean array that contains for each URI whether it matches any of the patterns.
+        """
+        if self.regex:
+            pattern = "|".join(f"(?:{pattern})" for pattern in self.patterns)
+            return uris.str.contains(pattern).to_numpy(dtype=bool, na_value=False)
+        matches = np.zeros(len(uris), dtype=bool)
+        if len(self.prefixes) > 0:
+            matches |= uris.str.startswith(self.prefixes).to_numpy(dtype=bool, na_value=False)
+        if len(self.substrings) == 1:
+            matches |= uris.str.contains(self.substrings[0], regex=False).to_numpy(dtype=bool, na_value=False)
+        elif len(self.substrings) > 1 and getattr(uris.dtype, "storage", None) == "pyarrow":
+            # arrow strings search an alternation of the escaped substrings in one pass (RE2 automaton)
+            pattern = "|".join(re.escape(substring) for substring in self.substrings)
+            matches |= uris.str.contains(pattern).to_numpy(dtype=bool, na_value=False)
+        else:
+            # python strings are faster with one literal search per substring than with the re module
+            for substring in self.substrings:
+                matches |= uris.str.contains(substring, regex=False).to_numpy(dtype=bool, na_value=False)
+        return matches
+
+
+class UriFilter:
+    """
+    Operator that filters triples by patterns of their subject and object URIs (see UriMatcher). Triples are kept if
+    both URIs match at least one of the include patterns (if provided) and neither URI matches any exclude pattern.
+    With a URI dictionary, the patterns are matched once against all URIs of the dictionary.
+    """
+
+    def __init__(self, include_patterns=None, exclude_patterns=None, regex=False, uri_dictionary=None):
+        self.include_matcher = UriMatcher(include_patterns, regex=regex) if include_patterns else None
+        self.exclude_matcher = UriMatcher(exclude_patterns, regex=regex) if exclude_patterns else None
+        self.kept_ids = None
+        if uri_dictionary is not None:
+            self.kept_ids = self.keep(pd.Series(uri_dictionary.decode(np.arange(len(uri_dictionary)))))
+
+    def keep(self, uris):
+        """
+        Returns a boolean array that contains for each URI whether it passes the include and exclude patterns.
+        """
+        keep = np.ones(len(uris), dtype=bool)
+        if self.include_matcher is not None:
+            keep &= self.include_matcher.match(uris)
+        if self.exclude_matcher is not None:
+            keep &= ~self.exclude_matcher.match(uris)
+        return keep
+
+    def __call__(self, chunk):
+        if self.kept_ids is not None:
+            keep = self.kept_ids[chunk["subject"].to_numpy()] & self.kept_ids[chunk["object"].to_numpy()]
+        else:
+            keep = self.keep(chunk["subject"]) & self.keep(chunk["object"])
+        return chunk[keep], {}
+
+
+class RedirectionFixer:
+    """
+    Operator that replaces redirected subjects (and objects) with their redirection targets. With a URI dictionary,
+    the redirections are converted into an array that contains the ID of the redirection target for each ID.
+    """
+
+    def __init__(self, redirections, subjects_only=False, uri_dictionary=None):
+        self.redirections = redirections
+        self.subjects_only = subjects_only
+        self.target_ids = None
+        if uri_dictionary is not None:
+            redirected_ids = uri_dictionary.encode(redirections.index)
+            redirection_target_ids = uri_dictionary.encode(redirections.to_numpy())
+            # redirections of URIs that are not in the dictionary can't be used
+            is_known = (redirected_ids >= 0) & (redirection_target_ids >= 0)
+            self.target_ids = np.arange(len(uri_dictionary), dtype=np.int32)
+            self.target_ids[redirected_ids[is_known]] = redirection_target_ids[is_known]
+
+    def redirect(self, entities):
+        if self.target_ids is None:
+            return redirect_entities(entities, self.redirections)
+        redirected = self.target_ids[entities.to_numpy()]
+        return pd.Series(redirected, index=entities.index, name=entities.name), int((redirected != entities.to_numpy()).sum())
+
+    def __call__(self, chunk):
+        chunk = chunk.copy()
+        chunk["subject"], n_redirected_subjects = self.redirect(chunk["subject"])
+        stats = {"n_redirected_subjects": n_redirected_subjects}
+        if not self.subjects_only:
+            chunk["object"], n_redirected_objects = self.redirect(chunk["object"])
+            stats["n_redirected_objects"] = n_redirected_objects
+        return chunk, stats
+
+
+class PropertyFilter:
+    """
+    Operator that only keeps triples whose predicate is in the list of filtered property types.
+    """
+
+    def __init__(self, filtered_property_types, uri_dictionary=None):
+        if uri_dictionary is not None:
+            filtered_property_types = uri_dictionary.encode(filtered_property_types)
+        self.filtered_property_types = pd.Series(filtered_property_types, name="filtered_property_types").to_frame()
+
+    def __call__(self, chunk):
+        chunk = chunk.merge(self.filtered_property_types, left_on="predicate", right_on="filtered_property_types")
+        chunk = chunk.drop(columns="filtered_property_types")
+        return chunk, {}
+
+
+class EntitySet:
+    """
+    Set of entities that is built in a streaming pass and supports vectorized membership tests. The entities are
+    stored as one sorted array: URIs as 64 bit hashes (see hash_uris) or, with hashed=False, as the URIs themselves
+    (looked up in a hash table) and IDs of the URI dictionary as int32 values. New entities are buffered and merged
+    into the sorted array when the buffer exceeds max_buffer_size entries, so the memory usage is bounded by the size
+    of the set plus the buffer.
+    With hashed URIs, a URI that is not in the set is falsely reported as contained with a probability of about
+    len(set) / 2^64 (about 3e-12 for 50 million entities).
+    """
+
+    def __init__(self, hashed=True, max_buffer_size=10000000):
+        self.hashed = hashed
+        self.max_buffer_size = max_buffer_size
+        self.values = None
+        self.lookup_index = None
+        self.buffer = []
+        self.buffer_size = 0
+
+    def keys(self, entities):
+        entities = np.asarray(entities)
+        if self.hashed and not np.issubdtype(entities.dtype, np.integer):
+            return hash_uris(entities)
+        return entities
+
+    def add(self, entities):
+        keys = pd.unique(self.keys(entities))
+        self.buffer.append(keys)
+        self.buffer_size += len(keys)
+        if self.buffer_size >= self.max_buffer_size:
+            self.compact()
+
+    def compact(self):
+        """
+        Merges the buffered entities into the sorted array of entities.
+        """
+        if len(self.buffer) > 0:
+            self.values = merge_sorted_unique([self.values, np.unique(np.concatenate(self.buffer))])
+            self.lookup_index = None
+            self.buffer = []
+            self.buffer_size = 0
+
+    def contains(self, entities):
+        """
+        Returns a boolean array that contains for each entity whether it is in the set.
+        """
+        self.compact()
+        keys = self.keys(entities)
+        if self.values is None or len(self.values) == 0:
+            return np.zeros(len(keys), dtype=bool)
+        if self.values.dtype == object:
+            # comparisons of strings are slow, so URIs are looked up in a hash table
+            if self.lookup_index is None:
+                self.lookup_index = pd.Index(self.values)
+            return self.lookup_index.get_indexer(keys) >= 0
+        return sorted_contains(self.values, keys)
+
+    def __len__(self):
+        self.compact()
+        return 0 if self.values is None else len(self.values)
+
+    @property
+    def nbytes(self):
+        self.compact()
+        return 0 if self.values is None else self.values.nbytes
+
+
+class PairSet:
+    """
+    Set of entity pairs (in any order) that is built in a streaming pass and supports vectorized membership tests.
+    The pairs are stored as sorted 64 bit keys: hashed pair IDs of URIs (see create_pair_ids) or, for IDs of the URI
+    dictionary, both IDs combined into one key. A pair that is not in the set is falsely reported as contained with a
+    probability of about len(set) / 2^64 for hashed keys. New pairs are buffered and merged into the set when the buffer
+    exceeds max_buffer_size keys.
+
+    If a spill directory is provided, the keys are not kept in memory. Every full buffer is sorted and written to
+    n_partitions files by a mixed hash of the keys (the keys of dictionary IDs are far from uniform, so their key range
+    would put almost all pairs into the same partition). Before the first membership test, the files of each partition are merged into one
+    sorted file, which is memory-mapped. So at most one partition has to be in memory at once.
+    """
+
+    def __init__(self, spill_dirpath=None, n_partitions=16, max_buffer_size=10000000):
+        if n_partitions & (n_partitions - 1) != 0:
+            raise ValueError("The number of partitions has to be a power of two")
+        self.spill_dirpath = spill_dirpath
+        self.n_partitions = n_partitions
+        self.partition_shift = np.uint64(64 - int(np.log2(n_partitions))) if n_partitions > 1 else None
+        self.max_buffer_size = max_buffer_size
+        self.values = None
+        self.partitions = None
+        self.n_runs = 0
+        self.buffer = []
+        self.buffer_size = 0
+        if spill_dirpath is not None:
+            os.makedirs(spill_dirpath, exist_ok=True)
+
+    def keys(self, subjects, objects):
+        subjects = np.asarray(subjects)
+        objects = np.asarray(objects)
+        if np.issubdtype(subjects.dtype, np.integer) and np.issubdtype(objects.dtype, np.integer):
+            if (subjects < 0).any() or (objects < 0).any():
+                raise ValueError("Entity IDs have to be non-negative (-1 is the ID of unknown URIs)")
+            lower_ids = np.minimum(subjects, objects).astype(np.uint64)
+            higher_ids = np.maximum(subjects, objects).astype(np.uint64)
+            return (lower_ids << np.uint64(32)) | higher_ids
+        return create_pair_ids(pd.Series(subjects), pd.Series(objects), method="hash").to_numpy()
+
+    def partition_ids(self, keys):
+        if self.partition_shift is None:
+            return np.zeros(len(keys), dtype=np.uint64)
+        # splitmix64 finalizer, the partition is taken from the top bits of the mixed key
+        keys = np.asarray(keys, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            mixed = (keys ^ (keys >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            mixed = (mixed ^ (mixed >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        mixed ^= mixed >> np.uint64(31)
+        return mixed >> self.partition_shift
+
+    def partition_filepath(self, partition, run=None):
+        filename = f"partition_{partition}.npy" if run is None else f"partition_{partition}_run_{run}.npy"
+        return os.path.join(self.spill_dirpath, filename)
+
+    def add(self, subjects, objects):
+        self.add_keys(self.keys(subjects, objects))
+
+    def add_keys(self, keys):
+        keys = pd.unique(keys)
+        self.buffer.append(keys)
+        self.buffer_size += len(keys)
+        if self.buffer_size >= self.max_buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Merges the buffered keys into the set (or writes them to the partition files of the spill directory).
+        """
+        if len(self.buffer) == 0:
+            return
+        keys = np.unique(np.concatenate(self.buffer))
+        self.buffer = []
+        self.buffer_size = 0
+        if self.spill_dirpath is None:
+            self.values = merge_sorted_unique([self.values, keys])
+            return
+        # the stable sort by partition keeps the keys of each partition sorted
+        partition_ids = self.partition_ids(keys)
+        keys = keys[np.argsort(partition_ids, kind="stable")]
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(partition_ids.astype(np.int64), minlength=self.n_partitions))])
+        for partition in range(self.n_partitions):
+            np.save(self.partition_filepath(partition, self.n_runs), keys[bounds[partition]:bounds[partition+1]])
+        self.n_runs += 1
+
+    def compact(self):
+        """
+        Flushes the buffer and merges the files of each partition (if the set is spilled to disk).
+        """
+        self.flush()
+        if self.spill_dirpath is None or (self.n_runs == 0 and self.partitions is not None):
+            return
+        self.partitions = None
+        for partition in range(self.n_partitions):
+            arrays = [np.load(self.partition_filepath(partition, run)) for run in range(self.n_runs)]
+            if os.path.isfile(self.partition_filepath(partition)):
+                arrays.append(np.load(self.partition_filepath(partition)))
+            np.save(self.partition_filepath(partition), merge_sorted_unique(arrays + [np.array([], dtype=np.uint64)]))
+            for run in range(self.n_runs):
+                os.remove(self.partition_filepath(partition, run))
+        self.n_runs = 0
+        self.open_partitions()
+
+    def open_partitions(self):
+        self.partitions = [np.load(self.partition_filepath(partition), mmap_mode="r") for partition in range(self.n_partitions)]
+
+    def contains(self, subjects, objects):
+        """
+        Returns a boolean array that contains for each pair whether it is in the set. Pairs with unknown entities
+        (dictionary ID -1) are not in the set.
+        """
+        subjects = np.asarray(subjects)
+        objects = np.asarray(objects)
+        if np.issubdtype(subjects.dtype, np.integer) and np.issubdtype(objects.dtype, np.integer):
+            known = (subjects >= 0) & (objects >= 0)
+            is_contained = np.zeros(len(subjects), dtype=bool)
+            is_contained[known] = self.contains_keys(self.keys(subjects[known], objects[known]))
+            return is_contained
+        return self.contains_keys(self.keys(subjects, objects))
+
+    def contains_keys(self, keys):
+        self.compact()
+        if self.spill_dirpath is None:
+            return sorted_contains(self.values, keys)
+        is_contained = np.zeros(len(keys), dtype=bool)
+        partition_ids = self.partition_ids(keys)
+        for partition in np.unique(partition_ids):
+            in_partition = partition_ids == partition
+            is_contained[in_partition] = sorted_contains(self.partitions[int(partition)], keys[in_partition])
+        return is_contained
+
+    def __len__(self):
+        self.compact()
+        if self.spill_dirpath is None:
+            return 0 if self.values is None else len(self.values)
+        return sum(len(partition) for partition in self.partitions)
+
+    @property
+    def nbytes(self):
+        return len(self) * 8
+
+    def __getstate__(self):
+        # memory-mapped partitions are opened again instead of being copied to worker processes
+        self.compact()
+        state = self.__dict__.copy()
+        state["partitions"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.spill_dirpath is not None:
+            self.open_partitions()
+
+
+def merge_sorted_unique(arrays):
+    """
+    Merges sorted arrays of unique values into one sorted array of unique values. Arrays that are None are ignored.
+    """
+    arrays = [array for array in arrays if array is not None]
+    if len(arrays) == 1:
+        return arrays[0]
+    # the stable sort (timsort) merges the sorted runs in linear time
+    merged = np.sort(np.concatenate(arrays), kind="stable")
+    if len(merged) == 0:
+        return merged
+    return merged[np.concatenate([[True], merged[1:] != merged[:-1]])]
+
+
+def sorted_contains(values, keys):
+    """
+    Returns a boolean array that contains for each key whether it is in the sorted array of values.
+    """
+    if values is None or len(values) == 0:
+        return np.zeros(len(keys), dtype=bool)
+    positions = np.searchsorted(values, keys)
+    positions[positions == len(values)] = 0
+    return values[positions] == keys
+
+
+class EntityFilter:
+    """
+    Operator that only keeps triples whose subject (and object) is in the provided set of entities.
+    """
+
+    def __init__(self, entities, filter_subject_only=False):
+        if not isinstance(entities, EntitySet):
+            entity_set = EntitySet()
+            entity_set.add(entities)
+            entities = entity_set
+        entities.compact()
+        self.entities = entities
+        self.filter_subject_only = filter_subject_only
+
+    def __call__(self, chunk):
+        keep = self.entities.contains(chunk["subject"])
+        if not self.filter_subject_only:
+            keep &= self.entities.contains(chunk["object"])
+        return chunk[keep].reset_index(drop=True), {}
+
+
+class EntityPairRemover:
+    """
+    Operator that removes triples whose entity pair (in any order) is in the provided pair set.
+    """
+
+    def __init__(self, pair_set):
+        pair_set.compact()
+        self.pair_set = pair_set
+
+    def __call__(self, chunk):
+        keep = ~self.pair_set.contains(chunk["subject"], chunk["object"])
+        return chunk[keep].reset_index(drop=True), {}
+
+
+def remove_quotes(chunk):
+    """
+    Operator that removes the " characters around the values (and quoted column names) of datasets that are
+    separated by ", ".
+    """
+    chunk = chunk.copy()
+    for col in chunk.columns:
+        chunk[col] = chunk[col].str[1:-1]
+    chunk.columns = [col[1:-1] if col.startswith('"') and col.endswith('"') else col for col in chunk.columns]
+    return chunk, {}
+
+
+class TripleWriter:
+    """
+    Sink that writes chunks to a CSV (or TSV) file. The file is overwritten by the first chunk and
+    following chunks are appended. Files with a Parquet or Arrow extension (see io_utility.storage_format)
+    are written in that format instead, sep and header are ignored for them. The writer has to be closed
+    after the last chunk. With a URI dictionary, the IDs in the chunks are decoded before writing.
+    """
+
+    def __init__(self, filepath, sep=",", header=True, uri_dictionary=None):
+        self.filepath = filepath
+        self.sep = sep
+        self.header = header
+        self.uri_dictionary = uri_dictionary
+        self.n_chunks = 0
+        self.columnar_writer = ColumnarWriter(filepath) if storage_format(filepath) != "csv" else None
+
+    def write(self, chunk):
+        if self.uri_dictionary is not None:
+            chunk = decode_triples(chunk, self.uri_dictionary)
+        if self.columnar_writer is not None:
+            self.columnar_writer.write(chunk)
+        else:
+            chunk.to_csv(
+                self.filepath,
+                sep=self.sep,
+                index=False,
+                header=self.header if self.n_chunks == 0 else False,
+                mode="w" if self.n_chunks == 0 else "a"
+            )
+        self.n_chunks += 1
+
+    def close(self):
+        if self.columnar_writer is not None:
+            self.columnar_writer.close()
+
+
+class EntityCollector:
+    """
+    Sink that collects the unique subjects and objects of all chunks in an entity set.
+    """
+
+    def __init__(self, hashed=True):
+        self.entity_set = EntitySet(hashed=hashed)
+
+    def write(self, chunk):
+        self.entity_set.add(chunk["subject"])
+        self.entity_set.add(chunk["object"])
+
+    def get_entity_set(self):
+        self.entity_set.compact()
+        return self.entity_set
+
+
+class TripleCollector:
+    """
+    Sink that keeps all chunks in memory (e.g. for steps that need the whole dataset like splitting).
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, chunk):
+        self.chunks.append(chunk)
+
+    def get_triples(self):
+        if len(self.chunks) == 0:
+            return pd.DataFrame(columns=["subject", "predicate", "object"])
+        return pd.concat(self.chunks, ignore_index=True)
+
+
+def apply_operators(chunk, operators, instrument=False):
+    """
+    Applies a list of operators to a chunk and returns the processed chunk and the summed up statistics
+    of all operators (including the number of triples before and after processing). With instrument=True
+    the statistics also contain the wall time of each operator (operator_seconds).
+    """
+    stats = {"n_triples_before": len(chunk)}
+    operator_seconds = {}
+    for operator in operators:
+        start_time = time.perf_counter()
+        chunk, operator_stats = operator(chunk)
+        if instrument:
+            name = getattr(operator, "__name__", type(operator).__name__)
+            operator_seconds[name] = operator_seconds.get(name, 0) + time.perf_counter() - start_time
+        for key, value in operator_stats.items():
+            stats[key] = stats.get(key, 0) + value
+    stats["n_triples_after"] = len(chunk)
+    if instrument:
+        stats["operator_seconds"] = operator_seconds
+    return chunk, stats
+
+
+# operators of the pipeline that is executed by a worker process (see run_pipeline)
+WORKER_OPERATORS = None
+# whether the worker process measures the wall time of the operators
+WORKER_INSTRUMENT = False
+
+
+def init_pipeline_worker(operators, instrument=False):
+    """
+    Stores the operators in the worker process, so they are only transferred once per worker and not with every chunk.
+    """
+    global WORKER_OPERATORS, WORKER_INSTRUMENT
+    WORKER_OPERATORS = operators
+    WORKER_INSTRUMENT = instrument
+
+
+def process_chunk_in_worker(chunk):
+    """
+    Applies the operators that were stored by init_pipeline_worker to a chunk. With instrumentation the statistics
+    also contain the CPU time of the worker (worker_cpu_seconds), as it isn't part of the parent's CPU time yet.
+    """
+    start_cpu_time = time.process_time()
+    chunk, stats = apply_operators(chunk, WORKER_OPERATORS, WORKER_INSTRUMENT)
+    if WORKER_INSTRUMENT:
+        stats["worker_cpu_seconds"] = time.process_time() - start_cpu_time
+    return chunk, stats
+
+
+def process_chunks(chunks, operators, n_workers=1, instrument=False):
+    """
+    Applies the operators to all chunks and yields the processed chunks and their statistics in input order.
+    With n_workers > 1 the chunks are processed by a pool of worker processes. To limit memory usage, at most
+    two chunks per worker are read ahead of the chunk that is yielded next.
+    """
+    if n_workers <= 1:
+        for chunk in chunks:
+            yield apply_operators(chunk, operators, instrument)
+        return
+
+    initargs = (operators, instrument)
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_pipeline_worker, initargs=initargs) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(process_chunk_in_worker, chunk))
+            if len(pending) >= 2 * n_workers:
+                yield pending.popleft().result()
+        while len(pending) > 0:
+            yield pending.popleft().result()
+
+
+def run_pipeline(chunks, operators, sinks, description="processing", n_workers=1):
+    """
+    Streams chunks of triples through a list of operators and writes the processed chunks to all sinks.
+    Chunks are read and written by the calling process, so the sinks receive the chunks in input order and
+    the results are identical for any number of workers.
+
+    :param chunks: iterable of dataframes containing triples (e.g. returned by read_triple_chunks)
+    :type chunks: iterable
+    :param operators: list of operators that are applied to each chunk in the given order
+    :type operators: list
+    :param sinks: list of sinks that receive each processed chunk (objects with a write method)
+    :type sinks: list
+    :param description: description of the pipeline that is printed for each chunk
+    :type description: str
+    :param n_workers: number of worker processes that apply the operators, 1 processes the chunks in the calling process
+    :type n_workers: int
+    :return: dictionary containing the statistics of all operators summed up over all chunks
+    """
+    stats = {"n_triples_before": 0, "n_triples_after": 0}
+    instrument = instrumentation_enabled()
+    stage = current_stage()
+    stage_name = description if stage is None else stage.fields["stage"]
+    # a chunk measurement includes reading, processing and writing the chunk
+    measurement = start_measurement(stage_name, level="chunk", pipeline=description, chunk=1)
+    for i, (chunk, chunk_stats) in enumerate(process_chunks(chunks, operators, n_workers, instrument)):
+        print(f"{description} (chunk {i+1})...")
+        operator_seconds = chunk_stats.pop("operator_seconds", None)
+        worker_cpu_seconds = chunk_stats.pop("worker_cpu_seconds", 0)
+        for key, value in chunk_stats.items():
+            stats[key] = stats.get(key, 0) + value
+        for sink in sinks:
+            sink.write(chunk)
+        if measurement is not None:
+            measurement.add_rows(chunk_stats["n_triples_before"], chunk_stats["n_triples_after"])
+            measurement.add_cpu_seconds(worker_cpu_seconds)
+            finish_measurement(measurement, operator_seconds=operator_seconds)
+            measurement = start_measurement(stage_name, level="chunk", pipeline=description, chunk=i+2)
+    discard_measurement(measurement)
+    add_stage_rows(stats["n_triples_before"], stats["n_triples_after"])
+    return stats
+
+
+def print_filter_statistics(stats):
+    """
+    Prints the number of triples before and after filtering.
+    """
+    n_triples_before = stats["n_triples_before"]
+    n_triples_after = stats["n_triples_after"]
+    print("\nnumber of triples\nbefore filtering\tafter filtering")
+    print(f"{n_triples_before}\t\t{n_triples_after} ({round(n_triples_after / n_triples_before, 3)})")
+
+
+@instrumented
+def read_entity_pairs(pairs_dataset_filepath, pairs_dataset_filetype="csv", chunksize=2000000, spill_dirpath=None):
+    """
+    Reads a dataset and returns a pair set of all its entity pairs (see PairSet).
+    """
+    pair_set = PairSet(spill_dirpath=spill_dirpath)
+    for i, chunk in enumerate(read_triple_chunks(pairs_dataset_filepath, pairs_dataset_filetype, chunksize)):
+        print(f"read entity pairs dataset (chunk {i+1})...")
+        pair_set.add(chunk["subject"], chunk["object"])
+    pair_set.compact()
+    return pair_set
+
+
+@instrumented
+def read_entities(entities_dataset_filepath, entities_dataset_filetype="csv", chunksize=2000000, hashed=True):
+    """
+    Reads a dataset and returns an entity set of all entities that appear as subject or object.
+    """
+    collector = EntityCollector(hashed=hashed)
+    run_pipeline(
+        read_triple_chunks(entities_dataset_filepath, entities_dataset_filetype, chunksize),
+        [],
+        [collector],
+        description="read entities dataset"
+    )
+    return collector.get_entity_set()
+
+
+@instrumented
 def remove_entity_pairs(
         dataset_filepath,
         pairs_dataset_filepath,
         processed_dataset_filepath,
         dataset_filetype="csv",
         pairs_dataset_filetype="csv",
-        chunksize=2000000
+        chunksize=2000000,
+        pairs_spill_dirpath=None
     ):
     """
     This function is used to remove entity pairs that appear in one dataset from another dataset.
+    The pairs are stored in a PairSet, which can be spilled to disk for very large pairs datasets.
 
     :param dataset_filepath: file path of the file where pairs are removed
     :type dataset_filepath: str
@@ -36,79 +859,51 @@ def remove_entity_pairs(
     :type pairs_dataset_filetype: str
     :param chunksize: size of the chunks that are read when iterating over the files
     :type chunksize: int
+    :param pairs_spill_dirpath: optional directory in which the pairs are stored instead of keeping them in memory
+    :type pairs_spill_dirpath: str
     :return: None
     """
 
-    # define and store file parsing arguments
-    csv_file_parsing_args = {}
-    ttl_file_parsing_args = {"sep": " ", "header": None, "names": ["subject", "predicate", "object", "."]}
-    if dataset_filetype == "csv":
-        dataset_file_parsing_args = csv_file_parsing_args
-    elif dataset_filetype == "ttl":
-        dataset_file_parsing_args = ttl_file_parsing_args
-    else:
-        print('File type can either be "csv" or "ttl"')
-        return
-    if pairs_dataset_filetype == "csv":
-        pairs_dataset_file_parsing_args = csv_file_parsing_args
-    elif pairs_dataset_filetype == "ttl":
-        pairs_dataset_file_parsing_args = ttl_file_parsing_args
-    else:
+    # check file types
+    if dataset_filetype not in FILETYPES or pairs_dataset_filetype not in FILETYPES:
         print('File type can either be "csv" or "ttl"')
         return
 
-    # read pairs dataset and store unique pair IDs
-    entity_pairs = pd.DataFrame()
-    for i, chunk in enumerate(pd.read_csv(pairs_dataset_filepath, chunksize=chunksize, **pairs_dataset_file_parsing_args)):
-        print(f"read entity pairs dataset (chunk {i+1})...")
-        chunk = chunk.apply(create_pair_id, axis=1)
-        chunk = chunk.rename("pair_id")
-        chunk = chunk.drop_duplicates(ignore_index=True)
-        chunk = chunk.to_frame()
-        chunk["drop_pair"] = 1
-        entity_pairs = pd.concat([entity_pairs, chunk])
+    # read pairs dataset and store unique pair keys
+    entity_pairs = read_entity_pairs(pairs_dataset_filepath, pairs_dataset_filetype, chunksize, pairs_spill_dirpath)
 
     # read dataset that is filtered and remove pairs that appear in the pairs dataset
-    n_triples_before = 0
-    n_triples_after = 0
-    for i, chunk in enumerate(pd.read_csv(dataset_filepath, chunksize=chunksize, **dataset_file_parsing_args)):
-        print(f"processing chunk {i+1}...")
-        if dataset_filetype == "ttl":
-            chunk = chunk.drop(columns=".")
-            # remove "<" and ">"
-            for col in chunk.columns:
-                chunk[col] = chunk[col].str[1:-1]
-        n_triples_before = n_triples_before + len(chunk)
-        # remove entity pairs
-        chunk["pair_id"] = chunk.apply(create_pair_id, axis=1)
-        chunk = chunk.merge(entity_pairs, on="pair_id", how="left")
-        chunk = chunk[chunk["drop_pair"] != 1]
-        chunk = chunk.drop(columns=["pair_id", "drop_pair"])
-        n_triples_after = n_triples_after + len(chunk)
-        # write back to file
-        chunk.to_csv(
-            processed_dataset_filepath,
-            index=False,
-            header=True if i == 0 else False,
-            mode="w" if i == 0 else "a"
-        )
+    writer = TripleWriter(processed_dataset_filepath)
+    stats = run_pipeline(
+        read_triple_chunks(dataset_filepath, dataset_filetype, chunksize),
+        [EntityPairRemover(entity_pairs)],
+        [writer]
+    )
+    writer.close()
 
     # print statistics (triples before and after filtering)
-    print("\nnumber of triples\nbefore filtering\tafter filtering")
-    print(f"{n_triples_before}\t\t{n_triples_after} ({round(n_triples_after / n_triples_before, 3)})")
+    print_filter_statistics(stats)
 
 
+@instrumented
 def filter_triples_by_uri(
         dataset_filepath,
         processed_dataset_filepath,
-        uri_substring,
+        uri_substring=None,
         positive_match=True,
         dataset_filetype="csv",
-        chunksize=2000000
+        chunksize=2000000,
+        n_workers=1,
+        include_patterns=None,
+        exclude_patterns=None,
+        regex=False
     ):
     """
-    This function is used to filter triples by their URIs. The function can either remove triples that match the
-    provided substring or remove triples that don't match the provided substring.
+    This function is used to filter triples by their URIs. Triples are kept if their subject and object URIs match
+    at least one of the include patterns and none of the exclude patterns. Patterns are literal substrings, patterns
+    that start with "^" are literal prefixes (see UriMatcher). All patterns are applied in one pass over the dataset.
+    A single substring can also be passed as uri_substring, then the function either removes triples that don't
+    match it (positive_match=True) or triples that match it (positive_match=False).
 
     :param dataset_filepath: file path of the file where triples are removed
     :type dataset_filepath: str
@@ -122,57 +917,46 @@ def filter_triples_by_uri(
     :type dataset_filetype: str
     :param chunksize: size of the chunks that are read when iterating over the file
     :type chunksize: int
+    :param n_workers: number of worker processes that process the chunks in parallel (see run_pipeline)
+    :type n_workers: int
+    :param include_patterns: triples are only kept if both URIs match at least one of these patterns
+    :type include_patterns: list
+    :param exclude_patterns: triples are removed if one of their URIs matches one of these patterns
+    :type exclude_patterns: list
+    :param regex: if set to True all patterns are regular expressions
+    :type regex: bool
     :return: None
     """
 
-    # define and store file parsing arguments
-    csv_file_parsing_args = {}
-    ttl_file_parsing_args = {"sep": " ", "header": None, "names": ["subject", "predicate", "object", "."]}
-    if dataset_filetype == "csv":
-        dataset_file_parsing_args = csv_file_parsing_args
-    elif dataset_filetype == "ttl":
-        dataset_file_parsing_args = ttl_file_parsing_args
-    else:
+    # check file type
+    if dataset_filetype not in FILETYPES:
         print('File type can either be "csv" or "ttl"')
         return
 
-    # read dataset that is filtered and only keep triples where both subject have a matching URI
-    n_triples_before = 0
-    n_triples_after = 0
-    for i, chunk in enumerate(pd.read_csv(dataset_filepath, chunksize=chunksize, **dataset_file_parsing_args)):
-        print(f"filter dataset (chunk {i+1})...")
-        if dataset_filetype == "ttl":
-            chunk = chunk.drop(columns=".")
-            # remove "<" and ">"
-            for col in chunk.columns:
-                chunk[col] = chunk[col].str[1:-1]
-        n_triples_before = n_triples_before + len(chunk)
-        # subjects matching the filter
-        if positive_match:
-            subject_matches = chunk["subject"].str.contains(uri_substring)
-        else:
-            subject_matches = ~chunk["subject"].str.contains(uri_substring)
-        # objects matching the filter
-        if positive_match:
-            object_matches = chunk["object"].str.contains(uri_substring)
-        else:
-            object_matches = ~chunk["object"].str.contains(uri_substring)
-        # filter triples
-        chunk = chunk[subject_matches & object_matches]
-        n_triples_after = n_triples_after + len(chunk)
-        # write back to file
-        chunk.to_csv(
-            processed_dataset_filepath,
-            index=False,
-            header=True if i == 0 else False,
-            mode="w" if i == 0 else "a"
-        )
+    include_patterns = list(include_patterns) if include_patterns is not None else []
+    exclude_patterns = list(exclude_patterns) if exclude_patterns is not None else []
+    if uri_substring is not None:
+        (include_patterns if positive_match else exclude_patterns).append(uri_substring)
+    if len(include_patterns) == 0 and len(exclude_patterns) == 0:
+        print("No URI substring or patterns provided")
+        return
+
+    # read dataset that is filtered and only keep triples where subject and object pass all patterns
+    writer = TripleWriter(processed_dataset_filepath)
+    stats = run_pipeline(
+        read_triple_chunks(dataset_filepath, dataset_filetype, chunksize),
+        [UriFilter(include_patterns, exclude_patterns, regex=regex)],
+        [writer],
+        description="filter dataset",
+        n_workers=n_workers
+    )
+    writer.close()
 
     # print statistics (triples before and after filtering)
-    print("\nnumber of triples\nbefore filtering\tafter filtering")
-    print(f"{n_triples_before}\t\t{n_triples_after} ({round(n_triples_after / n_triples_before, 3)})")
+    print_filter_statistics(stats)
 
 
+@instrumented
 def fix_redirections(
         dataset_filepath,
         redirections_filepath,
@@ -180,10 +964,14 @@ def fix_redirections(
         subjects_only=False,
         dataset_filetype="csv",
         redirections_filetype="csv",
-        chunksize=2000000
+        redirections_index_filepath=None,
+        chunksize=2000000,
+        n_workers=1
     ):
     """
     This function is used to correct redirected entities, that are listed in the redirections dataset.
+    The redirections are read once (see read_redirections) and chains of redirections are resolved to
+    their final target.
 
     :param dataset_filepath: file path of the file where triples are removed
     :type dataset_filepath: str
@@ -197,130 +985,77 @@ def fix_redirections(
     :type dataset_filetype: str
     :param redirections_filetype: file type, either "csv" or "ttl"
     :type redirections_filetype: str
+    :param redirections_index_filepath: optional file path under which the redirections index is stored and reused between calls
+    :type redirections_index_filepath: str
     :param chunksize: size of the chunks that are read when iterating over the file
     :type chunksize: int
+    :param n_workers: number of worker processes that process the chunks in parallel (see run_pipeline)
+    :type n_workers: int
     :return: None
     """
 
-    # define and store file parsing arguments
-    csv_file_parsing_args = {}
-    ttl_file_parsing_args = {"sep": " ", "header": None, "names": ["subject", "predicate", "object", "."]}
-    if dataset_filetype == "csv":
-        dataset_file_parsing_args = csv_file_parsing_args
-    elif dataset_filetype == "ttl":
-        dataset_file_parsing_args = ttl_file_parsing_args
-    else:
+    # check file type
+    if dataset_filetype not in FILETYPES:
         print('File type can either be "csv" or "ttl"')
         return
-    if redirections_filetype == "csv":
-        redirections_file_parsing_args = csv_file_parsing_args
-    elif redirections_filetype == "ttl":
-        redirections_file_parsing_args = ttl_file_parsing_args
-    else:
-        print('File type can either be "csv" or "ttl"')
+
+    # read redirections once
+    redirections = read_redirections(
+        redirections_filepath,
+        redirections_filetype=redirections_filetype,
+        redirections_index_filepath=redirections_index_filepath,
+        chunksize=chunksize
+    )
+    if redirections is None:
         return
 
+    # iterate over dataset with triples whole entities are fixed (in case of redirections)
+    redirection_fixer = RedirectionFixer(redirections, subjects_only=subjects_only)
+    writer = TripleWriter(processed_dataset_filepath)
     try:
-        # iterate over dataset with triples whole entities are fixed (in case of redirections)
-        n_triples_total = 0
-        n_redirected_subjects = 0
-        n_redirected_objects = 0
-        for i, chunk in enumerate(pd.read_csv(dataset_filepath, chunksize=chunksize, **dataset_file_parsing_args)):
-            print(f"fix redirections (chunk {i+1})...")
-            if dataset_filetype == "ttl":
-                chunk = chunk.drop(columns=".")
-                # remove "<" and ">"
-                for col in chunk.columns:
-                    chunk[col] = chunk[col].str[1:-1]
-            n_triples_total += len(chunk)
-
-            # iterate over dataset containing redirections
-            for redirections_chunk in pd.read_csv(redirections_filepath, chunksize=chunksize, **redirections_file_parsing_args):
-                if redirections_filetype == "ttl":
-                    redirections_chunk = redirections_chunk.drop(columns=".")
-                    # remove "<" and ">"
-                    for col in redirections_chunk.columns:
-                        redirections_chunk[col] = redirections_chunk[col].str[1:-1]
-                redirections_chunk = redirections_chunk.drop(columns="predicate")
-                redirections_chunk = redirections_chunk.rename(columns={"subject": "entity", "object": "redirection"})
-                # fix redirected subjects
-                chunk = chunk.merge(redirections_chunk, left_on="subject", right_on="entity", how="left")
-                n_redirected_subjects += (~chunk["redirection"].isna()).sum()
-                chunk["redirection"] = chunk["redirection"].fillna(chunk["subject"])
-                chunk["subject"] = chunk["redirection"]
-                chunk = chunk.drop(columns=["entity", "redirection"])
-                # fix redirected objects
-                if not subjects_only:
-                    chunk = chunk.merge(redirections_chunk, left_on="object", right_on="entity", how="left")
-                    n_redirected_objects += (~chunk["redirection"].isna()).sum()
-                    chunk["redirection"] = chunk["redirection"].fillna(chunk["object"])
-                    chunk["object"] = chunk["redirection"]
-                    chunk = chunk.drop(columns=["entity", "redirection"])
-
-            # write back to file
-            chunk.to_csv(
-                processed_dataset_filepath,
-                index=False,
-                header=True if i == 0 else False,
-                mode="w" if i == 0 else "a"
-            )
-
+        stats = run_pipeline(
+            read_triple_chunks(dataset_filepath, dataset_filetype, chunksize),
+            [redirection_fixer],
+            [writer],
+            description="fix redirections",
+            n_workers=n_workers
+        )
     except pd.errors.ParserError:
-        dataset_file_parsing_args = {"sep": ", "}
-        # iterate over dataset with triples whole entities are fixed (in case of redirections)
-        n_triples_total = 0
-        n_redirected_subjects = 0
-        n_redirected_objects = 0
-        for i, chunk in enumerate(pd.read_csv(dataset_filepath, chunksize=chunksize, **dataset_file_parsing_args)):
-            print(f"fix redirections (chunk {i+1})...")
-            # remove " characters
-            for col in chunk.columns:
-                chunk[col] = chunk[col].str[1:-1]
-            n_triples_total += len(chunk)
-
-            # iterate over dataset containing redirections
-            for redirections_chunk in pd.read_csv(redirections_filepath, chunksize=chunksize, **redirections_file_parsing_args):
-                if redirections_filetype == "ttl":
-                    redirections_chunk = redirections_chunk.drop(columns=".")
-                    # remove "<" and ">"
-                    for col in redirections_chunk.columns:
-                        redirections_chunk[col] = redirections_chunk[col].str[1:-1]
-                redirections_chunk = redirections_chunk.drop(columns="predicate")
-                redirections_chunk = redirections_chunk.rename(columns={"subject": "entity", "object": "redirection"})
-                # fix redirected subjects
-                chunk = chunk.merge(redirections_chunk, left_on="subject", right_on="entity", how="left")
-                n_redirected_subjects += (~chunk["redirection"].isna()).sum()
-                chunk["redirection"] = chunk["redirection"].fillna(chunk["subject"])
-                chunk["subject"] = chunk["redirection"]
-                chunk = chunk.drop(columns=["entity", "redirection"])
-                # fix redirected objects
-                if not subjects_only:
-                    chunk = chunk.merge(redirections_chunk, left_on="object", right_on="entity", how="left")
-                    n_redirected_objects += (~chunk["redirection"].isna()).sum()
-                    chunk["redirection"] = chunk["redirection"].fillna(chunk["object"])
-                    chunk["object"] = chunk["redirection"]
-                    chunk = chunk.drop(columns=["entity", "redirection"])
-
-            # write back to file
-            chunk.to_csv(
-                processed_dataset_filepath,
-                index=False,
-                header=True if i == 0 else False,
-                mode="w" if i == 0 else "a"
-            )
+        writer.close()
+        writer = TripleWriter(processed_dataset_filepath)
+        stats = run_pipeline(
+            read_triple_chunks(dataset_filepath, "csv", chunksize, sep=", "),
+            [remove_quotes, redirection_fixer],
+            [writer],
+            description="fix redirections",
+            n_workers=n_workers
+        )
+    writer.close()
 
     # print statistics (number of redirected triples)
+    print_redirection_statistics(stats)
+
+
+def print_redirection_statistics(stats):
+    """
+    Prints the number of triples with redirected subjects and objects.
+    """
+    n_triples_total = stats["n_triples_before"]
+    n_redirected_subjects = stats.get("n_redirected_subjects", 0)
     print(f"\nnumber of triples with redirected subject: {n_redirected_subjects} ({round(n_redirected_subjects / n_triples_total, 3)})")
-    if not subjects_only:
+    if "n_redirected_objects" in stats:
+        n_redirected_objects = stats["n_redirected_objects"]
         print(f"number of triples with redirected object: {n_redirected_objects} ({round(n_redirected_objects / n_triples_total, 3)})")
 
 
+@instrumented
 def filter_properties(
         properties_dataset_filepath,
         filtered_property_types_filepath,
         processed_dataset_filepath,
         properties_dataset_filetype="csv",
-        chunksize=2000000
+        chunksize=2000000,
+        n_workers=1
     ):
     """
     This function is used to filter properties in a datset. The properties that are filtered need to be stored in a separate file.
@@ -335,51 +1070,34 @@ def filter_properties(
     :type properties_dataset_filetype: str
     :param chunksize: size of the chunks that are read when iterating over the file
     :type chunksize: int
+    :param n_workers: number of worker processes that process the chunks in parallel (see run_pipeline)
+    :type n_workers: int
     :return: None
     """
-    
+
     # read filtered property types
-    filtered_property_types = pd.read_csv(filtered_property_types_filepath)
-
-    # define and store file parsing arguments
-    csv_file_parsing_args = {}
-    ttl_file_parsing_args = {"sep": " ", "header": None, "names": ["subject", "predicate", "object", "."]}
-    if properties_dataset_filetype == "csv":
-        dataset_file_parsing_args = csv_file_parsing_args
-    elif properties_dataset_filetype == "ttl":
-        dataset_file_parsing_args = ttl_file_parsing_args
-    else:
+    filtered_property_types = read_table(filtered_property_types_filepath)
+
+    # check file type
+    if properties_dataset_filetype not in FILETYPES:
         print('File type can either be "csv" or "ttl"')
         return
 
     # read dataset that is filtered and remove property types that don't appear in the filtered property types dataset
-    n_triples_before = 0
-    n_triples_after = 0
-    for i, chunk in enumerate(pd.read_csv(properties_dataset_filepath, chunksize=chunksize, **dataset_file_parsing_args)):
-        print(f"processing chunk {i+1}...")
-        if properties_dataset_filetype == "ttl":
-            chunk = chunk.drop(columns=".")
-            # remove "<" and ">"
-            for col in chunk.columns:
-                chunk[col] = chunk[col].str[1:-1]
-        n_triples_before = n_triples_before + len(chunk)
-        # remove entity pairs
-        chunk = chunk.merge(filtered_property_types, left_on="predicate", right_on="filtered_property_types")
-        chunk = chunk.drop(columns="filtered_property_types")
-        n_triples_after = n_triples_after + len(chunk)
-        # write back to file
-        chunk.to_csv(
-            processed_dataset_filepath,
-            index=False,
-            header=True if i == 0 else False,
-            mode="w" if i == 0 else "a"
-        )
+    writer = TripleWriter(processed_dataset_filepath)
+    stats = run_pipeline(
+        read_triple_chunks(properties_dataset_filepath, properties_dataset_filetype, chunksize),
+        [PropertyFilter(filtered_property_types["filtered_property_types"])],
+        [writer],
+        n_workers=n_workers
+    )
+    writer.close()
 
     # print statistics (triples before and after filtering)
-    print("\nnumber of triples\nbefore filtering\tafter filtering")
-    print(f"{n_triples_before}\t\t{n_triples_after} ({round(n_triples_after / n_triples_before, 3)})")
+    print_filter_statistics(stats)
 
 
+@instrumented
 def filter_entities(
         dataset_filepath,
         entities_dataset_filepath,
@@ -387,10 +1105,13 @@ def filter_entities(
         filter_subject_only=False,
         dataset_filetype="csv",
         entities_dataset_filetype="csv",
-        chunksize=2000000
+        chunksize=2000000,
+        n_workers=1,
+        hashed_entities=True
     ):
     """
     This function is used to filter one dataset for entities that appear in another datset.
+    The entities are collected in an entity set (see EntitySet) and the triples are filtered with vectorized membership tests.
 
     :param dataset_filepath: file path of the file that is filtered
     :type dataset_filepath: str
@@ -406,108 +1127,259 @@ def filter_entities(
     :type entities_dataset_filetype: str
     :param chunksize: size of the chunks that are read when iterating over the files
     :type chunksize: int
+    :param n_workers: number of worker processes that process the chunks in parallel (see run_pipeline)
+    :type n_workers: int
+    :param hashed_entities: if set to True, the entity set stores 64 bit hashes of the URIs (8 bytes per entity), otherwise the URIs
+    :type hashed_entities: bool
     :return: None
     """
-    
-    # define and store file parsing arguments
-    csv_file_parsing_args = {}
-    ttl_file_parsing_args = {"sep": " ", "header": None, "names": ["subject", "predicate", "object", "."]}
-    if dataset_filetype == "csv":
-        dataset_file_parsing_args = csv_file_parsing_args
-    elif dataset_filetype == "ttl":
-        dataset_file_parsing_args = ttl_file_parsing_args
-    else:
-        print('File type can either be "csv" or "ttl"')
-        return
-    if entities_dataset_filetype == "csv":
-        entities_dataset_file_parsing_args = csv_file_parsing_args
-    elif entities_dataset_filetype == "ttl":
-        entities_dataset_file_parsing_args = ttl_file_parsing_args
-    else:
+
+    # check file types
+    if dataset_filetype not in FILETYPES or entities_dataset_filetype not in FILETYPES:
         print('File type can either be "csv" or "ttl"')
         return
 
     # read dataset that contains entities that are filtered from the other dataset and store entities
-    entities = np.array([])
-    for i, chunk in enumerate(pd.read_csv(entities_dataset_filepath, chunksize=chunksize, **entities_dataset_file_parsing_args)):
-        print(f"read entities dataset (chunk {i+1})...")
-        entities = np.union1d(entities, np.union1d(chunk["subject"].unique(), chunk["object"].unique()))
-    entities = pd.Series(entities, name="entity")
+    start_time = time.perf_counter()
+    entities = read_entities(entities_dataset_filepath, entities_dataset_filetype, chunksize, hashed=hashed_entities)
+    build_seconds = time.perf_counter() - start_time
 
     # read dataset that is filtered and remove entities that don't appear in the entities dataset
+    entity_filter = EntityFilter(entities, filter_subject_only=filter_subject_only)
+    writer = TripleWriter(processed_dataset_filepath)
+    start_time = time.perf_counter()
     try:
-        n_triples_before = 0
-        n_triples_after = 0
-        for i, chunk in enumerate(pd.read_csv(dataset_filepath, chunksize=chunksize, **dataset_file_parsing_args)):
-            print(f"processing chunk {i+1}...")
-            if dataset_filetype == "ttl":
-                chunk = chunk.drop(columns=".")
-                # remove "<" and ">"
-                for col in chunk.columns:
-                    chunk[col] = chunk[col].str[1:-1]
-            n_triples_before = n_triples_before + len(chunk)
-
-            # filter entities
-            chunk = chunk.merge(entities, left_on="subject", right_on="entity")
-            chunk = chunk.drop(columns="entity")
-            if not filter_subject_only:
-                chunk = chunk.merge(entities, left_on="object", right_on="entity")
-                chunk = chunk.drop(columns="entity")
-            n_triples_after = n_triples_after + len(chunk)
-
-            # write back to file
-            chunk.to_csv(
-                processed_dataset_filepath,
-                index=False,
-                header=True if i == 0 else False,
-                mode="w" if i == 0 else "a"
-            )
+        stats = run_pipeline(
+            read_triple_chunks(dataset_filepath, dataset_filetype, chunksize),
+            [entity_filter],
+            [writer],
+            n_workers=n_workers
+        )
     except pd.errors.ParserError:
-        dataset_file_parsing_args = {"sep": ", "}
-        n_triples_before = 0
-        n_triples_after = 0
-        for i, chunk in enumerate(pd.read_csv(dataset_filepath, chunksize=chunksize, **dataset_file_parsing_args)):
-            print(f"processing chunk {i+1}...")
-            # remove " characters
-            for col in chunk.columns:
-                chunk[col] = chunk[col].str[1:-1]
-            n_triples_before = n_triples_before + len(chunk)
-
-            # filter entities
-            chunk = chunk.merge(entities, left_on="subject", right_on="entity")
-            chunk = chunk.drop(columns="entity")
-            if not filter_subject_only:
-                chunk = chunk.merge(entities, left_on="object", right_on="entity")
-                chunk = chunk.drop(columns="entity")
-            n_triples_after = n_triples_after + len(chunk)
-
-            # write back to file
-            chunk.to_csv(
-                processed_dataset_filepath,
-                index=False,
-                header=True if i == 0 else False,
-                mode="w" if i == 0 else "a"
-            )
+        writer.close()
+        writer = TripleWriter(processed_dataset_filepath)
+        stats = run_pipeline(
+            read_triple_chunks(dataset_filepath, "csv", chunksize, sep=", "),
+            [remove_quotes, entity_filter],
+            [writer],
+            n_workers=n_workers
+        )
+    writer.close()
+    filter_seconds = time.perf_counter() - start_time
 
+    # print statistics (triples before and after filtering, size of the entity set and times)
+    print_filter_statistics(stats)
+    print(f"\nentity set: {len(entities)} entities ({round(entities.nbytes / 1000000, 1)} MB)")
+    print(f"build time: {round(build_seconds, 1)} s, filter time: {round(filter_seconds, 1)} s")
 
-    # print statistics (triples before and after filtering)
-    print("\nnumber of triples\nbefore filtering\tafter filtering")
-    print(f"{n_triples_before}\t\t{n_triples_after} ({round(n_triples_after / n_triples_before, 3)})")
 
+def split_triples(dataset, val_test_fraction=5, random_state=42):
+    """
+    Splits a dataframe of triples into a training, validation and testing set. The split is performed in a way
+    that entity pairs can only exist in one part of the split and the split is stratified by the properties.
+
+    :param dataset: dataframe containing the triples
+    :type dataset: pd.DataFrame
+    :param val_test_fraction: determines validation and testing set size as 1 / val_test_fraction
+    :type val_test_fraction: int
+    :param random_state: random state for shuffling the dataset before splitting
+    :type random_state: int
+    :return: tuple of three dataframes (training, validation and testing set)
+    """
+    dataset = dataset.reset_index(drop=True)
+    pair_ids = create_pair_ids(dataset["subject"], dataset["object"])
+
+    # generate indexes for splitting the dataset
+    sgkf = StratifiedGroupKFold(n_splits=val_test_fraction, shuffle=True, random_state=random_state)
+    splitter = sgkf.split(
+        dataset[["subject", "object"]],
+        dataset["predicate"],
+        pair_ids
+    )
+    _, val_idx = next(splitter)
+    _, test_idx = next(splitter)
+    train_idx = np.setdiff1d(dataset.index, np.concatenate([test_idx, val_idx]))
+
+    # split the dataset using the indexes
+    train_df = dataset.iloc[train_idx]
+    val_df = dataset.iloc[val_idx]
+    test_df = dataset.iloc[test_idx]
 
+    return train_df, val_df, test_df
+
+
+def print_split_statistics(train_df, val_df, test_df):
+    """
+    Prints the number of triples and unique properties of the training, validation and testing set.
+    """
+    n_props_train = len(train_df["predicate"].unique())
+    n_props_val = len(val_df["predicate"].unique())
+    n_props_test = len(test_df["predicate"].unique())
+    print("\nnumber of triples\ntraining set\tvalidation set\ttesting set")
+    print(f"{len(train_df)}\t\t{len(val_df)}\t\t{len(test_df)}")
+    print("\nnumber of unique properties\ntraining set\tvalidation set\ttesting set")
+    print(f"{n_props_train}\t\t{n_props_val}\t\t{n_props_test}")
+
+
+def pair_buckets(subjects, objects, n_buckets=4096, random_state=42):
+    """
+    Assigns entity pairs (in any order) to one of n_buckets buckets with a seeded hash of their pair key.
+    The assignment only depends on the pair and the random state, so all triples of a pair end up in the
+    same bucket, no matter in which chunk or file they appear.
+
+    :param subjects: subject URIs
+    :type subjects: pd.Series
+    :param objects: object URIs
+    :type objects: pd.Series
+    :param n_buckets: number of buckets
+    :type n_buckets: int
+    :param random_state: seed of the hash
+    :type random_state: int
+    :return: numpy array of bucket indexes
+    """
+    keys = create_pair_ids(subjects, objects, method="hash").to_numpy()
+    # mix the seed into the keys with the splitmix64 finalizer
+    keys = keys ^ np.uint64((random_state * 0x9E3779B97F4A7C15) % 2**64)
+    keys = (keys ^ (keys >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    keys = (keys ^ (keys >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    keys = keys ^ (keys >> np.uint64(31))
+    return (keys % np.uint64(n_buckets)).astype(np.int64)
+
+
+def count_predicate_buckets(dataset_filepath, n_buckets=4096, random_state=42, chunksize=2000000):
+    """
+    Counts the triples of each predicate in each bucket of entity pairs (see pair_buckets).
+
+    :return: numpy array of shape (number of predicates, n_buckets)
+    """
+    counts = pd.Series(dtype=np.int64)
+    for i, chunk in enumerate(read_triple_chunks(dataset_filepath, "csv", chunksize)):
+        print(f"count triples per property and bucket (chunk {i+1})...")
+        buckets = pair_buckets(chunk["subject"], chunk["object"], n_buckets, random_state)
+        chunk_counts = pd.Series(buckets).groupby([chunk["predicate"].to_numpy(), buckets]).size()
+        counts = counts.add(chunk_counts, fill_value=0)
+    counts = counts.unstack(fill_value=0).reindex(columns=range(n_buckets), fill_value=0)
+    return counts.to_numpy(dtype=np.float64)
+
+
+def assign_buckets(predicate_bucket_counts, val_test_fraction=5):
+    """
+    Assigns each bucket of entity pairs to the training, validation or testing set, so that the share of each
+    predicate in each part is as close as possible to its quota (1 / val_test_fraction for validation and testing).
+    The buckets are assigned greedily, starting with the largest bucket, to the part that reduces the sum of the
+    squared deviations of all per-predicate shares from their quotas the most.
+
+    :param predicate_bucket_counts: number of triples per predicate (rows) and bucket (columns)
+    :type predicate_bucket_counts: np.ndarray
+    :param val_test_fraction: determines validation and testing set size as 1 / val_test_fraction
+    :type val_test_fraction: int
+    :return: numpy array containing the part (0: training, 1: validation, 2: testing) of each bucket
+    """
+    n_predicates, n_buckets = predicate_bucket_counts.shape
+    quotas = np.array([val_test_fraction - 2, 1, 1]) / val_test_fraction
+    totals = predicate_bucket_counts.sum(axis=1, keepdims=True)
+    totals[totals == 0] = 1
+    targets = totals * quotas
+    assigned = np.zeros((n_predicates, len(quotas)))
+    bucket_splits = np.zeros(n_buckets, dtype=np.int64)
+    for bucket in np.argsort(-predicate_bucket_counts.sum(axis=0), kind="stable"):
+        counts = predicate_bucket_counts[:, bucket:bucket+1]
+        deviation_before = ((assigned - targets) / totals) ** 2
+        deviation_after = ((assigned + counts - targets) / totals) ** 2
+        split = int(np.argmin((deviation_after - deviation_before).sum(axis=0)))
+        bucket_splits[bucket] = split
+        assigned[:, split] += counts[:, 0]
+    return bucket_splits
+
+
+def print_split_drift(predicate_split_counts, val_test_fraction=5):
+    """
+    Prints how far the shares of the predicates in the validation and testing set drift from 1 / val_test_fraction.
+
+    :param predicate_split_counts: number of triples per predicate (rows) and part of the split (columns)
+    :type predicate_split_counts: pd.DataFrame
+    """
+    shares = predicate_split_counts.div(predicate_split_counts.sum(axis=1), axis=0)
+    drift = (shares - np.array([val_test_fraction - 2, 1, 1]) / val_test_fraction).abs()
+    print(f"\ndrift of the property shares from {round(1 / val_test_fraction, 3)}\n\tvalidation set\ttesting set")
+    print(f"mean\t{round(drift[1].mean(), 4)}\t\t{round(drift[2].mean(), 4)}")
+    print(f"max\t{round(drift[1].max(), 4)}\t\t{round(drift[2].max(), 4)}")
+
+
+def split_dataset_streaming(
+        dataset_filepath,
+        trainset_filepath,
+        valset_filepath,
+        testset_filepath,
+        val_test_fraction=5,
+        random_state=42,
+        predicate_quotas=True,
+        n_buckets=4096,
+        chunksize=2000000
+    ):
+    """
+    Splits a dataset that doesn't fit into memory (see split_dataset). Entity pairs are assigned to one of n_buckets
+    buckets by a seeded hash (see pair_buckets) and each bucket is assigned to the training, validation or testing set.
+    With predicate_quotas=True, the triples per predicate and bucket are counted in a first pass and the buckets are
+    assigned so that each predicate is split approximately like 1 / val_test_fraction (see assign_buckets). Otherwise
+    buckets are assigned by their index and the split is only stratified in expectation. The triples are written to
+    the three parts in a single pass. More buckets reduce the drift of the property shares but the counts need
+    8 * n_buckets bytes per property.
+    """
+
+    # assign buckets of entity pairs to the parts of the split
+    if predicate_quotas:
+        predicate_bucket_counts = count_predicate_buckets(dataset_filepath, n_buckets, random_state, chunksize)
+        bucket_splits = assign_buckets(predicate_bucket_counts, val_test_fraction)
+    else:
+        bucket_splits = np.zeros(n_buckets, dtype=np.int64)
+        bucket_splits[np.arange(n_buckets) % val_test_fraction == 0] = 1
+        bucket_splits[np.arange(n_buckets) % val_test_fraction == 1] = 2
+
+    # write triples to the parts of the split
+    writers = [TripleWriter(trainset_filepath), TripleWriter(valset_filepath), TripleWriter(testset_filepath)]
+    predicate_split_counts = pd.DataFrame(columns=[0, 1, 2], dtype=np.int64)
+    for i, chunk in enumerate(read_triple_chunks(dataset_filepath, "csv", chunksize)):
+        print(f"split dataset (chunk {i+1})...")
+        splits = bucket_splits[pair_buckets(chunk["subject"], chunk["object"], n_buckets, random_state)]
+        for split, writer in enumerate(writers):
+            writer.write(chunk[splits == split])
+        add_stage_rows(len(chunk), len(chunk))
+        chunk_counts = pd.crosstab(chunk["predicate"].to_numpy(), splits).reindex(columns=[0, 1, 2], fill_value=0)
+        predicate_split_counts = predicate_split_counts.add(chunk_counts, fill_value=0)
+    for writer in writers:
+        writer.close()
+
+    # print out statistics
+    n_triples = predicate_split_counts.sum(axis=0).astype(int)
+    n_props = (predicate_split_counts > 0).sum(axis=0)
+    print("\nnumber of triples\ntraining set\tvalidation set\ttesting set")
+    print(f"{n_triples[0]}\t\t{n_triples[1]}\t\t{n_triples[2]}")
+    print("\nnumber of unique properties\ntraining set\tvalidation set\ttesting set")
+    print(f"{n_props[0]}\t\t{n_props[1]}\t\t{n_props[2]}")
+    print_split_drift(predicate_split_counts, val_test_fraction)
+
+
+@instrumented
 def split_dataset(
         dataset_filepath,
         trainset_filepath,
         valset_filepath,
         testset_filepath,
         val_test_fraction=5,
-        random_state=42
+        random_state=42,
+        method="exact",
+        predicate_quotas=True,
+        n_buckets=4096,
+        chunksize=2000000
     ):
     """
     This function is used to split a dataset of triples into a training, validation and testing set.
     The split is performed in a way that entity pairs can only exist in one part of the split and
-    the split is stratified by the properties. The function reads the whole dataset into memory so
-    it does not work with files that are too large for that.
+    the split is stratified by the properties. With method="exact" the function reads the whole dataset
+    into memory and splits it with sklearn's StratifiedGroupKFold, so it does not work with files that
+    are too large for that. With method="streaming" the dataset is split in chunks by hashing the entity
+    pairs and the stratification is approximated by per-property quotas (see split_dataset_streaming).
 
     :param dataset_filepath: path to the dataset that is split
     :type dataset_filepath: str
@@ -521,46 +1393,54 @@ def split_dataset(
     :type val_test_fraction: int
     :param random_state: random state for shuffling the dataset before splitting
     :type random_state: int
+    :param method: either "exact" or "streaming"
+    :type method: str
+    :param predicate_quotas: whether buckets of entity pairs are assigned by per-property quotas or by their index
+        (only used by the streaming method)
+    :type predicate_quotas: bool
+    :param n_buckets: number of buckets the entity pairs are hashed into (only used by the streaming method)
+    :type n_buckets: int
+    :param chunksize: size of the chunks that are read when iterating over the file (only used by the streaming method)
+    :type chunksize: int
     :return: None
     """
-    
-    dataset = pd.read_csv(dataset_filepath)
-    dataset["pair_id"] = dataset.apply(create_pair_id, axis=1)
 
-    # generate indexes for splitting the dataset
-    sgkf = StratifiedGroupKFold(n_splits=val_test_fraction, shuffle=True, random_state=random_state)
-    splitter = sgkf.split(
-        dataset[["subject", "object"]],
-        dataset["predicate"],
-        dataset["pair_id"]
-    )
-    _, val_idx = next(splitter)
-    _, test_idx = next(splitter)
-    train_idx = np.setdiff1d(dataset.index, np.concatenate([test_idx, val_idx]))
+    if method == "streaming":
+        split_dataset_streaming(
+            dataset_filepath,
+            trainset_filepath,
+            valset_filepath,
+            testset_filepath,
+            val_test_fraction=val_test_fraction,
+            random_state=random_state,
+            predicate_quotas=predicate_quotas,
+            n_buckets=n_buckets,
+            chunksize=chunksize
+        )
+        return
+    elif method != "exact":
+        print('Method can either be "exact" or "streaming"')
+        return
 
-    # split the dataset using the indexes
-    train_df = dataset.iloc[train_idx]
-    val_df = dataset.iloc[val_idx]
-    test_df = dataset.iloc[test_idx]
-    train_df = train_df.drop(columns="pair_id")
-    val_df = val_df.drop(columns="pair_id")
-    test_df = test_df.drop(columns="pair_id")
+    dataset = read_table(dataset_filepath)
+    train_df, val_df, test_df = split_triples(dataset, val_test_fraction=val_test_fraction, random_state=random_state)
+    add_stage_rows(len(dataset), len(train_df) + len(val_df) + len(test_df))
 
     # save sets into files
-    train_df.to_csv(trainset_filepath, index=False)
-    val_df.to_csv(valset_filepath, index=False)
-    test_df.to_csv(testset_filepath, index=False)
+    write_table(train_df, trainset_filepath)
+    write_table(val_df, valset_filepath)
+    write_table(test_df, testset_filepath)
 
     # print out statistics
-    n_props_train = len(train_df["predicate"].unique())
-    n_props_val = len(val_df["predicate"].unique())
-    n_props_test = len(test_df["predicate"].unique())
-    print("\nnumber of triples\ntraining set\tvalidation set\ttesting set")
-    print(f"{len(train_df)}\t\t{len(val_df)}\t\t{len(test_df)}")
-    print("\nnumber of unique properties\ntraining set\tvalidation set\ttesting set")
-    print(f"{n_props_train}\t\t{n_props_val}\t\t{n_props_test}")
+    print_split_statistics(train_df, val_df, test_df)
+    predicate_split_counts = pd.concat(
+        [df["predicate"].value_counts().rename(split) for split, df in enumerate([train_df, val_df, test_df])],
+        axis=1
+    ).fillna(0)
+    print_split_drift(predicate_split_counts, val_test_fraction)
 
 
+@instrumented
 def concat_files(filepaths, filetypes, processed_dataset_filepath, chunksize=2000000):
     """
     This function is used to concatenate multiple files containing triples into one TSV file that can be used with pykeen.
@@ -577,32 +1457,348 @@ def concat_files(filepaths, filetypes, processed_dataset_filepath, chunksize=200
     :return: None
     """
 
-    # iterate over filepaths and filetypes
+    # iterate over filepaths and filetypes and write them to the file containing the concatenated files
+    writer = TripleWriter(processed_dataset_filepath, sep="\t", header=False)
     for i, (filepath, filetype) in enumerate(zip(filepaths, filetypes)):
         print(f"reading file {i+1}")
-        # define and store file parsing arguments
-        csv_file_parsing_args = {}
-        ttl_file_parsing_args = {"sep": " ", "header": None, "names": ["subject", "predicate", "object", "."]}
-        if filetype == "csv":
-            dataset_file_parsing_args = csv_file_parsing_args
-        elif filetype == "ttl":
-            dataset_file_parsing_args = ttl_file_parsing_args
-        else:
+        # check file type
+        if filetype not in FILETYPES:
             print('File type can either be "csv" or "ttl"')
+            writer.close()
             return
+        run_pipeline(read_triple_chunks(filepath, filetype, chunksize), [], [writer], description="concatenate")
+    writer.close()
 
-        # iterate over file and write it to the file containing the concatenated files
-        for j, chunk in enumerate(pd.read_csv(filepath, chunksize=chunksize, **dataset_file_parsing_args)):
-            print(f"\nchunk {j+1}...")
-            if filetype == "ttl":
-                chunk = chunk.drop(columns=".")
-                # remove "<" and ">"
-                for col in chunk.columns:
-                    chunk[col] = chunk[col].str[1:-1]
-            chunk.to_csv(
-                processed_dataset_filepath,
-                sep="\t",
-                index=False,
-                header=False,
-                mode="w" if i == 0 and j == 0 else "a"
-            )
\ No newline at end of file
+
+# arguments for reading the TSV files that are written by concat_files in the same way as pykeen reads them
+# (no header, no quoting and no missing values)
+TSV_PARSING_ARGS = {
+    "sep": "\t",
+    "header": None,
+    "names": ["subject", "predicate", "object"],
+    "quoting": csv.QUOTE_NONE,
+    "na_filter": False,
+    "dtype": str
+}
+# files of the binary triples (see create_binary_triples)
+BINARY_TRIPLES_METADATA_FILENAME = "metadata.json"
+BINARY_TRIPLES_URIS_DIRNAME = "uris"
+
+
+@instrumented
+def create_binary_triples(train_filepath, val_filepath, test_filepath, binary_dirpath, chunksize=2000000):
+    """
+    This function is used to store the training, validation and testing TSV files (see concat_files) as binary triples
+    that pykeen can load without parsing the TSV files and building the label to ID mappings (see read_binary_triples).
+    All URIs of the three files are stored in a URI dictionary and each file is stored as int32 array of the
+    (subject, predicate, object) IDs of the dictionary, together with the size and modification time of the file.
+
+    :param train_filepath: file path of the training set
+    :type train_filepath: str
+    :param val_filepath: file path of the validation set
+    :type val_filepath: str
+    :param test_filepath: file path of the testing set
+    :type test_filepath: str
+    :param binary_dirpath: directory in which the binary triples are stored
+    :type binary_dirpath: str
+    :param chunksize: size of the chunks that are read when iterating over the files
+    :type chunksize: int
+    :return: None
+    """
+
+    filepaths = {"train": train_filepath, "val": val_filepath, "test": test_filepath}
+    uris_dirpath = os.path.join(binary_dirpath, BINARY_TRIPLES_URIS_DIRNAME)
+    build_uri_dictionary(list(filepaths.values()), ["csv"] * 3, uris_dirpath, chunksize, **TSV_PARSING_ARGS)
+    encoder = UriEncoder(UriDictionary(uris_dirpath))
+
+    # encode triples of each file and append them to its binary file
+    metadata = {"n_triples": {}, "sources": {}}
+    for split, filepath in filepaths.items():
+        n_triples = 0
+        with open(os.path.join(binary_dirpath, f"{split}.bin"), "wb") as f:
+            for i, chunk in enumerate(read_triple_chunks(filepath, "csv", chunksize, **TSV_PARSING_ARGS)):
+                print(f"write binary {split} triples (chunk {i+1})...")
+                chunk, _ = encoder(chunk)
+                chunk.to_numpy(dtype=np.int32).tofile(f)
+                n_triples += len(chunk)
+        add_stage_rows(n_triples, n_triples)
+        stat = os.stat(filepath)
+        metadata["n_triples"][split] = n_triples
+        metadata["sources"][split] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    with open(os.path.join(binary_dirpath, BINARY_TRIPLES_METADATA_FILENAME), "w") as f:
+        json.dump(metadata, f)
+
+
+def binary_triples_up_to_date(binary_dirpath, filepaths):
+    """
+    Returns whether the binary triples exist and were created from the current versions of the files
+    (dictionary of split name and file path).
+    """
+    metadata_filepath = os.path.join(binary_dirpath, BINARY_TRIPLES_METADATA_FILENAME)
+    if not os.path.isfile(metadata_filepath):
+        return False
+    with open(metadata_filepath) as f:
+        sources = json.load(f)["sources"]
+    for split, filepath in filepaths.items():
+        if split not in sources or not os.path.isfile(filepath):
+            return False
+        stat = os.stat(filepath)
+        if sources[split]["size"] != stat.st_size or sources[split]["mtime_ns"] != stat.st_mtime_ns:
+            return False
+    return True
+
+
+def read_binary_triples(binary_dirpath, splits=("train", "val", "test"), entity_to_id=None, relation_to_id=None):
+    """
+    Reads binary triples (see create_binary_triples) and maps them to the IDs of pykeen. The binary files are
+    memory-mapped. Without provided mappings, the mappings are created like pykeen creates them for the training
+    set: the sorted labels of all entities (subjects and objects) and relations (predicates) of the training set. As in
+    pykeen, triples with labels that are not in the mappings are removed.
+
+    :param binary_dirpath: directory of the binary triples
+    :type binary_dirpath: str
+    :param splits: splits that are read ("train", "val" and / or "test")
+    :type splits: tuple
+    :param entity_to_id: mapping of entity labels to IDs
+    :type entity_to_id: dict
+    :param relation_to_id: mapping of relation labels to IDs
+    :type relation_to_id: dict
+    :return: tuple of a dictionary of int64 arrays of mapped triples per split, entity_to_id and relation_to_id
+    """
+    with open(os.path.join(binary_dirpath, BINARY_TRIPLES_METADATA_FILENAME)) as f:
+        n_triples = json.load(f)["n_triples"]
+    uri_dictionary = UriDictionary(os.path.join(binary_dirpath, BINARY_TRIPLES_URIS_DIRNAME))
+
+    def load_triples(split):
+        filepath = os.path.join(binary_dirpath, f"{split}.bin")
+        if n_triples[split] == 0:
+            return np.zeros((0, 3), dtype=np.int32)
+        return np.memmap(filepath, dtype=np.int32, mode="r", shape=(n_triples[split], 3))
+
+    def mapping_ids(label_to_id, columns):
+        # array that maps the dictionary IDs to the IDs of the mapping (-1 for labels that are not in the mapping)
+        ids = np.full(len(uri_dictionary), -1, dtype=np.int64)
+        if label_to_id is None:
+            # the IDs of the dictionary are in sorted order of the labels, so are the IDs of the training set's labels
+            train_triples = load_triples("train")
+            is_label = np.zeros(len(uri_dictionary), dtype=bool)
+            for column in columns:
+                is_label[train_triples[:, column]] = True
+            labels_ids = np.flatnonzero(is_label)
+            ids[labels_ids] = np.arange(len(labels_ids))
+            label_to_id = dict(zip(uri_dictionary.decode(labels_ids), range(len(labels_ids))))
+        else:
+            dictionary_ids = uri_dictionary.encode(list(label_to_id.keys()))
+            mapped_ids = np.fromiter(label_to_id.values(), dtype=np.int64, count=len(label_to_id))
+            ids[dictionary_ids[dictionary_ids >= 0]] = mapped_ids[dictionary_ids >= 0]
+        return ids, label_to_id
+
+    entity_ids, entity_to_id = mapping_ids(entity_to_id, [0, 2])
+    relation_ids, relation_to_id = mapping_ids(relation_to_id, [1])
+    mapped_triples = {}
+    for split in splits:
+        triples = load_triples(split)
+        mapped_triples[split] = np.stack(
+            [entity_ids[triples[:, 0]], relation_ids[triples[:, 1]], entity_ids[triples[:, 2]]],
+            axis=1
+        )
+        is_mapped = (mapped_triples[split] >= 0).all(axis=1)
+        if not is_mapped.all():
+            print(f"{(~is_mapped).sum()} {split} triples with unknown labels are removed")
+            mapped_triples[split] = mapped_triples[split][is_mapped]
+    return mapped_triples, entity_to_id, relation_to_id
+
+
+@instrumented
+def preprocess_datasets(
+        mw_both_sides_filepath,
+        mw_one_side_filepath,
+        mw_no_props_filepath,
+        remaining_triples_filepath,
+        types_filepath,
+        filtered_property_types_filepath,
+        redirections_filepath,
+        results_dir_filepath,
+        types_filetype="ttl",
+        redirections_filetype="ttl",
+        redirections_index_filepath=None,
+        uri_dictionary_dirpath=None,
+        include_patterns=("^http://dbpedia.org/resource/",),
+        exclude_patterns=("__CareerStation__",),
+        val_test_fraction=5,
+        random_state=42,
+        chunksize=2000000,
+        n_workers=1
+    ):
+    """
+    Runs the complete data preprocessing (as documented in data_preprocessing.ipynb) as one streaming pipeline.
+    All steps are applied to each chunk in memory and only the final datasets are written, no intermediate files
+    are created. The results are identical to chaining filter_triples_by_uri, fix_redirections, filter_properties,
+    filter_entities, split_dataset and concat_files. The following files are written to the results directory:
+    train.tsv, train_w_types.tsv, val.tsv, test.tsv and mw_no_props.csv.
+
+    Only the datasets of mutually wikilinked entities with properties are kept in memory, because they are split
+    into training, validation and testing set as a whole.
+
+    If a URI dictionary directory is provided, all chunks are encoded to int32 IDs after reading and all filters,
+    redirections and joins operate on the IDs. The URIs are only decoded when the final datasets are written.
+    The dictionary is built from the input datasets if the directory doesn't exist yet.
+
+    :param mw_both_sides_filepath: file path of the exported mutual wikilinks with both-sided properties dataset
+    :type mw_both_sides_filepath: str
+    :param mw_one_side_filepath: file path of the exported mutual wikilinks with one-sided properties dataset
+    :type mw_one_side_filepath: str
+    :param mw_no_props_filepath: file path of the exported mutual wikilinks without properties dataset
+    :type mw_no_props_filepath: str
+    :param remaining_triples_filepath: file path of the exported remaining triples dataset
+    :type remaining_triples_filepath: str
+    :param types_filepath: file path of the entity types dataset
+    :type types_filepath: str
+    :param filtered_property_types_filepath: file path of the file containing the subset of property types that are filtered
+    :type filtered_property_types_filepath: str
+    :param redirections_filepath: file path of the redirections dataset
+    :type redirections_filepath: str
+    :param results_dir_filepath: directory in which the final datasets are stored
+    :type results_dir_filepath: str
+    :param types_filetype: file type of the types dataset, either "csv" or "ttl"
+    :type types_filetype: str
+    :param redirections_filetype: file type of the redirections dataset, either "csv" or "ttl"
+    :type redirections_filetype: str
+    :param redirections_index_filepath: optional file path under which the redirections index is stored and reused
+    :type redirections_index_filepath: str
+    :param uri_dictionary_dirpath: optional directory of the URI dictionary (see uri_dictionary_utility.py)
+    :type uri_dictionary_dirpath: str
+    :param include_patterns: only remaining triples whose subject and object URIs match one of these patterns are kept (see UriMatcher)
+    :type include_patterns: tuple
+    :param exclude_patterns: remaining triples whose subject or object URI matches one of these patterns are removed
+    :type exclude_patterns: tuple
+    :param val_test_fraction: determines validation and testing set size as 1 / val_test_fraction
+    :type val_test_fraction: int
+    :param random_state: random state for shuffling the datasets before splitting
+    :type random_state: int
+    :param chunksize: size of the chunks that are read when iterating over the files
+    :type chunksize: int
+    :param n_workers: number of worker processes that process the chunks in parallel (see run_pipeline)
+    :type n_workers: int
+    :return: None
+    """
+    if types_filetype not in FILETYPES:
+        print('File type can either be "csv" or "ttl"')
+        return
+
+    # read lookup data once
+    redirections = read_redirections(
+        redirections_filepath,
+        redirections_filetype=redirections_filetype,
+        redirections_index_filepath=redirections_index_filepath,
+        chunksize=chunksize
+    )
+    if redirections is None:
+        return
+    filtered_property_types = read_table(filtered_property_types_filepath)["filtered_property_types"]
+
+    # build or load URI dictionary and encode the chunks of all datasets after reading
+    uri_dictionary = None
+    encoder = []
+    if uri_dictionary_dirpath is not None:
+        update_uri_dictionary(
+            [remaining_triples_filepath, types_filepath, mw_both_sides_filepath, mw_one_side_filepath, mw_no_props_filepath, redirections_filepath],
+            ["csv", types_filetype, "csv", "csv", "csv", redirections_filetype],
+            uri_dictionary_dirpath,
+            chunksize=chunksize
+        )
+        uri_dictionary = UriDictionary(uri_dictionary_dirpath)
+        encoder = [UriEncoder(uri_dictionary)]
+    redirection_fixer = RedirectionFixer(redirections, uri_dictionary=uri_dictionary)
+    property_filter = PropertyFilter(filtered_property_types, uri_dictionary=uri_dictionary)
+
+    # final datasets
+    train_writer = TripleWriter(os.path.join(results_dir_filepath, "train.tsv"), sep="\t", header=False, uri_dictionary=uri_dictionary)
+    train_w_types_writer = TripleWriter(os.path.join(results_dir_filepath, "train_w_types.tsv"), sep="\t", header=False, uri_dictionary=uri_dictionary)
+    val_writer = TripleWriter(os.path.join(results_dir_filepath, "val.tsv"), sep="\t", header=False, uri_dictionary=uri_dictionary)
+    test_writer = TripleWriter(os.path.join(results_dir_filepath, "test.tsv"), sep="\t", header=False, uri_dictionary=uri_dictionary)
+
+    # remaining triples: remove entities outside of DBpedia and career stations, fix redirections and filter properties
+    # the entities of the processed remaining triples are used to filter the other datasets
+    print("\nprocess remaining triples...")
+    entity_collector = EntityCollector()
+    stats = run_pipeline(
+        read_triple_chunks(remaining_triples_filepath, "csv", chunksize),
+        encoder + [
+            UriFilter(include_patterns, exclude_patterns, uri_dictionary=uri_dictionary),
+            redirection_fixer,
+            property_filter
+        ],
+        [train_writer, train_w_types_writer, entity_collector],
+        n_workers=n_workers
+    )
+    print_filter_statistics(stats)
+    entities = entity_collector.get_entity_set()
+
+    # types: fix redirections of subjects and filter entities
+    print("\nprocess types...")
+    stats = run_pipeline(
+        read_triple_chunks(types_filepath, types_filetype, chunksize),
+        encoder + [
+            RedirectionFixer(redirections, subjects_only=True, uri_dictionary=uri_dictionary),
+            EntityFilter(entities, filter_subject_only=True)
+        ],
+        [train_w_types_writer],
+        n_workers=n_workers
+    )
+    print_filter_statistics(stats)
+
+    # mutual wikilinks with properties: fix redirections, filter properties and entities and split the datasets
+    for name, filepath in [("both-sided", mw_both_sides_filepath), ("one-sided", mw_one_side_filepath)]:
+        print(f"\nprocess mutual wikilinks with {name} properties...")
+        collector = TripleCollector()
+        try:
+            stats = run_pipeline(
+                read_triple_chunks(filepath, "csv", chunksize),
+                encoder + [redirection_fixer, property_filter, EntityFilter(entities)],
+                [collector],
+                n_workers=n_workers
+            )
+        except pd.errors.ParserError:
+            collector = TripleCollector()
+            stats = run_pipeline(
+                read_triple_chunks(filepath, "csv", chunksize, sep=", "),
+                [remove_quotes] + encoder + [redirection_fixer, property_filter, EntityFilter(entities)],
+                [collector],
+                n_workers=n_workers
+            )
+        print_filter_statistics(stats)
+        # the split depends on the URIs of the entity pairs, so encoded triples are split by their decoded URIs
+        triples = collector.get_triples()
+        split_input = decode_triples(triples, uri_dictionary) if uri_dictionary is not None else triples
+        splits = split_triples(split_input, val_test_fraction=val_test_fraction, random_state=random_state)
+        train_df, val_df, test_df = [triples.loc[split.index] for split in splits]
+        print_split_statistics(train_df, val_df, test_df)
+        train_writer.write(train_df)
+        train_w_types_writer.write(train_df)
+        val_writer.write(val_df)
+        test_writer.write(test_df)
+    for writer in [train_writer, train_w_types_writer, val_writer, test_writer]:
+        writer.close()
+
+    # mutual wikilinks without properties: fix redirections and filter entities
+    print("\nprocess mutual wikilinks without properties...")
+    mw_no_props_writer = TripleWriter(os.path.join(results_dir_filepath, "mw_no_props.csv"), uri_dictionary=uri_dictionary)
+    try:
+        stats = run_pipeline(
+            read_triple_chunks(mw_no_props_filepath, "csv", chunksize),
+            encoder + [redirection_fixer, EntityFilter(entities)],
+            [mw_no_props_writer],
+            n_workers=n_workers
+        )
+    except pd.errors.ParserError:
+        mw_no_props_writer.close()
+        mw_no_props_writer = TripleWriter(os.path.join(results_dir_filepath, "mw_no_props.csv"), uri_dictionary=uri_dictionary)
+        stats = run_pipeline(
+            read_triple_chunks(mw_no_props_filepath, "csv", chunksize, sep=", "),
+            [remove_quotes] + encoder + [redirection_fixer, EntityFilter(entities)],
+            [mw_no_props_writer],
+            n_workers=n_workers
+        )
+    mw_no_props_writer.close()
+    print_filter_statistics(stats)
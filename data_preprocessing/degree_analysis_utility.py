@@ -0,0 +1,378 @@
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from io_utility import FILETYPES, read_triple_chunks
+from uri_dictionary_utility import update_uri_dictionary, UriDictionary
+from data_preprocessing_utility import process_chunks
+from knowledge_graph_utility import WIKILINK, RDF_TYPE
+from instrumentation_utility import instrumented
+
+# Streaming replacement of the degree analysis in analyze_data.cypher. The DBpedia dumps are read once and the
+# degrees and numbers of types of all entities are counted in int32 arrays over the IDs of a URI dictionary. The
+# distributions of these counts are summarized by KLL quantile sketches, which are built for blocks of entity IDs
+# (in parallel worker processes if requested) and merged afterwards. The tables are printed in the layout of
+# neo4j_analyze_data_log.txt.
+
+# percentiles of the percentileDisc columns in analyze_data.cypher
+PERCENTILES = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99, 0.999]
+TABLE_HEADER = "mean, min, 0.10, 0.20, 0.30, 0.40, 0.50, 0.60, 0.70, 0.80, 0.90, 0.95, 0.99, 0.999, max"
+
+# per-entity counts of the streaming pass (rows of DegreeCounts.counts)
+COUNT_COLUMNS = [
+    "in_degree_wikilinks",
+    "out_degree_wikilinks",
+    "in_degree_all_except_wikilinks",
+    "out_degree_all_except_wikilinks",
+    "n_types"
+]
+
+# degree tables of analyze_data.cypher: section title, links of the degree columns
+DEGREE_SECTIONS = [
+    ("In-, out- and undirected degree of all links", "all"),
+    ("In-, out- and undirected degree of wikilinks", "wikilinks"),
+    ("In-, out- and undirected degree of all links except wikilinks", "all_except_wikilinks")
+]
+DEGREE_TABLES = [("In-degree", "in_degree"), ("Out-degree", "out_degree"), ("Undirected degree", "undirected_degree")]
+
+# empirical single-sided normalized rank error of KLL sketches with parameter k: 2.296 / k ** 0.9723
+# (measured by the Apache DataSketches project)
+RANK_ERROR_FACTOR = 2.296
+RANK_ERROR_EXPONENT = 0.9723
+
+
+def kll_k(rank_error):
+    """
+    Returns the smallest KLL parameter k whose expected normalized rank error is at most rank_error.
+    """
+    return max(int(np.ceil((RANK_ERROR_FACTOR / rank_error) ** (1 / RANK_ERROR_EXPONENT))), 8)
+
+
+class KllSketch:
+    """
+    Mergeable KLL quantile sketch (Karnin, Lang and Liberty, 2016). The values are stored in levels, a value in level
+    h represents 2**h values of the input. When a level exceeds its capacity it is sorted and every other value is
+    moved to the next level, starting at a random offset. The capacities shrink by a factor of 2/3 from the top level
+    down, so the sketch stores about 3k values. Quantiles have a normalized rank error of about rank_error, while
+    count, sum, min and max are exact. Sketches with the same rank_error are merged with merge, e.g. sketches of
+    different worker processes.
+
+    :param rank_error: expected normalized rank error of the quantiles, e.g. 0.001 for 0.1% of the ranks
+    :type rank_error: float
+    :param random_state: seed of the random compaction offsets
+    :type random_state: int
+    """
+
+    def __init__(self, rank_error=0.0001, random_state=None):
+        self.rank_error = rank_error
+        self.k = kll_k(rank_error)
+        self.rng = np.random.default_rng(random_state)
+        self.levels = [np.zeros(0, dtype=np.float64)]
+        self.count = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def capacity(self, level):
+        """
+        Returns the number of values that a level can hold before it is compacted.
+        """
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), 8)
+
+    def update(self, values):
+        """
+        Adds an array of values to the sketch and returns the sketch.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return self
+        self.count += len(values)
+        self.total += values.sum()
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.compress()
+        return self
+
+    def merge(self, other):
+        """
+        Adds the values summarized by another sketch to the sketch and returns the sketch.
+        """
+        if other.count == 0:
+            return self
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.zeros(0, dtype=np.float64))
+        for level, values in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], values])
+        self.compress()
+        return self
+
+    def compress(self):
+        """
+        Compacts all levels that exceed their capacity, from the lowest level up.
+        """
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self.capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.zeros(0, dtype=np.float64))
+                values = np.sort(self.levels[level])
+                # with an odd number of values, the largest value stays in the level
+                n_compacted = len(values) - len(values) % 2
+                offset = self.rng.integers(2)
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], values[offset:n_compacted:2]])
+                self.levels[level] = values[n_compacted:]
+            level += 1
+
+    def quantiles(self, percentiles):
+        """
+        Returns the values at the percentiles like percentileDisc in neo4j: the smallest value whose (weighted) rank
+        is at least percentile * count.
+        """
+        if self.count == 0:
+            return [np.nan] * len(percentiles)
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level_values), 2 ** level, dtype=np.int64) for level, level_values in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        values = values[order]
+        ranks = np.cumsum(weights[order])
+        targets = np.maximum(np.ceil(np.asarray(percentiles) * ranks[-1]), 1)
+        return values[np.minimum(np.searchsorted(ranks, targets), len(values) - 1)].tolist()
+
+    def mean(self):
+        return self.total / self.count if self.count > 0 else np.nan
+
+    def table_row(self, as_float=True):
+        """
+        Returns the values of a row of the analysis tables (mean, min, percentiles and max).
+        """
+        values = [self.min] + self.quantiles(PERCENTILES) + [self.max]
+        values = [float(value) if as_float else int(value) for value in values]
+        return [self.mean()] + values
+
+
+class DegreeCounter:
+    """
+    Operator (see data_preprocessing_utility.run_pipeline) that encodes the triples of a chunk and replaces them with
+    the counts of the chunk per entity (entity ID, index of the count column, count), which are summed up by
+    DegreeCounts.add. Triples with literal objects are ignored, as they are no relationships in neo4j. Like in neo4j,
+    duplicate triples are counted once, but only duplicates within a chunk are removed (duplicates in different
+    chunks or files, e.g. types in both the specific and the transitive types dump, are counted more than once).
+    """
+
+    def __init__(self, uri_dictionary):
+        self.uri_dictionary = uri_dictionary
+
+    def __call__(self, chunk):
+        chunk = chunk[~chunk["object"].str.startswith('"')]
+        subjects = self.uri_dictionary.encode(chunk["subject"])
+        predicates = self.uri_dictionary.encode(chunk["predicate"])
+        objects = self.uri_dictionary.encode(chunk["object"])
+        if (subjects < 0).any() or (objects < 0).any():
+            raise ValueError(f"{(subjects < 0).sum() + (objects < 0).sum()} URIs are not in the URI dictionary")
+        # duplicate triples are one relationship (or label) in neo4j
+        is_unique = ~pd.DataFrame({"subject": subjects, "predicate": predicates, "object": objects}).duplicated().to_numpy()
+        subjects = subjects[is_unique]
+        objects = objects[is_unique]
+        is_wikilink = (chunk["predicate"] == WIKILINK).to_numpy()[is_unique]
+        is_type = (chunk["predicate"] == RDF_TYPE).to_numpy()[is_unique]
+        is_property = ~is_wikilink & ~is_type
+        entities = [objects[is_wikilink], subjects[is_wikilink], objects[is_property], subjects[is_property], subjects[is_type]]
+        counts = []
+        for column, ids in enumerate(entities):
+            ids, n = np.unique(ids, return_counts=True)
+            counts.append(pd.DataFrame({
+                "entity": ids,
+                "column": np.full(len(ids), column, dtype=np.int8),
+                "count": n.astype(np.int32)
+            }))
+        return pd.concat(counts, ignore_index=True), {}
+
+
+class DegreeCounts:
+    """
+    Per-entity counts of the columns in COUNT_COLUMNS over the IDs of a URI dictionary with n URIs. The counts of
+    different chunks (see DegreeCounter) or of different DegreeCounts are summed up with add and merge.
+    """
+
+    def __init__(self, n):
+        self.counts = np.zeros((len(COUNT_COLUMNS), n), dtype=np.int32)
+
+    def add(self, chunk_counts):
+        # each (column, entity) combination appears only once per chunk, so the counts can be added without np.add.at
+        columns = chunk_counts["column"].to_numpy()
+        entities = chunk_counts["entity"].to_numpy()
+        self.counts[columns, entities] += chunk_counts["count"].to_numpy()
+
+    def merge(self, other):
+        self.counts += other.counts
+
+
+def node_statistics(counts):
+    """
+    Returns a dataframe with the number of types and the in-, out- and undirected degrees of all links, of wikilinks
+    and of all links except wikilinks (like KnowledgeGraph.node_statistics) for an array of counts with one row per
+    column of COUNT_COLUMNS. Entities that neither appear in links nor have types are not included.
+    """
+    statistics = pd.DataFrame({column: values for column, values in zip(COUNT_COLUMNS, counts)})
+    statistics["in_degree_all"] = statistics["in_degree_wikilinks"] + statistics["in_degree_all_except_wikilinks"]
+    statistics["out_degree_all"] = statistics["out_degree_wikilinks"] + statistics["out_degree_all_except_wikilinks"]
+    for links in ["all", "wikilinks", "all_except_wikilinks"]:
+        statistics[f"undirected_degree_{links}"] = statistics[f"in_degree_{links}"] + statistics[f"out_degree_{links}"]
+    is_node = (statistics["n_types"] > 0) | (statistics["undirected_degree_all"] > 0)
+    return statistics[is_node]
+
+
+def sketch_node_statistics(statistics, rank_error=0.0001, random_state=None):
+    """
+    Returns a dictionary with one KllSketch per column of a node statistics dataframe (see node_statistics and
+    KnowledgeGraph.node_statistics) and the number of entities with wikilinks.
+    """
+    sketches = {
+        column: KllSketch(rank_error, None if random_state is None else random_state + i).update(statistics[column].to_numpy())
+        for i, column in enumerate(statistics.columns)
+    }
+    return sketches, int((statistics["undirected_degree_wikilinks"] > 0).sum())
+
+
+def sketch_counts_block(counts, rank_error, random_state):
+    """
+    Sketches the node statistics of a block of counts (used by the worker processes of sketch_degree_counts).
+    """
+    return sketch_node_statistics(node_statistics(counts), rank_error, random_state)
+
+
+def merge_sketches(partial_sketches):
+    """
+    Merges the results of sketch_node_statistics for different entities, e.g. of different worker processes.
+    """
+    sketches, n_with_wikilinks = None, 0
+    for block_sketches, block_n_with_wikilinks in partial_sketches:
+        if sketches is None:
+            sketches = block_sketches
+        else:
+            for column, sketch in block_sketches.items():
+                sketches[column].merge(sketch)
+        n_with_wikilinks += block_n_with_wikilinks
+    return sketches, n_with_wikilinks
+
+
+def sketch_degree_counts(degree_counts, rank_error=0.0001, block_size=4000000, n_workers=1, random_state=42):
+    """
+    Sketches the node statistics of DegreeCounts in blocks of entity IDs and merges the sketches of the blocks. With
+    n_workers > 1 the blocks are sketched by a pool of worker processes.
+    """
+    n = degree_counts.counts.shape[1]
+    blocks = [degree_counts.counts[:, start:start + block_size] for start in range(0, max(n, 1), block_size)]
+    seeds = [None if random_state is None else random_state + 100 * i for i in range(len(blocks))]
+    if n_workers <= 1:
+        return merge_sketches(sketch_counts_block(block, rank_error, seed) for block, seed in zip(blocks, seeds))
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return merge_sketches(executor.map(sketch_counts_block, blocks, [rank_error] * len(blocks), seeds))
+
+
+def print_status(status):
+    print("STATUS")
+    print(f'"{status}"')
+
+
+def print_distribution(status, sketch, as_float=True):
+    """
+    Prints a distribution table like in neo4j_analyze_data_log.txt (mean, min, percentiles and max).
+    """
+    print_status(status)
+    print(TABLE_HEADER)
+    print(", ".join(str(value) for value in sketch.table_row(as_float)))
+
+
+def print_degree_analysis(sketches, n_with_wikilinks):
+    """
+    Prints the degree distributions, the distribution of the number of types per entity (and of the number of mutual
+    wikilinks if it was sketched) and the entity counts in the layout of neo4j_analyze_data_log.txt.
+    """
+    for section, links in DEGREE_SECTIONS:
+        print_status(section)
+        for status, degree in DEGREE_TABLES:
+            print_distribution(status, sketches[f"{degree}_{links}"])
+    if "n_mutual_wikilinks" in sketches:
+        print_distribution("Distribution of number of mutual Wikilinks per entity", sketches["n_mutual_wikilinks"])
+    print_distribution("Distribution of number of types per entity", sketches["n_types"], as_float=False)
+    print_status("Count of all entities")
+    print("count (all nodes)")
+    print(sketches["n_types"].count)
+    print_status("Count of entities with wikilinks")
+    print("count (nodes with wikilinks)")
+    print(n_with_wikilinks)
+
+
+@instrumented
+def analyze_degrees(
+        filepaths,
+        uri_dictionary_dirpath,
+        filetypes=None,
+        rank_error=0.0001,
+        chunksize=2000000,
+        block_size=4000000,
+        n_workers=1,
+        random_state=42
+    ):
+    """
+    This function computes the degree distributions of analyze_data.cypher in one pass over the DBpedia dumps that
+    were loaded into the neo4j database, without a database. The degrees and numbers of types are counted per entity,
+    their distributions are summarized by KLL sketches and printed in the layout of neo4j_analyze_data_log.txt. The
+    mean, min, max and counts are exact, the percentiles have a normalized rank error of about rank_error. Duplicate
+    triples are only counted once within a chunk (see DegreeCounter). All URIs are stored in a URI dictionary first,
+    which is reused if it was built from the current versions of the dumps (e.g. by load_knowledge_graph).
+
+    :param filepaths: list of file paths of the dumps, e.g. wikilinks, object properties and instance types
+    :type filepaths: list
+    :param uri_dictionary_dirpath: directory of the URI dictionary
+    :type uri_dictionary_dirpath: str
+    :param filetypes: list of file types (either "csv" or "ttl"), defaults to "ttl" for all files
+    :type filetypes: list
+    :param rank_error: expected normalized rank error of the percentiles
+    :type rank_error: float
+    :param chunksize: size of the chunks that are read when iterating over the files
+    :type chunksize: int
+    :param block_size: number of entity IDs per sketched block
+    :type block_size: int
+    :param n_workers: number of worker processes that count the chunks and sketch the blocks in parallel
+    :type n_workers: int
+    :param random_state: seed of the random compactions of the sketches
+    :type random_state: int
+    :return: tuple of a dictionary with a KllSketch per node statistic and the number of entities with wikilinks
+    """
+    if filetypes is None:
+        filetypes = ["ttl"] * len(filepaths)
+
+    # check file types
+    if any(filetype not in FILETYPES for filetype in filetypes):
+        print('File type can either be "csv" or "ttl"')
+        return None
+
+    update_uri_dictionary(filepaths, filetypes, uri_dictionary_dirpath, chunksize=chunksize)
+    uri_dictionary = UriDictionary(uri_dictionary_dirpath)
+
+    chunks = (
+        chunk
+        for filepath, filetype in zip(filepaths, filetypes)
+        for chunk in read_triple_chunks(filepath, filetype, chunksize)
+    )
+    degree_counts = DegreeCounts(len(uri_dictionary))
+    for i, (chunk_counts, _) in enumerate(process_chunks(chunks, [DegreeCounter(uri_dictionary)], n_workers)):
+        print(f"count degrees (chunk {i+1})...")
+        degree_counts.add(chunk_counts)
+
+    print("sketch degree distributions...\n")
+    sketches, n_with_wikilinks = sketch_degree_counts(degree_counts, rank_error, block_size, n_workers, random_state)
+    print_degree_analysis(sketches, n_with_wikilinks)
+    return sketches, n_with_wikilinks
+
+
+if __name__ == "__main__":
+    analyze_degrees(sys.argv[2:], sys.argv[1])
@@ -0,0 +1,238 @@
+import csv
+import sys
+import numpy as np
+import pandas as pd
+from io_utility import FILETYPES, read_triple_chunks
+from data_preprocessing_utility import merge_sorted_unique, sorted_contains
+from knowledge_graph_utility import WIKILINK, RDF_TYPE
+from instrumentation_utility import instrumented
+
+# Streaming replacement of sample_entities.cypher. Every entity gets a pseudo-random priority (a seeded 64-bit hash
+# of its URI) and the entities with the smallest priorities are sampled (bottom-k sampling, the reservoir sampling
+# variant for distinct items). Because the priority of an entity is the same in every chunk, an entity that ends up
+# in the sample is sampled from its first appearance on, so its degrees are counted exactly while the memory usage
+# only depends on the links of the sampled entities.
+
+# columns of entities_sample.csv (see sample_entities.cypher)
+SAMPLE_COLUMNS = [
+    "in_degree_wikilinks",
+    "out_degree_wikilinks",
+    "in_degree_all_except_wikilinks",
+    "out_degree_all_except_wikilinks",
+    "n_types",
+    "n_mutual_wikilinks"
+]
+
+# columns of the links that are recorded for the sampled entities (the first five columns of SAMPLE_COLUMNS)
+IN_WIKILINK, OUT_WIKILINK, IN_OTHER, OUT_OTHER, TYPE = range(5)
+
+
+def entity_priorities(uris, random_state=42):
+    """
+    Returns the sampling priorities of URIs as unsigned 64-bit integers. The priorities are deterministic for a
+    random state, so they are the same in every chunk and file.
+    """
+    # the hash key of pd.util.hash_array has to have 16 characters
+    hash_key = f"{random_state:016d}"[-16:]
+    return pd.util.hash_array(np.asarray(uris, dtype=object), hash_key=hash_key, categorize=False)
+
+
+class EntityReservoir:
+    """
+    Bottom-k sample of the entities of a stream of triple chunks: the capacity entities with the smallest priorities
+    (see entity_priorities). The links of the sampled entities are recorded, so their degrees, numbers of types and
+    numbers of mutual wikilinks can be computed like in neo4j (duplicate triples are only counted once). Triples with
+    literal objects are ignored, as they are no relationships in neo4j, and the objects of rdf:type triples are no
+    entities, as they are labels in neo4j.
+    """
+
+    def __init__(self, capacity, random_state=42):
+        self.capacity = capacity
+        self.random_state = random_state
+        self.priorities = np.zeros(0, dtype=np.uint64)
+        self.uris = {}
+        self.links = []
+        self.n_links = 0
+        self.n_links_compacted = 0
+
+    def threshold(self):
+        """
+        Returns the priority that an entity has to be below to enter the sample.
+        """
+        if len(self.priorities) < self.capacity:
+            return np.iinfo(np.uint64).max
+        return self.priorities[-1]
+
+    def add(self, chunk):
+        chunk = chunk[~chunk["object"].str.startswith('"')]
+        subjects = entity_priorities(chunk["subject"], self.random_state)
+        objects = entity_priorities(chunk["object"], self.random_state)
+        predicates = entity_priorities(chunk["predicate"], self.random_state)
+        is_wikilink = (chunk["predicate"] == WIKILINK).to_numpy()
+        is_type = (chunk["predicate"] == RDF_TYPE).to_numpy()
+
+        # update the sample with the entities of the chunk
+        entities = np.concatenate([subjects, objects[~is_type]])
+        uris = np.concatenate([chunk["subject"].to_numpy(dtype=object), chunk.loc[~is_type, "object"].to_numpy(dtype=object)])
+        below = entities < self.threshold()
+        candidates, positions = np.unique(entities[below], return_index=True)
+        self.priorities = merge_sorted_unique([self.priorities, candidates])[:self.capacity]
+        is_new = sorted_contains(self.priorities, candidates)
+        self.uris.update(zip(candidates[is_new].tolist(), uris[below][positions[is_new]]))
+
+        # record the links of the sampled entities
+        for column, entity, partner, mask in [
+            (OUT_WIKILINK, subjects, objects, is_wikilink),
+            (IN_WIKILINK, objects, subjects, is_wikilink),
+            (OUT_OTHER, subjects, objects, ~is_wikilink & ~is_type),
+            (IN_OTHER, objects, subjects, ~is_wikilink & ~is_type),
+            (TYPE, subjects, objects, is_type)
+        ]:
+            mask = mask & sorted_contains(self.priorities, entity)
+            self.links.append(pd.DataFrame({
+                "entity": entity[mask],
+                "column": np.full(mask.sum(), column, dtype=np.int8),
+                "predicate": predicates[mask],
+                "partner": partner[mask]
+            }))
+            self.n_links += mask.sum()
+
+        # links of entities that left the sample are removed once the recorded links doubled
+        if self.n_links > 2 * max(self.n_links_compacted, self.capacity):
+            self.compact()
+
+    def compact(self):
+        links = pd.concat(self.links, ignore_index=True)
+        links = links[sorted_contains(self.priorities, links["entity"].to_numpy())].drop_duplicates(ignore_index=True)
+        self.links = [links]
+        self.n_links = self.n_links_compacted = len(links)
+        self.uris = {priority: self.uris[priority] for priority in self.priorities.tolist()}
+
+    def entity_statistics(self):
+        """
+        Returns a dataframe with the URIs (subject) of the sampled entities, ordered by priority, and their statistics
+        (see SAMPLE_COLUMNS).
+        """
+        self.compact()
+        links = self.links[0]
+        positions = np.searchsorted(self.priorities, links["entity"].to_numpy())
+        n_columns = TYPE + 1
+        counts = np.bincount(positions * n_columns + links["column"].to_numpy(), minlength=len(self.priorities) * n_columns)
+        statistics = pd.DataFrame(counts.reshape(-1, n_columns), columns=SAMPLE_COLUMNS[:n_columns])
+
+        # a mutual wikilink is a partner (other than the entity itself) that is linked in both directions
+        wikilinks = links[links["entity"] != links["partner"]]
+        out_wikilinks = wikilinks.loc[wikilinks["column"] == OUT_WIKILINK, ["entity", "partner"]]
+        in_wikilinks = wikilinks.loc[wikilinks["column"] == IN_WIKILINK, ["entity", "partner"]]
+        mutual_wikilinks = out_wikilinks.merge(in_wikilinks, on=["entity", "partner"])
+        statistics["n_mutual_wikilinks"] = np.bincount(
+            np.searchsorted(self.priorities, mutual_wikilinks["entity"].to_numpy()),
+            minlength=len(self.priorities)
+        )
+        statistics.insert(0, "subject", [self.uris[priority] for priority in self.priorities.tolist()])
+        return statistics
+
+
+def allocate_quotas(available, n_entities):
+    """
+    Allocates the number of sampled entities equally to the buckets. Buckets with fewer available entities than
+    their share are sampled completely and the remaining entities are allocated to the other buckets.
+    """
+    quotas = np.zeros(len(available), dtype=np.int64)
+    remaining = n_entities
+    order = np.argsort(available, kind="stable")
+    for i, bucket in enumerate(order):
+        quotas[bucket] = min(available[bucket], remaining // (len(order) - i))
+        remaining -= quotas[bucket]
+    return quotas
+
+
+def stratify_sample(statistics, n_entities, degree_buckets):
+    """
+    Samples n_entities entities from a larger sample (in order of the priorities), stratified by buckets of the
+    undirected wikilink degree. The buckets are given by their lower bounds and are stored in the column
+    degree_bucket.
+    """
+    undirected_degree = statistics["in_degree_wikilinks"] + statistics["out_degree_wikilinks"]
+    buckets = np.digitize(undirected_degree, degree_buckets) - 1
+    available = np.bincount(buckets, minlength=len(degree_buckets))
+    quotas = allocate_quotas(available, n_entities)
+    # rank of each entity within its bucket, the entities are already ordered by priority
+    ranks = pd.Series(buckets).groupby(buckets).cumcount().to_numpy()
+    statistics = statistics.assign(degree_bucket=np.asarray(degree_buckets)[buckets])
+    return statistics[ranks < quotas[buckets]].reset_index(drop=True)
+
+
+def write_entities_sample(entities_sample, filepath):
+    """
+    Writes the entities sample with quoted values like apoc.export.csv.query.
+    """
+    with open(filepath, "w", newline="", encoding="utf-8") as f:
+        f.write(",".join(f'"{col}"' for col in entities_sample.columns) + "\n")
+        entities_sample.to_csv(f, index=False, header=False, quoting=csv.QUOTE_ALL)
+
+
+@instrumented
+def sample_entities(
+        filepaths,
+        entities_sample_filepath,
+        filetypes=None,
+        n_entities=50000,
+        degree_buckets=None,
+        oversampling=10,
+        chunksize=2000000,
+        random_state=42
+    ):
+    """
+    This function samples entities from the DBpedia dumps that were loaded into the neo4j database in one pass over
+    the dumps and writes them with their degrees, numbers of types and numbers of mutual wikilinks to a csv file with
+    the columns of sample_entities.cypher. Without degree buckets, the entities are a uniform sample of all entities.
+    With degree buckets, a uniform sample of oversampling * n_entities entities is drawn first and n_entities entities
+    are sampled from it with equal numbers per bucket of the undirected wikilink degree (as far as the buckets are
+    large enough).
+
+    :param filepaths: list of file paths of the dumps, e.g. wikilinks, object properties and instance types
+    :type filepaths: list
+    :param entities_sample_filepath: file path of the csv file the sample is written to
+    :type entities_sample_filepath: str
+    :param filetypes: list of file types (either "csv" or "ttl"), defaults to "ttl" for all files
+    :type filetypes: list
+    :param n_entities: number of sampled entities
+    :type n_entities: int
+    :param degree_buckets: lower bounds of the buckets of the undirected wikilink degree, e.g. [0, 1, 10, 100, 1000]
+    :type degree_buckets: list
+    :param oversampling: size of the uniform sample relative to n_entities when sampling with degree buckets
+    :type oversampling: int
+    :param chunksize: size of the chunks that are read when iterating over the files
+    :type chunksize: int
+    :param random_state: seed of the sampling priorities
+    :type random_state: int
+    :return: dataframe of the sampled entities
+    """
+    if filetypes is None:
+        filetypes = ["ttl"] * len(filepaths)
+
+    # check file types
+    if any(filetype not in FILETYPES for filetype in filetypes):
+        print('File type can either be "csv" or "ttl"')
+        return None
+
+    capacity = n_entities if degree_buckets is None else oversampling * n_entities
+    reservoir = EntityReservoir(capacity, random_state)
+    for i, (filepath, filetype) in enumerate(zip(filepaths, filetypes)):
+        for j, chunk in enumerate(read_triple_chunks(filepath, filetype, chunksize)):
+            print(f"sample entities (file {i+1}, chunk {j+1})...")
+            reservoir.add(chunk)
+
+    entities_sample = reservoir.entity_statistics()
+    if degree_buckets is not None:
+        entities_sample = stratify_sample(entities_sample, n_entities, degree_buckets)
+        print("\nnumber of sampled entities per degree bucket:")
+        print(entities_sample["degree_bucket"].value_counts().sort_index().to_string())
+    write_entities_sample(entities_sample, entities_sample_filepath)
+    print(f"\nnumber of sampled entities: {len(entities_sample)}")
+    return entities_sample
+
+
+if __name__ == "__main__":
+    sample_entities(sys.argv[2:], sys.argv[1])
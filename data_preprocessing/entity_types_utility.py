@@ -0,0 +1,167 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from io_utility import FILETYPES, read_triple_chunks
+from uri_dictionary_utility import build_uri_dictionary, UriDictionary
+
+# The entity types index maps the entities of one or more type files (e.g. the specific and the transitive instance
+# types) to their types. It is stored in a directory with a URI dictionary of all entities and types
+# (uri_dictionary) and one subdirectory per type file with a CSR index over the dictionary IDs: type_ids.npy contains
+# the type IDs of all entities in order of the entity IDs and indptr.npy the start offset of each entity's types
+# (the types of entity i are type_ids[indptr[i]:indptr[i+1]]). The arrays are memory-mapped when the index is loaded,
+# so only the types of the looked up entities are read.
+URI_DICTIONARY_DIRNAME = "uri_dictionary"
+INDPTR_FILENAME = "indptr.npy"
+TYPE_IDS_FILENAME = "type_ids.npy"
+METADATA_FILENAME = "metadata.json"
+
+
+def build_entity_types_index(types_filepaths, index_dirpath, filetypes=None, chunksize=2000000):
+    """
+    This function is used to build the entity types index (see EntityTypesIndex) of type files. The index stores the
+    size and modification time of each file, so outdated indexes can be detected (see entity_types_index_up_to_date).
+
+    :param types_filepaths: dictionary of the names (e.g. "specific" and "transitive") and file paths of the type files
+    :type types_filepaths: dict
+    :param index_dirpath: directory in which the index is stored
+    :type index_dirpath: str
+    :param filetypes: list of file types (either "csv" or "ttl"), defaults to "ttl" for all files
+    :type filetypes: list
+    :param chunksize: size of the chunks that are read when iterating over the files
+    :type chunksize: int
+    :return: None
+    """
+    if filetypes is None:
+        filetypes = ["ttl"] * len(types_filepaths)
+
+    # check file types
+    if any(filetype not in FILETYPES for filetype in filetypes):
+        print('File type can either be "csv" or "ttl"')
+        return
+
+    dictionary_dirpath = os.path.join(index_dirpath, URI_DICTIONARY_DIRNAME)
+    build_uri_dictionary(list(types_filepaths.values()), filetypes, dictionary_dirpath, chunksize)
+    uri_dictionary = UriDictionary(dictionary_dirpath)
+    n = len(uri_dictionary)
+
+    metadata = {"sources": {}}
+    for (name, filepath), filetype in zip(types_filepaths.items(), filetypes):
+        # (entity, type) pairs as sorted unique int64 keys entity * n + type
+        keys = []
+        for i, chunk in enumerate(read_triple_chunks(filepath, filetype, chunksize)):
+            print(f"build entity types index ({name}, chunk {i+1})...")
+            entity_ids = uri_dictionary.encode(chunk["subject"]).astype(np.int64)
+            type_ids = uri_dictionary.encode(chunk["object"]).astype(np.int64)
+            keys.append(np.unique(entity_ids * n + type_ids))
+        keys = np.unique(np.concatenate(keys)) if len(keys) > 0 else np.zeros(0, dtype=np.int64)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // n, minlength=n), out=indptr[1:])
+        os.makedirs(os.path.join(index_dirpath, name), exist_ok=True)
+        np.save(os.path.join(index_dirpath, name, INDPTR_FILENAME), indptr)
+        np.save(os.path.join(index_dirpath, name, TYPE_IDS_FILENAME), (keys % n).astype(np.int32))
+        stat = os.stat(filepath)
+        metadata["sources"][name] = {
+            "filepath": os.path.abspath(filepath),
+            "filetype": filetype,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns
+        }
+        print(f"number of entity types ({name}): {len(keys)}")
+    with open(os.path.join(index_dirpath, METADATA_FILENAME), "w") as f:
+        json.dump(metadata, f)
+
+
+def read_entity_types_index_sources(index_dirpath):
+    """
+    Returns the sources of an entity types index (name: file path, file type, size and modification time) or an
+    empty dictionary if there is no index.
+    """
+    metadata_filepath = os.path.join(index_dirpath, METADATA_FILENAME)
+    if not os.path.isfile(metadata_filepath):
+        return {}
+    with open(metadata_filepath) as f:
+        return json.load(f)["sources"]
+
+
+def entity_types_index_version(index_dirpath):
+    """
+    Returns the version of an entity types index (the modification time of its metadata), which changes whenever the
+    index is rebuilt.
+    """
+    return os.stat(os.path.join(index_dirpath, METADATA_FILENAME)).st_mtime_ns
+
+
+def entity_types_index_up_to_date(index_dirpath, types_filepaths):
+    """
+    Returns whether the entity types index exists and contains the current versions of the type files
+    (dictionary of name and file path).
+    """
+    sources = read_entity_types_index_sources(index_dirpath)
+    for name, filepath in types_filepaths.items():
+        if name not in sources or not os.path.isfile(filepath):
+            return False
+        stat = os.stat(filepath)
+        if sources[name]["filepath"] != os.path.abspath(filepath) \
+                or sources[name]["size"] != stat.st_size or sources[name]["mtime_ns"] != stat.st_mtime_ns:
+            return False
+    return True
+
+
+def update_entity_types_index(index_dirpath, types_filepaths, chunksize=2000000):
+    """
+    Rebuilds the entity types index if it doesn't contain the current versions of the type files (dictionary of name
+    and file path). The other type files of an existing index are indexed again as well, as they share the URI
+    dictionary.
+    """
+    if entity_types_index_up_to_date(index_dirpath, types_filepaths):
+        return
+    sources = {
+        name: source for name, source in read_entity_types_index_sources(index_dirpath).items()
+        if name not in types_filepaths and os.path.isfile(source["filepath"])
+    }
+    filepaths = {name: source["filepath"] for name, source in sources.items()}
+    filetypes = [source["filetype"] for source in sources.values()]
+    filepaths.update(types_filepaths)
+    filetypes += ["ttl"] * len(types_filepaths)
+    build_entity_types_index(filepaths, index_dirpath, filetypes, chunksize)
+
+
+class EntityTypesIndex:
+    """
+    Memory-mapped entity types index of one type file (see build_entity_types_index). The types of a batch of
+    entities are looked up with one dictionary lookup and one gather from the CSR arrays. The URI dictionary is
+    loaded on the first lookup (see UriDictionary), so the first lookup is slower than the following ones.
+
+    :param index_dirpath: directory of the index
+    :type index_dirpath: str
+    :param name: name of the type file in the index, e.g. "specific"
+    :type name: str
+    """
+
+    def __init__(self, index_dirpath, name):
+        self.uri_dictionary = UriDictionary(os.path.join(index_dirpath, URI_DICTIONARY_DIRNAME))
+        self.indptr = np.load(os.path.join(index_dirpath, name, INDPTR_FILENAME), mmap_mode="r")
+        self.type_ids = np.load(os.path.join(index_dirpath, name, TYPE_IDS_FILENAME), mmap_mode="r")
+
+    def lookup_ids(self, entity_ids):
+        """
+        Returns the positions in entity_ids and the type IDs of all types of the entities (entity_ids[positions[i]]
+        has the type type_ids[i]). Entities with the ID -1 (not in the dictionary) have no types.
+        """
+        entity_ids = np.asarray(entity_ids, dtype=np.int64)
+        is_known = entity_ids >= 0
+        starts = np.where(is_known, self.indptr[np.where(is_known, entity_ids, 0)], 0)
+        lengths = np.where(is_known, self.indptr[np.where(is_known, entity_ids + 1, 0)], 0) - starts
+        positions = np.repeat(np.arange(len(entity_ids)), lengths)
+        # offset of each type in type_ids: start of its entity plus its rank within the entity's types
+        offsets = np.arange(len(positions)) - np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+        return positions, np.asarray(self.type_ids[offsets])
+
+    def lookup(self, entities):
+        """
+        Returns a dataframe with the pairs of entity and entity type of the entities (like read_entity_types).
+        """
+        entities = np.asarray(entities, dtype=object)
+        positions, type_ids = self.lookup_ids(self.uri_dictionary.encode(entities))
+        return pd.DataFrame({"entity": entities[positions], "entity_type": self.uri_dictionary.decode(type_ids)})
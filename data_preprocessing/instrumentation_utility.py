@@ -0,0 +1,297 @@
+import functools
+import json
+import resource
+import time
+import pandas as pd
+
+# Opt-in instrumentation of the preprocessing and post-processing functions. It is disabled by default, functions that
+# are decorated with instrumented and pipelines (see data_preprocessing_utility.run_pipeline) only record measurements
+# after enable_instrumentation was called. A measurement contains the rows in and out, the bytes read and written by
+# the process (including pipes, e.g. from decompression tools or worker processes), the wall time, the CPU time of
+# the process and its child processes and the peak resident set size (RSS). The CPU time of child processes is only
+# reported by the OS after they terminated, so worker processes of a pipeline also send the CPU time of each chunk
+# (see add_cpu_seconds) and the pool is shut down before the stage measurement is finished. Measurements are recorded per stage (decorated function) and per
+# chunk of a pipeline and are written as JSON lines to a log file and / or kept in memory for a summary table.
+
+# recorder of the measurements, None if the instrumentation is disabled
+RECORDER = None
+# measurements that are currently running (innermost last)
+ACTIVE_MEASUREMENTS = []
+
+
+class InstrumentationRecorder:
+    """
+    Keeps the recorded measurements and appends them as JSON lines to a log file (if provided).
+    """
+
+    def __init__(self, log_filepath=None):
+        self.log_filepath = log_filepath
+        self.records = []
+        self.log_file = open(log_filepath, "a", encoding="utf-8") if log_filepath is not None else None
+
+    def record(self, record):
+        self.records.append(record)
+        if self.log_file is not None:
+            self.log_file.write(json.dumps(record) + "\n")
+            self.log_file.flush()
+
+    def close(self):
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+
+def enable_instrumentation(log_filepath=None):
+    """
+    Enables the instrumentation, the measurements are appended to the log file as JSON lines (if provided).
+
+    :param log_filepath: file path of the JSON lines log file
+    :type log_filepath: str
+    :return: recorder that keeps all measurements (see print_instrumentation_summary)
+    """
+    global RECORDER
+    disable_instrumentation()
+    RECORDER = InstrumentationRecorder(log_filepath)
+    return RECORDER
+
+
+def disable_instrumentation():
+    """
+    Disables the instrumentation and closes the log file. Returns the recorder of the measurements (or None).
+    """
+    global RECORDER
+    recorder = RECORDER
+    if recorder is not None:
+        recorder.close()
+    RECORDER = None
+    ACTIVE_MEASUREMENTS.clear()
+    return recorder
+
+
+def instrumentation_enabled():
+    return RECORDER is not None
+
+
+def read_io_counters():
+    """
+    Returns the numbers of bytes read and written by the process (rchar and wchar in /proc/self/io, Linux only)
+    or (None, None) if they are not available.
+    """
+    try:
+        with open("/proc/self/io") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+        return int(counters["rchar"]), int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def read_cpu_time():
+    """
+    Returns the CPU time (user and system) in seconds of the process and of all child processes that terminated and
+    were waited for, e.g. worker processes of a pipeline or decompression tools.
+    """
+    cpu_time = 0
+    for who in [resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN]:
+        usage = resource.getrusage(who)
+        cpu_time += usage.ru_utime + usage.ru_stime
+    return cpu_time
+
+
+def read_peak_rss():
+    """
+    Returns the peak RSS of the process in MB (VmHWM in /proc/self/status on Linux, ru_maxrss otherwise).
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def reset_peak_rss():
+    """
+    Resets the peak RSS of the process to the current RSS (Linux only), so the peak of the next measurement can be
+    read. The peak up to now is passed on to all running measurements.
+    """
+    peak_rss = read_peak_rss()
+    for measurement in ACTIVE_MEASUREMENTS:
+        measurement.peak_rss = max(measurement.peak_rss, peak_rss)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+class Measurement:
+    """
+    Measurement of a stage or of a chunk of a pipeline, it is started on creation and recorded by finish.
+    """
+
+    def __init__(self, stage, level="stage", **fields):
+        reset_peak_rss()
+        self.fields = {"level": level, "stage": stage, **fields}
+        self.rows_in = 0
+        self.rows_out = 0
+        self.peak_rss = 0
+        self.cpu_seconds = 0
+        self.start_bytes_read, self.start_bytes_written = read_io_counters()
+        self.start_cpu_time = read_cpu_time()
+        self.start_time = time.perf_counter()
+        ACTIVE_MEASUREMENTS.append(self)
+
+    def add_rows(self, rows_in, rows_out):
+        self.rows_in += rows_in
+        self.rows_out += rows_out
+
+    def add_cpu_seconds(self, cpu_seconds):
+        """
+        Adds CPU time of child processes that are still running, e.g. of a pipeline worker that processed the chunk.
+        """
+        self.cpu_seconds += cpu_seconds
+
+    def finish(self, **fields):
+        wall_seconds = time.perf_counter() - self.start_time
+        cpu_seconds = read_cpu_time() - self.start_cpu_time + self.cpu_seconds
+        bytes_read, bytes_written = read_io_counters()
+        self.peak_rss = max(self.peak_rss, read_peak_rss())
+        discard_measurement(self)
+        for measurement in ACTIVE_MEASUREMENTS:
+            measurement.peak_rss = max(measurement.peak_rss, self.peak_rss)
+        record = {
+            **self.fields,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "bytes_read": None if bytes_read is None else bytes_read - self.start_bytes_read,
+            "bytes_written": None if bytes_written is None else bytes_written - self.start_bytes_written,
+            "wall_seconds": round(wall_seconds, 6),
+            "cpu_seconds": round(cpu_seconds, 6),
+            "peak_rss_mb": round(self.peak_rss, 1),
+            **fields
+        }
+        if RECORDER is not None:
+            RECORDER.record(record)
+        return record
+
+
+def start_measurement(stage, level="stage", **fields):
+    """
+    Starts a measurement (level "stage" or "chunk") if the instrumentation is enabled, otherwise returns None.
+    """
+    if RECORDER is None:
+        return None
+    return Measurement(stage, level, **fields)
+
+
+def finish_measurement(measurement, **fields):
+    """
+    Records a measurement (see start_measurement), measurements that are None are ignored.
+    """
+    if measurement is not None:
+        measurement.finish(**fields)
+
+
+def discard_measurement(measurement):
+    """
+    Stops a measurement without recording it.
+    """
+    if measurement in ACTIVE_MEASUREMENTS:
+        ACTIVE_MEASUREMENTS.remove(measurement)
+
+
+def current_stage():
+    """
+    Returns the innermost running stage measurement (not a chunk) or None.
+    """
+    for measurement in reversed(ACTIVE_MEASUREMENTS):
+        if measurement.fields["level"] == "stage":
+            return measurement
+    return None
+
+
+def add_stage_rows(rows_in, rows_out):
+    """
+    Adds rows in and out to the innermost running stage measurement (for stages that don't run a pipeline).
+    """
+    stage = current_stage()
+    if stage is not None:
+        stage.add_rows(rows_in, rows_out)
+
+
+def count_rows(value):
+    """
+    Returns the number of rows of a dataframe (or of all dataframes in a tuple or list), other values have no rows.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(count_rows(item) for item in value)
+    return 0
+
+
+def instrumented(function):
+    """
+    Decorator that records a stage measurement for every call of the function (if the instrumentation is enabled).
+    The rows in and out are the rows of dataframe arguments and return values plus the triples read and written by
+    all pipelines that are run by the function.
+    """
+    @functools.wraps(function)
+    def instrumented_function(*args, **kwargs):
+        measurement = start_measurement(function.__name__)
+        if measurement is None:
+            return function(*args, **kwargs)
+        try:
+            result = function(*args, **kwargs)
+        except BaseException:
+            discard_measurement(measurement)
+            raise
+        measurement.add_rows(count_rows(list(args) + list(kwargs.values())), count_rows(result))
+        measurement.finish()
+        return result
+    return instrumented_function
+
+
+def instrumentation_summary(records=None):
+    """
+    Sums up the stage measurements per stage (wall time, CPU time, rows and bytes) and returns them as dataframe
+    together with the rows per second and the peak RSS.
+
+    :param records: list of measurements, defaults to the measurements of the current recorder
+    :type records: list
+    :return: dataframe with one row per stage
+    """
+    if records is None:
+        records = [] if RECORDER is None else RECORDER.records
+    stages = pd.DataFrame([record for record in records if record.get("level") == "stage"])
+    if len(stages) == 0:
+        return pd.DataFrame()
+    summary = stages.groupby("stage", sort=False).agg(
+        calls=("stage", "size"),
+        rows_in=("rows_in", "sum"),
+        rows_out=("rows_out", "sum"),
+        mb_read=("bytes_read", lambda values: values.sum() / 1000000),
+        mb_written=("bytes_written", lambda values: values.sum() / 1000000),
+        wall_seconds=("wall_seconds", "sum"),
+        cpu_seconds=("cpu_seconds", "sum"),
+        peak_rss_mb=("peak_rss_mb", "max"),
+    )
+    summary["rows_per_second"] = summary["rows_in"] / summary["wall_seconds"]
+    return summary.round(1)
+
+
+def print_instrumentation_summary(records=None):
+    """
+    Prints the summary of the stage measurements (see instrumentation_summary).
+    """
+    print(instrumentation_summary(records).to_string())
+
+
+def read_instrumentation_log(log_filepath):
+    """
+    Reads the measurements of a JSON lines log file, e.g. to compare the summaries of two runs.
+    """
+    with open(log_filepath, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip() != ""]
@@ -0,0 +1,385 @@
+import bz2
+import gc
+import gzip
+import io
+import os
+import re
+import shutil
+import subprocess
+from contextlib import contextmanager
+from itertools import islice
+import numpy as np
+import pandas as pd
+
+# file types of triple datasets that can be read
+FILETYPES = ("csv", "ttl")
+
+# file extensions of the optional columnar storage formats (require pyarrow), files with any other
+# extension are stored as CSV
+COLUMNAR_EXTENSIONS = {".parquet": "parquet", ".pq": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+# columns that are dictionary encoded when written to columnar files
+URI_COLUMNS = ("subject", "predicate", "object")
+
+# file extensions of compressed text files (CSV or TTL), they are decompressed while they are read
+COMPRESSION_EXTENSIONS = {".bz2": "bz2", ".gz": "gzip", ".zst": "zstd"}
+# command line tools that are used for decompression in order of preference (the first installed tool is used),
+# lbzip2 and pbzip2 decompress the blocks of bz2 files in parallel on all cores, the other tools still run in a
+# separate process in parallel to the parsing
+DECOMPRESSION_COMMANDS = {
+    "bz2": (["lbzip2", "-d", "-c"], ["pbzip2", "-d", "-c"], ["bzip2", "-d", "-c"]),
+    "gzip": (["pigz", "-d", "-c"], ["gzip", "-d", "-c"]),
+    "zstd": (["zstd", "-d", "-c", "-q"],),
+}
+# tools that decompress in parallel, without them the decompression of large bz2 dumps is limited to one core
+PARALLEL_DECOMPRESSION_TOOLS = {"bz2": ("lbzip2", "pbzip2"), "gzip": (), "zstd": ()}
+# compression formats for which the missing parallel decompression tools were already reported
+PARALLEL_DECOMPRESSION_WARNINGS = set()
+
+# one N-Triples statement per line: subject IRI, predicate IRI and either an object IRI or a literal
+# (with an optional language tag or datatype), the brackets of IRIs are not part of the groups
+NTRIPLES_PATTERN = re.compile(
+    r'^[ \t]*<([^>]*)>[ \t]+<([^>]*)>[ \t]+'
+    r'(?:<([^>]*)>|("(?:[^"\\\n]|\\.)*"(?:@[A-Za-z0-9-]+|\^\^<[^>]*>)?))'
+    r'[ \t]*\.[ \t]*\r?$',
+    re.MULTILINE
+)
+# escaped unicode characters in IRIs (\uXXXX and \UXXXXXXXX)
+UCHAR_PATTERN = re.compile(r"\\u([0-9A-Fa-f]{4})|\\U([0-9A-Fa-f]{8})")
+
+
+def unescape_iri(iri):
+    """
+    Replaces escaped unicode characters (\\uXXXX and \\UXXXXXXXX) in an IRI with the characters themselves.
+    """
+    return UCHAR_PATTERN.sub(lambda match: chr(int(match.group(1) or match.group(2), 16)), iri)
+
+
+def parse_ntriples(text):
+    """
+    Parses a block of N-Triples (or line-based Turtle, as in the DBpedia dumps) statements.
+    The brackets of IRIs are removed and escaped unicode characters in IRIs are decoded. Literals are kept
+    in their lexical form (including quotes, escape sequences, language tags and datatypes), so they may
+    contain spaces without breaking the columns. Comments and empty lines are skipped.
+
+    :param text: block of complete lines
+    :type text: str
+    :return: tuple of a dataframe with subject, predicate and object columns and the number of lines that could not be parsed
+    """
+    # the garbage collector is paused while the many small match tuples are allocated, it would
+    # otherwise repeatedly traverse them without being able to free anything
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        matches = NTRIPLES_PATTERN.findall(text)
+        columns = np.array(matches, dtype=object)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    if len(matches) > 0:
+        subjects, predicates, objects, literals = columns.T
+        is_literal = literals != ""
+        if is_literal.any():
+            objects[is_literal] = literals[is_literal]
+        # decode escaped characters in IRIs (only if the block contains any escape sequences)
+        if "\\u" in text or "\\U" in text:
+            for column, is_iri in ((subjects, True), (predicates, True), (objects, ~is_literal)):
+                escaped = np.array(["\\" in value for value in column], dtype=bool) & is_iri
+                column[escaped] = [unescape_iri(value) for value in column[escaped]]
+    else:
+        subjects, predicates, objects = [], [], []
+    triples = pd.DataFrame({"subject": subjects, "predicate": predicates, "object": objects})
+
+    # count lines that are neither statements, comments nor empty
+    n_unparsed = 0
+    if len(matches) < text.count("\n") + (not text.endswith("\n")):
+        lines = text.splitlines()
+        n_unparsed = sum(1 for line in lines if line.strip() != "" and not line.lstrip().startswith("#")) - len(matches)
+
+    return triples, n_unparsed
+
+
+def read_ntriples(filepath, chunksize=2000000):
+    """
+    Streams an N-Triples / line-based Turtle file in chunks of triples. In contrast to parsing the file with
+    pd.read_csv(sep=" "), the chunks already contain IRIs without "<" and ">" and literals containing spaces
+    are parsed correctly. Compressed files (.bz2, .gz, .zst) are decompressed while they are read.
+
+    :param filepath: file path of the triples file
+    :type filepath: str
+    :param chunksize: number of lines per chunk
+    :type chunksize: int
+    :return: generator of dataframes with subject, predicate and object columns
+    """
+    n_unparsed_total = 0
+    with open_text_file(filepath) as f:
+        while True:
+            lines = list(islice(f, chunksize))
+            if len(lines) == 0:
+                break
+            triples, n_unparsed = parse_ntriples("".join(lines))
+            n_unparsed_total += n_unparsed
+            yield triples
+    if n_unparsed_total > 0:
+        print(f"WARNING: {n_unparsed_total} lines in {filepath} could not be parsed and were skipped")
+
+
+def read_triple_chunks(filepath, filetype="csv", chunksize=2000000, **csv_parsing_args):
+    """
+    Reads a triples dataset in chunks. CSV files are read with pd.read_csv, TTL files with read_ntriples.
+    The chunks always contain URIs without "<" and ">". Parquet and Arrow files (detected by their file
+    extension, see storage_format) can be read with the file type "csv". Compressed CSV and TTL files (.bz2, .gz,
+    .zst) are decompressed while they are read (see open_text_file).
+
+    :param filepath: file path of the dataset
+    :type filepath: str
+    :param filetype: file type, either "csv" or "ttl"
+    :type filetype: str
+    :param chunksize: number of triples per chunk
+    :type chunksize: int
+    :param csv_parsing_args: additional arguments that are passed to pd.read_csv for CSV files
+    :return: iterator of dataframes
+    """
+    if filetype == "csv":
+        if storage_format(filepath) != "csv":
+            return read_columnar_chunks(filepath, chunksize=chunksize)
+        if compression_format(filepath) is not None:
+            return read_compressed_csv_chunks(filepath, chunksize=chunksize, **csv_parsing_args)
+        return pd.read_csv(filepath, chunksize=chunksize, **csv_parsing_args)
+    elif filetype == "ttl":
+        return read_ntriples(filepath, chunksize=chunksize)
+    else:
+        raise ValueError('File type can either be "csv" or "ttl"')
+
+
+def read_compressed_csv_chunks(filepath, chunksize=2000000, **csv_parsing_args):
+    """
+    Reads a compressed CSV file in chunks, the file is decompressed while it is read (see open_text_file).
+    """
+    with open_text_file(filepath) as f:
+        yield from pd.read_csv(f, chunksize=chunksize, **csv_parsing_args)
+
+
+def compression_format(filepath):
+    """
+    Returns the compression format of a file based on its extension: "bz2" (.bz2), "gzip" (.gz), "zstd" (.zst)
+    or None for uncompressed files.
+    """
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(filepath)[1].lower())
+
+
+def decompression_command(compression):
+    """
+    Returns the command of the first installed command line tool that decompresses the format or None.
+    """
+    for command in DECOMPRESSION_COMMANDS[compression]:
+        if shutil.which(command[0]) is not None:
+            return command
+    return None
+
+
+def open_decompressed_file(filepath, compression):
+    """
+    Opens a compressed file as text stream with the python modules of the compression formats.
+    """
+    if compression == "bz2":
+        return bz2.open(filepath, "rt", encoding="utf-8")
+    if compression == "gzip":
+        return gzip.open(filepath, "rt", encoding="utf-8")
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("Reading zst files requires the zstd command line tool or zstandard (pip install zstandard)")
+    return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(filepath, "rb"), closefd=True), encoding="utf-8")
+
+
+def warn_single_threaded_decompression(compression, command):
+    """
+    Prints a warning (once per compression format) if files of the format are decompressed on a single core
+    because none of the parallel decompression tools is installed.
+    """
+    parallel_tools = PARALLEL_DECOMPRESSION_TOOLS[compression]
+    if len(parallel_tools) == 0 or compression in PARALLEL_DECOMPRESSION_WARNINGS:
+        return
+    if command is None or command[0] not in parallel_tools:
+        PARALLEL_DECOMPRESSION_WARNINGS.add(compression)
+        tool = "the python module" if command is None else command[0]
+        print(f"WARNING: {' and '.join(parallel_tools)} are not installed, {compression} files are decompressed by "
+              f"{tool} on a single core (install {parallel_tools[0]} to decompress them on all cores)")
+
+
+@contextmanager
+def open_text_file(filepath, use_decompression_tools=True):
+    """
+    Opens a (possibly compressed) text file for reading. Compressed files are decompressed while they are read, by
+    a command line tool in a separate process (see DECOMPRESSION_COMMANDS) or, if no tool is installed, by the python
+    modules of the compression formats (bz2, gzip, zstandard). bz2 files are only decompressed on all cores with lbzip2
+    or pbzip2, otherwise a warning is printed. The file has to be read completely unless an exception is raised
+    while it is read.
+
+    :param filepath: file path of the text file
+    :type filepath: str
+    :param use_decompression_tools: if set to False compressed files are always decompressed with the python modules
+    :type use_decompression_tools: bool
+    :return: context manager of a text stream
+    """
+    compression = compression_format(filepath)
+    if compression is None:
+        with open(filepath, encoding="utf-8") as f:
+            yield f
+        return
+    command = decompression_command(compression) if use_decompression_tools else None
+    if use_decompression_tools:
+        warn_single_threaded_decompression(compression, command)
+    if command is None:
+        with open_decompressed_file(filepath, compression) as f:
+            yield f
+        return
+    process = subprocess.Popen(command + [filepath], stdout=subprocess.PIPE)
+    try:
+        with io.TextIOWrapper(process.stdout, encoding="utf-8") as f:
+            yield f
+    except BaseException:
+        # the reader stopped early, the decompression is not needed anymore
+        process.kill()
+        process.wait()
+        raise
+    if process.wait() != 0:
+        raise OSError(f"{command[0]} could not decompress {filepath} (exit code {process.returncode})")
+
+
+def storage_format(filepath):
+    """
+    Returns the storage format of a file based on its extension: "parquet" (.parquet, .pq), "arrow" (.arrow, .feather)
+    or "csv" (any other extension, including .tsv).
+    """
+    return COLUMNAR_EXTENSIONS.get(os.path.splitext(filepath)[1].lower(), "csv")
+
+
+def import_pyarrow():
+    """
+    Imports pyarrow, which is only required for the columnar storage formats.
+    """
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet and Arrow files require pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def to_arrow_table(df, dictionary_encode=True):
+    """
+    Converts a dataframe to an Arrow table. The URI columns are dictionary encoded with int32 indices, so
+    all chunks of a dataset have the same schema.
+    """
+    pa = import_pyarrow()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(table.schema):
+        if field.name in URI_COLUMNS:
+            value_type = pa.dictionary(pa.int32(), pa.string()) if dictionary_encode else pa.string()
+            table = table.set_column(i, field.name, table.column(i).cast(value_type))
+    return table
+
+
+def from_arrow_table(table):
+    """
+    Converts an Arrow table to a dataframe. Dictionary encoded columns are decoded to plain string columns,
+    so the dataframe is the same as if the dataset was read from a CSV file.
+    """
+    pa = import_pyarrow()
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+    return table.to_pandas()
+
+
+def read_table(filepath, **csv_parsing_args):
+    """
+    Reads a complete dataset (e.g. a split, a matrix or scores) with the format detected from the file extension.
+
+    :param filepath: file path of the dataset
+    :type filepath: str
+    :param csv_parsing_args: additional arguments that are passed to pd.read_csv for CSV files
+    :return: pandas dataframe
+    """
+    file_format = storage_format(filepath)
+    if file_format == "csv":
+        return pd.read_csv(filepath, **csv_parsing_args)
+    pa = import_pyarrow()
+    if file_format == "parquet":
+        table = pa.parquet.read_table(filepath)
+    else:
+        with pa.memory_map(filepath) as source:
+            table = pa.ipc.open_file(source).read_all()
+    return from_arrow_table(table)
+
+
+def write_table(df, filepath, **csv_writing_args):
+    """
+    Writes a complete dataset with the format detected from the file extension. Columnar files are compressed
+    with zstd and their subject, predicate and object columns are dictionary encoded.
+
+    :param df: dataframe that is written
+    :type df: pd.DataFrame
+    :param filepath: file path under which the dataset is stored
+    :type filepath: str
+    :param csv_writing_args: additional arguments that are passed to DataFrame.to_csv for CSV files
+    :return: None
+    """
+    if storage_format(filepath) == "csv":
+        df.to_csv(filepath, index=False, **csv_writing_args)
+        return
+    # a single chunk can be dictionary encoded in both columnar formats
+    writer = ColumnarWriter(filepath, dictionary_encode=True)
+    writer.write(df)
+    writer.close()
+
+
+class ColumnarWriter:
+    """
+    Writes chunks of a dataset to one Parquet or Arrow file, the file has to be closed after the last chunk.
+    Parquet stores a separate dictionary per row group, so URI columns are dictionary encoded by default. The
+    Arrow file format only allows one dictionary per column, so URI columns are stored as plain strings by
+    default when writing Arrow files chunk by chunk.
+    """
+
+    def __init__(self, filepath, dictionary_encode=None):
+        self.filepath = filepath
+        self.file_format = storage_format(filepath)
+        self.dictionary_encode = self.file_format == "parquet" if dictionary_encode is None else dictionary_encode
+        self.writer = None
+
+    def write(self, chunk):
+        pa = import_pyarrow()
+        table = to_arrow_table(chunk, dictionary_encode=self.dictionary_encode)
+        if self.writer is None:
+            self.schema = table.schema
+            if self.file_format == "parquet":
+                self.writer = pa.parquet.ParquetWriter(self.filepath, self.schema, compression="zstd")
+            else:
+                options = pa.ipc.IpcWriteOptions(compression="zstd")
+                self.writer = pa.ipc.new_file(self.filepath, self.schema, options=options)
+        self.writer.write_table(table.cast(self.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def read_columnar_chunks(filepath, chunksize=2000000):
+    """
+    Reads a Parquet or Arrow file in chunks of at most chunksize rows.
+    """
+    pa = import_pyarrow()
+    if storage_format(filepath) == "parquet":
+        for batch in pa.parquet.ParquetFile(filepath).iter_batches(batch_size=chunksize):
+            yield from_arrow_table(pa.Table.from_batches([batch]))
+    else:
+        with pa.memory_map(filepath) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                table = pa.Table.from_batches([reader.get_batch(i)])
+                for offset in range(0, table.num_rows, chunksize):
+                    yield from_arrow_table(table.slice(offset, chunksize))
@@ -0,0 +1,287 @@
+import csv
+import os
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from io_utility import FILETYPES, read_triple_chunks
+from uri_dictionary_utility import update_uri_dictionary, UriDictionary
+
+# In-process replacement of the neo4j graph augmentation (augment_graph_mutual_wikilinks.cypher and
+# augment_graph_types_and_degree_centrality.cypher) and of the data export (export_data.cypher). The DBpedia dumps
+# are encoded to int32 IDs of a URI dictionary and the links between entities are stored as sparse adjacency
+# matrices in CSR format (one row per subject, one column per object), so mutual wikilinks, connecting properties,
+# degrees and numbers of types are computed with vectorized operations instead of graph queries.
+
+WIKILINK = "http://dbpedia.org/ontology/wikiPageWikiLink"
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+ONTOLOGY_PREFIX = "http://dbpedia.org/ontology/"
+
+# file names of the exported datasets (see export_data.cypher)
+EXPORT_FILENAMES = {
+    "mw_both_sides": "mutual_wikilinks_properties_both_sides.csv",
+    "mw_one_side": "mutual_wikilinks_properties_one_side.csv",
+    "mw_no_props": "mutual_wikilinks_no_properties.csv",
+    "remaining_triples": "remaining_triples.csv",
+    "types": "type_triples.csv",
+    "property_counts": "property_counts.csv"
+}
+
+
+def unique_pairs(rows, cols, n):
+    """
+    Returns the sorted unique pairs of two ID arrays as int64 keys (row * n + col).
+    """
+    return np.unique(rows.astype(np.int64) * n + cols.astype(np.int64))
+
+
+def adjacency_matrix(keys, n, values=None):
+    """
+    Builds a CSR adjacency matrix of shape (n, n) from sorted unique pair keys (see unique_pairs) without converting
+    them to a COO matrix first. Without values, the matrix is boolean.
+    """
+    rows = keys // n
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    data = np.ones(len(keys), dtype=bool) if values is None else values
+    return csr_matrix((data, (keys % n).astype(np.int32), indptr), shape=(n, n))
+
+
+def lookup(matrix, rows, cols):
+    """
+    Returns the values of a sparse matrix at the positions (rows[i], cols[i]) as numpy array.
+    """
+    if len(rows) == 0:
+        return np.zeros(0, dtype=matrix.dtype)
+    return np.asarray(matrix[rows, cols]).ravel()
+
+
+class KnowledgeGraph:
+    """
+    Knowledge graph of the DBpedia dumps over int32 entity IDs (see load_knowledge_graph). The wikilinks are stored
+    as boolean CSR matrix, the other object properties as (subject, predicate, object) ID arrays together with a CSR
+    matrix of the number of properties per entity pair, and the types as (entity, type) ID arrays. Like in neo4j,
+    duplicate triples are only stored once.
+    """
+
+    def __init__(self, uri_dictionary, wikilink_keys, properties, types):
+        self.uri_dictionary = uri_dictionary
+        self.n = len(uri_dictionary)
+        self.wikilinks = adjacency_matrix(wikilink_keys, self.n)
+        self.properties = properties
+        self.types = types
+        property_keys, property_counts = np.unique(
+            properties["subject"].to_numpy(dtype=np.int64) * self.n + properties["object"].to_numpy(dtype=np.int64),
+            return_counts=True
+        )
+        self.property_counts = adjacency_matrix(property_keys, self.n, property_counts.astype(np.int32))
+        self.mutual_wikilinks = self.compute_mutual_wikilinks()
+
+    def compute_mutual_wikilinks(self):
+        """
+        Returns a boolean CSR matrix of the pairs of different entities that link each other with wikilinks. Like the
+        mutual_wikilinks edges in neo4j, each pair is contained in both directions.
+        """
+        print("compute mutual wikilinks...")
+        mutual_wikilinks = self.wikilinks.multiply(self.wikilinks.T).tocoo()
+        # a wikilink of an entity to itself is no mutual wikilink
+        keep = mutual_wikilinks.row != mutual_wikilinks.col
+        return csr_matrix(
+            (np.ones(keep.sum(), dtype=bool), (mutual_wikilinks.row[keep], mutual_wikilinks.col[keep])),
+            shape=(self.n, self.n)
+        )
+
+    def connecting_properties(self):
+        """
+        Returns a dataframe with one row per mutual wikilink (subject, object) and the numbers of properties from the
+        subject to the object (n_connecting_properties_out) and from the object to the subject
+        (n_connecting_properties_in), like the properties of the mutual_wikilinks edges in neo4j.
+        """
+        mutual_wikilinks = self.mutual_wikilinks.tocoo()
+        subjects, objects = mutual_wikilinks.row, mutual_wikilinks.col
+        return pd.DataFrame({
+            "subject": subjects.astype(np.int32),
+            "object": objects.astype(np.int32),
+            "n_connecting_properties_out": lookup(self.property_counts, subjects, objects),
+            "n_connecting_properties_in": lookup(self.property_counts, objects, subjects)
+        })
+
+    def node_statistics(self):
+        """
+        Returns a dataframe with the properties of the entity nodes in neo4j (indexed by entity ID): number of types,
+        in-, out- and undirected degrees of all links, of wikilinks and of all links except wikilinks and the number
+        of mutual wikilinks. Entities that neither appear in links nor have types are not included.
+        """
+        subjects = self.properties["subject"].to_numpy()
+        objects = self.properties["object"].to_numpy()
+        statistics = pd.DataFrame({
+            "n_types": np.bincount(self.types["subject"].to_numpy(), minlength=self.n),
+            "in_degree_wikilinks": self.wikilinks.getnnz(axis=0),
+            "out_degree_wikilinks": self.wikilinks.getnnz(axis=1),
+            "in_degree_all_except_wikilinks": np.bincount(objects, minlength=self.n),
+            "out_degree_all_except_wikilinks": np.bincount(subjects, minlength=self.n),
+            "n_mutual_wikilinks": self.mutual_wikilinks.getnnz(axis=1)
+        })
+        statistics["in_degree_all"] = statistics["in_degree_wikilinks"] + statistics["in_degree_all_except_wikilinks"]
+        statistics["out_degree_all"] = statistics["out_degree_wikilinks"] + statistics["out_degree_all_except_wikilinks"]
+        for links in ["all", "wikilinks", "all_except_wikilinks"]:
+            statistics[f"undirected_degree_{links}"] = statistics[f"in_degree_{links}"] + statistics[f"out_degree_{links}"]
+        is_node = (statistics["n_types"] > 0) | (statistics["undirected_degree_all"] > 0)
+        return statistics[is_node]
+
+
+def load_knowledge_graph(filepaths, uri_dictionary_dirpath, filetypes=None, chunksize=2000000):
+    """
+    This function is used to load the DBpedia dumps that were loaded into the neo4j database (load_data.cypher) into
+    a KnowledgeGraph. Triples with the wikilink predicate are stored as wikilinks, rdf:type triples as types (like
+    the labels in neo4j) and all other triples with entity objects as properties. Triples with literal objects are
+    ignored, as they are no relationships in neo4j. All URIs are stored in a URI dictionary first, which is reused
+    if it was built from the current versions of the dumps.
+
+    :param filepaths: list of file paths of the dumps, e.g. wikilinks, object properties and instance types
+    :type filepaths: list
+    :param uri_dictionary_dirpath: directory of the URI dictionary
+    :type uri_dictionary_dirpath: str
+    :param filetypes: list of file types (either "csv" or "ttl"), defaults to "ttl" for all files
+    :type filetypes: list
+    :param chunksize: size of the chunks that are read when iterating over the files
+    :type chunksize: int
+    :return: KnowledgeGraph
+    """
+    if filetypes is None:
+        filetypes = ["ttl"] * len(filepaths)
+
+    # check file types
+    if any(filetype not in FILETYPES for filetype in filetypes):
+        print('File type can either be "csv" or "ttl"')
+        return None
+
+    update_uri_dictionary(filepaths, filetypes, uri_dictionary_dirpath, chunksize=chunksize)
+    uri_dictionary = UriDictionary(uri_dictionary_dirpath)
+    n = len(uri_dictionary)
+    wikilink_id, rdf_type_id = uri_dictionary.encode([WIKILINK, RDF_TYPE])
+
+    # encode the triples of all files and split them into wikilinks, properties and types
+    wikilink_keys, properties, types = [], [], []
+    for i, (filepath, filetype) in enumerate(zip(filepaths, filetypes)):
+        for j, chunk in enumerate(read_triple_chunks(filepath, filetype, chunksize)):
+            print(f"load knowledge graph (file {i+1}, chunk {j+1})...")
+            chunk = chunk[~chunk["object"].str.startswith('"')]
+            chunk = pd.DataFrame({col: uri_dictionary.encode(chunk[col]) for col in ["subject", "predicate", "object"]})
+            is_wikilink = (chunk["predicate"] == wikilink_id).to_numpy()
+            is_type = (chunk["predicate"] == rdf_type_id).to_numpy()
+            wikilinks = chunk[is_wikilink]
+            # chunks are deduplicated right away to keep the memory usage low
+            wikilink_keys.append(unique_pairs(wikilinks["subject"].to_numpy(), wikilinks["object"].to_numpy(), n))
+            properties.append(chunk[~is_wikilink & ~is_type].drop_duplicates())
+            types.append(chunk.loc[is_type, ["subject", "object"]].drop_duplicates())
+
+    print("build adjacency matrices...")
+    wikilink_keys = np.unique(np.concatenate(wikilink_keys)) if len(wikilink_keys) > 0 else np.zeros(0, dtype=np.int64)
+    properties = pd.concat(properties, ignore_index=True).drop_duplicates().sort_values(["subject", "object", "predicate"], ignore_index=True)
+    types = pd.concat(types, ignore_index=True).drop_duplicates().sort_values(["subject", "object"], ignore_index=True)
+    graph = KnowledgeGraph(uri_dictionary, wikilink_keys, properties, types)
+
+    print(f"\nnumber of wikilinks: {graph.wikilinks.nnz}")
+    print(f"number of other links: {len(properties)}")
+    print(f"number of type statements: {len(types)}")
+    print(f"number of mutual wikilinks: {graph.mutual_wikilinks.nnz // 2}")
+    return graph
+
+
+def write_export(triples, uri_dictionary, filepath, chunksize=2000000):
+    """
+    Decodes encoded triples (or other columns of IDs) and writes them with quoted values like apoc.export.csv.query.
+    """
+    with open(filepath, "w", newline="", encoding="utf-8") as f:
+        f.write(",".join(f'"{col}"' for col in triples.columns) + "\n")
+        for start in range(0, len(triples), chunksize):
+            chunk = triples.iloc[start:start + chunksize].copy()
+            for col in chunk.columns:
+                chunk[col] = uri_dictionary.decode(chunk[col].to_numpy())
+            chunk.to_csv(f, index=False, header=False, quoting=csv.QUOTE_ALL)
+
+
+def export_datasets(graph, export_dirpath, require_connected_entities=False, chunksize=2000000):
+    """
+    This function is used to write the six datasets of export_data.cypher (see EXPORT_FILENAMES) from a
+    KnowledgeGraph:
+
+    - property triples of mutually wikilinked pairs with properties in both directions
+    - property triples of mutually wikilinked pairs with properties in only one direction
+    - mutually wikilinked pairs without connecting properties (as wikilink triples, one per direction)
+    - all other property triples (without wikilinks)
+    - type triples
+    - number of triples per DBpedia ontology property
+
+    In export_data.cypher, the condition that both entities of a pair without connecting properties have types or
+    other links is wrapped in list brackets, which neo4j evaluates as true for every pair. With
+    require_connected_entities=True, the condition is applied as described in the query's comment.
+
+    :param graph: knowledge graph (see load_knowledge_graph)
+    :type graph: KnowledgeGraph
+    :param export_dirpath: directory in which the datasets are stored
+    :type export_dirpath: str
+    :param require_connected_entities: if set to True pairs without properties are only exported if both entities have types or other links
+    :type require_connected_entities: bool
+    :param chunksize: number of rows that are decoded and written at once
+    :type chunksize: int
+    :return: dictionary with the file paths of the datasets (keys of EXPORT_FILENAMES)
+    """
+    os.makedirs(export_dirpath, exist_ok=True)
+    filepaths = {name: os.path.join(export_dirpath, filename) for name, filename in EXPORT_FILENAMES.items()}
+    uri_dictionary = graph.uri_dictionary
+
+    # property triples are split by whether their pair is mutually wikilinked and has properties in both directions
+    print("export property triples...")
+    properties = graph.properties
+    subjects = properties["subject"].to_numpy()
+    objects = properties["object"].to_numpy()
+    is_mutual = lookup(graph.mutual_wikilinks, subjects, objects)
+    has_reverse_property = lookup(graph.property_counts, objects, subjects) > 0
+    write_export(properties[is_mutual & has_reverse_property], uri_dictionary, filepaths["mw_both_sides"], chunksize)
+    write_export(properties[is_mutual & ~has_reverse_property], uri_dictionary, filepaths["mw_one_side"], chunksize)
+    write_export(properties[~is_mutual], uri_dictionary, filepaths["remaining_triples"], chunksize)
+
+    # mutually wikilinked pairs without properties in either direction
+    print("export mutual wikilinks without properties...")
+    pairs = graph.connecting_properties()
+    no_properties = (pairs["n_connecting_properties_out"] == 0) & (pairs["n_connecting_properties_in"] == 0)
+    if require_connected_entities:
+        statistics = graph.node_statistics()
+        connected = statistics.index[(statistics["n_types"] > 0) | (statistics["undirected_degree_all_except_wikilinks"] > 0)]
+        no_properties &= pairs["subject"].isin(connected) & pairs["object"].isin(connected)
+    pairs = pairs[no_properties]
+    wikilink_id = uri_dictionary.encode([WIKILINK])[0]
+    write_export(
+        pd.DataFrame({"subject": pairs["subject"], "predicate": wikilink_id, "object": pairs["object"]}),
+        uri_dictionary,
+        filepaths["mw_no_props"],
+        chunksize
+    )
+
+    # type triples
+    print("export types...")
+    rdf_type_id = uri_dictionary.encode([RDF_TYPE])[0]
+    write_export(
+        pd.DataFrame({"subject": graph.types["subject"], "predicate": rdf_type_id, "object": graph.types["object"]}),
+        uri_dictionary,
+        filepaths["types"],
+        chunksize
+    )
+
+    # number of triples per DBpedia ontology property (including wikilinks), most common first
+    print("export property counts...")
+    property_counts = properties["predicate"].value_counts()
+    if graph.wikilinks.nnz > 0:
+        property_counts[wikilink_id] = graph.wikilinks.nnz
+    property_counts = pd.DataFrame({
+        "type": uri_dictionary.decode(property_counts.index.to_numpy()),
+        "value.count": property_counts.to_numpy()
+    })
+    property_counts = property_counts[property_counts["type"].str.startswith(ONTOLOGY_PREFIX)]
+    property_counts = property_counts.sort_values("value.count", ascending=False, kind="stable")
+    property_counts.to_csv(filepaths["property_counts"], index=False, quoting=csv.QUOTE_ALL)
+
+    for name, filepath in filepaths.items():
+        print(f"{name}: {filepath}")
+    return filepaths
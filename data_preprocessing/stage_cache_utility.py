@@ -0,0 +1,299 @@
+import ast
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+import time
+
+# The stage cache stores the output files of preprocessing functions (stages) in a cache directory. Each output is
+# addressed by a key that is derived from the contents of the input files, the parameters of the stage and the source
+# code of the module of the stage and the local modules it imports, so a stage is only recomputed if one of them
+# changed. Files that are produced or restored by the cache are identified by the key of the stage that produced them,
+# so chained stages don't have to hash intermediate files. Other input files are hashed once, the hash is reused as
+# long as their size and modification time don't change. Outputs are hard links to the files in the cache (copies if
+# the cache is on another file system), so the outputs of a stage are removed before it runs instead of being
+# overwritten, which would also change the cached files. The cached files are read-only (and so are the outputs that
+# are linked to them) and their size and modification time are checked on every hit, entries whose files were changed
+# anyway are recomputed.
+
+# input and output parameters (file paths) of the preprocessing functions, parameters that contain lists of file paths
+# are also supported
+STAGE_FILES = {
+    "remove_entity_pairs": (["dataset_filepath", "pairs_dataset_filepath"], ["processed_dataset_filepath"]),
+    "filter_triples_by_uri": (["dataset_filepath"], ["processed_dataset_filepath"]),
+    "fix_redirections": (["dataset_filepath", "redirections_filepath"], ["processed_dataset_filepath"]),
+    "filter_properties": (["properties_dataset_filepath", "filtered_property_types_filepath"], ["processed_dataset_filepath"]),
+    "filter_entities": (["dataset_filepath", "entities_dataset_filepath"], ["processed_dataset_filepath"]),
+    "split_dataset": (["dataset_filepath"], ["trainset_filepath", "valset_filepath", "testset_filepath"]),
+    "concat_files": (["filepaths"], ["processed_dataset_filepath"]),
+}
+# parameters that don't change the outputs of a stage (they only change how the outputs are computed), the
+# redirections index is rebuilt by read_redirections if it doesn't match the redirections dataset (an input file)
+IGNORED_PARAMS = ("n_workers", "redirections_index_filepath", "pairs_spill_dirpath")
+
+INDEX_FILENAME = "index.json"
+RESULT_FILENAME = "result.pkl"
+
+
+def hash_file(filepath, block_size=16777216):
+    """
+    Returns the BLAKE2 hash of the contents of a file as hex string.
+    """
+    file_hash = hashlib.blake2b(digest_size=20)
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def local_imports(module_filepath):
+    """
+    Returns the file paths of the modules next to a module that it imports.
+    """
+    with open(module_filepath, "rb") as f:
+        tree = ast.parse(f.read())
+    module_names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            module_names.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module is not None and node.level == 0:
+            module_names.add(node.module.split(".")[0])
+    filepaths = [os.path.join(os.path.dirname(module_filepath), f"{name}.py") for name in module_names]
+    return [filepath for filepath in filepaths if os.path.isfile(filepath)]
+
+
+def hash_source_code(function):
+    """
+    Returns a hash of the source code of the module that defines the function and of the local modules that it
+    imports (directly or through other local modules).
+    """
+    module_filepath = os.path.abspath(inspect.getsourcefile(inspect.unwrap(function)))
+    filepaths = {module_filepath}
+    unvisited = [module_filepath]
+    while len(unvisited) > 0:
+        for filepath in local_imports(unvisited.pop()):
+            filepath = os.path.abspath(filepath)
+            if filepath not in filepaths:
+                filepaths.add(filepath)
+                unvisited.append(filepath)
+    source_hash = hashlib.blake2b(digest_size=20)
+    for filepath in sorted(filepaths):
+        with open(filepath, "rb") as f:
+            source_hash.update(f.read())
+    return source_hash.hexdigest()
+
+
+def link_file(source_filepath, filepath):
+    """
+    Creates a hard link to a file (replacing an existing file) or copies it if the paths are on different file systems.
+    """
+    if os.path.lexists(filepath):
+        os.remove(filepath)
+    try:
+        os.link(source_filepath, filepath)
+    except OSError:
+        shutil.copyfile(source_filepath, filepath)
+
+
+def file_stat(filepath):
+    """
+    Returns the size and modification time of a file (to detect changes of cached files).
+    """
+    stat = os.stat(filepath)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class StageCache:
+    """
+    Cache for the outputs of the preprocessing functions (see STAGE_FILES). A stage is run with run(function, **kwargs)
+    instead of function(**kwargs). If the stage was already run with the same inputs, parameters and source code, the
+    cached outputs are linked to the output file paths (or left untouched if they still exist) instead of running the
+    stage. The least recently used entries are removed when the cache exceeds max_size bytes.
+    """
+
+    def __init__(self, cache_dirpath, max_size=100000000000):
+        self.cache_dirpath = cache_dirpath
+        self.max_size = max_size
+        os.makedirs(cache_dirpath, exist_ok=True)
+        index_filepath = os.path.join(cache_dirpath, INDEX_FILENAME)
+        if os.path.isfile(index_filepath):
+            with open(index_filepath) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {"entries": {}, "files": {}}
+
+    def save_index(self):
+        index_filepath = os.path.join(self.cache_dirpath, INDEX_FILENAME)
+        with open(index_filepath + ".tmp", "w") as f:
+            json.dump(self.index, f)
+        os.replace(index_filepath + ".tmp", index_filepath)
+
+    def entry_dirpath(self, key):
+        return os.path.join(self.cache_dirpath, key[:2], key)
+
+    def file_fingerprint(self, filepath):
+        """
+        Returns the fingerprint of an input file: the key of the stage output if the file was produced by the cache,
+        otherwise the hash of its contents (only recomputed if its size or modification time changed).
+        """
+        if not os.path.isfile(filepath):
+            return "missing"
+        fingerprint = self.file_fingerprint_if_known(filepath)
+        if fingerprint is not None:
+            return fingerprint
+        print(f"hash input file {filepath}...")
+        fingerprint = hash_file(filepath)
+        self.register_file(filepath, fingerprint)
+        return fingerprint
+
+    def register_file(self, filepath, fingerprint):
+        stat = os.stat(filepath)
+        self.index["files"][os.path.abspath(filepath)] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "fingerprint": fingerprint
+        }
+
+    def stage_key(self, function, params, input_params, output_params):
+        """
+        Returns the key of a stage that is derived from its name, the fingerprints of its input files, its parameters
+        (including defaults), the extensions of its output files and the source code.
+        """
+        description = {"stage": function.__name__, "source": hash_source_code(function)}
+        for name, value in sorted(params.items()):
+            if name in IGNORED_PARAMS:
+                continue
+            if name in input_params:
+                filepaths = value if isinstance(value, (list, tuple)) else [value]
+                value = [self.file_fingerprint(filepath) for filepath in filepaths]
+            elif name in output_params:
+                # the output format depends on the file extension
+                value = os.path.splitext(value)[1].lower()
+            description[name] = value
+        description = json.dumps(description, sort_keys=True, default=repr)
+        return hashlib.blake2b(description.encode("utf-8"), digest_size=20).hexdigest()
+
+    def run(self, function, **kwargs):
+        """
+        Runs a preprocessing function or restores its outputs from the cache.
+
+        :param function: preprocessing function (see STAGE_FILES)
+        :type function: function
+        :param kwargs: arguments of the function (all file paths have to be passed as keyword arguments)
+        :return: return value of the function
+        """
+        input_params, output_params = STAGE_FILES[function.__name__]
+        bound_args = inspect.signature(function).bind(**kwargs)
+        bound_args.apply_defaults()
+        params = dict(bound_args.arguments)
+        key = self.stage_key(function, params, input_params, output_params)
+        output_filepaths = [params[name] for name in output_params]
+        entry = self.index["entries"].get(key)
+
+        if entry is not None and not self.entry_unchanged(key, entry):
+            print(f"{function.__name__}: cached outputs were changed, recompute stage ({key[:12]})")
+            shutil.rmtree(self.entry_dirpath(key), ignore_errors=True)
+            del self.index["entries"][key]
+            entry = None
+
+        if entry is not None:
+            print(f"{function.__name__}: using cached outputs ({key[:12]})")
+            for i, filepath in enumerate(output_filepaths):
+                fingerprint = f"{key}/{i}"
+                # outputs that still exist from the last run don't have to be linked
+                if self.file_fingerprint_if_known(filepath) != fingerprint:
+                    link_file(os.path.join(self.entry_dirpath(key), entry["outputs"][i]), filepath)
+                    self.register_file(filepath, fingerprint)
+            with open(os.path.join(self.entry_dirpath(key), RESULT_FILENAME), "rb") as f:
+                result = pickle.load(f)
+        else:
+            # outputs may be links to cached files, they are removed so the stage writes new files
+            for filepath in output_filepaths:
+                if os.path.isfile(filepath):
+                    os.remove(filepath)
+            start_time = time.time()
+            result = function(**kwargs)
+            # stages that stopped early (e.g. because of a wrong file type) are not cached
+            if not all(os.path.isfile(filepath) for filepath in output_filepaths):
+                return result
+            print(f"{function.__name__}: computed in {round(time.time() - start_time, 1)} seconds, stored in cache ({key[:12]})")
+            entry = self.store(key, function.__name__, output_filepaths, result)
+
+        entry["last_used"] = time.time()
+        self.evict(keep_key=key)
+        self.save_index()
+        return result
+
+    def file_fingerprint_if_known(self, filepath):
+        """
+        Returns the fingerprint of a file if it is unchanged since it was registered, otherwise None.
+        """
+        known_file = self.index["files"].get(os.path.abspath(filepath))
+        if known_file is None or not os.path.isfile(filepath):
+            return None
+        stat = os.stat(filepath)
+        if known_file["size"] != stat.st_size or known_file["mtime_ns"] != stat.st_mtime_ns:
+            return None
+        return known_file["fingerprint"]
+
+    def entry_unchanged(self, key, entry):
+        """
+        Returns whether all files of a cache entry still exist with the size and modification time they were stored
+        with (entries of older versions of the cache without them are treated as changed).
+        """
+        if "files" not in entry:
+            return False
+        for output_filename, stored_stat in zip(entry["outputs"], entry["files"]):
+            filepath = os.path.join(self.entry_dirpath(key), output_filename)
+            if not os.path.isfile(filepath) or file_stat(filepath) != stored_stat:
+                return False
+        return True
+
+    def store(self, key, stage, output_filepaths, result):
+        """
+        Links (or copies) the outputs of a stage into a new cache entry and makes the cached files read-only.
+        """
+        entry_dirpath = self.entry_dirpath(key)
+        temp_dirpath = entry_dirpath + ".tmp"
+        shutil.rmtree(temp_dirpath, ignore_errors=True)
+        os.makedirs(temp_dirpath)
+        outputs = []
+        for i, filepath in enumerate(output_filepaths):
+            output_filename = f"{i}_{os.path.basename(filepath)}"
+            link_file(filepath, os.path.join(temp_dirpath, output_filename))
+            os.chmod(os.path.join(temp_dirpath, output_filename), 0o444)
+            outputs.append(output_filename)
+            self.register_file(filepath, f"{key}/{i}")
+        with open(os.path.join(temp_dirpath, RESULT_FILENAME), "wb") as f:
+            pickle.dump(result, f)
+        shutil.rmtree(entry_dirpath, ignore_errors=True)
+        os.replace(temp_dirpath, entry_dirpath)
+        size = sum(os.path.getsize(os.path.join(entry_dirpath, filename)) for filename in os.listdir(entry_dirpath))
+        files = [file_stat(os.path.join(entry_dirpath, output_filename)) for output_filename in outputs]
+        entry = {"stage": stage, "outputs": outputs, "files": files, "size": size, "last_used": time.time()}
+        self.index["entries"][key] = entry
+        return entry
+
+    def size(self):
+        """
+        Returns the size of all cache entries in bytes.
+        """
+        return sum(entry["size"] for entry in self.index["entries"].values())
+
+    def evict(self, keep_key=None):
+        """
+        Removes the least recently used entries until the cache is not larger than max_size (except keep_key).
+        """
+        entries = sorted(self.index["entries"].items(), key=lambda item: item[1]["last_used"])
+        cache_size = self.size()
+        for key, entry in entries:
+            if cache_size <= self.max_size:
+                break
+            if key == keep_key:
+                continue
+            print(f"remove {entry['stage']} ({key[:12]}) from cache")
+            shutil.rmtree(self.entry_dirpath(key), ignore_errors=True)
+            del self.index["entries"][key]
+            cache_size -= entry["size"]
@@ -0,0 +1,311 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Generator of synthetic datasets in the formats of the neo4j exports and the DBpedia dumps, so the pre-processing can
+# be run and benchmarked without them (see benchmark_suite.py). The entities are connected by degree-weighted sampling
+# with weights that follow the skewed degree distribution of the knowledge graph in
+# neo4j_scripts/neo4j_analyze_data_log.txt, so a few hub entities appear in a large share of the triples.
+
+# quantiles of the undirected degree of all links (neo4j_analyze_data_log.txt)
+DEGREE_QUANTILES = [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99, 0.999, 1.0]
+DEGREE_VALUES = [0, 1, 1, 1, 1, 2, 2, 4, 13, 37, 69, 220, 998, 1051615]
+# quantiles of the number of triples per property, without wikilinks (neo4j_analyze_data_log.txt)
+PROPERTY_COUNT_QUANTILES = [0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99, 1.0]
+PROPERTY_COUNT_VALUES = [1, 37, 157, 447, 948, 1887, 4424, 9695, 21034, 58540, 129083, 548303, 3138832]
+# quantiles of the number of types per entity (neo4j_analyze_data_log.txt)
+TYPE_COUNT_QUANTILES = [0.0, 0.7, 0.8, 0.9, 0.95, 0.99, 0.999, 1.0]
+TYPE_COUNT_VALUES = [0, 0, 3, 7, 13, 15, 16, 23]
+# numbers of entities and properties from which the quantiles were computed (neo4j_analyze_data_log.txt)
+DBPEDIA_N_ENTITIES = 32177705
+DBPEDIA_N_PROPERTIES = 627
+
+# shares of the property triples in the exported datasets
+DATASET_FRACTIONS = {
+    "remaining_triples": 0.8,
+    "mw_both_sides": 0.06,
+    "mw_one_side": 0.04,
+    "mw_no_props": 0.1
+}
+# file names of the datasets (same as in the data directory of the notebook)
+DATASET_FILENAMES = {
+    "mw_both_sides": "mutual_wikilinks_properties_both_sides.csv",
+    "mw_one_side": "mutual_wikilinks_properties_one_side.csv",
+    "mw_no_props": "mutual_wikilinks_no_properties.csv",
+    "remaining_triples": "remaining_triples.csv",
+    "types": "instance-types_inference=transitive_lang=en.ttl",
+    "redirections": "redirects_inference=transitive_lang=en.ttl",
+    "filtered_property_types": "filtered_property_types.csv"
+}
+
+RESOURCE_PREFIX = "http://dbpedia.org/resource/"
+ENTITY_PREFIX = RESOURCE_PREFIX + "Entity_"
+ALIAS_PREFIX = RESOURCE_PREFIX + "Alias_"
+OUTSIDE_PREFIX = "http://www.wikidata.org/entity/Q"
+PROPERTY_PREFIX = "http://dbpedia.org/ontology/property"
+TYPE_PREFIX = "http://dbpedia.org/ontology/Type"
+WIKILINK = "http://dbpedia.org/ontology/wikiPageWikiLink"
+CAREER_STATION = "http://dbpedia.org/ontology/careerStation"
+REDIRECT = "http://dbpedia.org/ontology/wikiPageRedirects"
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+OWL_THING = "http://www.w3.org/2002/07/owl#Thing"
+
+
+def sample_from_quantiles(n, quantiles, values, population, rng):
+    """
+    Samples n values from a distribution that is given by some of its quantiles, e.g. the quantiles in
+    neo4j_analyze_data_log.txt. The maximum (quantile 1) is treated as the quantile 1 - 1 / population. The inverse
+    distribution function is interpolated linearly between the logarithms of the values and of the tail probabilities
+    (1 - quantile), which follows the heavy tail of the distribution between the highest quantiles.
+
+    :param n: number of values
+    :type n: int
+    :param quantiles: probabilities of the quantiles (from 0 to 1)
+    :type quantiles: list
+    :param values: values of the quantiles
+    :type values: list
+    :param population: number of values from which the quantiles were computed
+    :type population: int
+    :param rng: random number generator
+    :type rng: numpy.random.Generator
+    :return: numpy array of rounded values
+    """
+    tail_probabilities = np.maximum(1 - np.asarray(quantiles, dtype=np.float64), 1 / population)
+    log_values = np.log1p(np.asarray(values, dtype=np.float64))
+    sampled_tail_probabilities = np.maximum(1 - rng.random(n), 1 / population)
+    # np.interp needs increasing x values, the log tail probabilities are decreasing
+    return np.rint(np.expm1(np.interp(
+        -np.log(sampled_tail_probabilities),
+        -np.log(tail_probabilities),
+        log_values
+    )))
+
+
+class WeightedSampler:
+    """
+    Samples IDs from 0 to len(weights) - 1 with probabilities proportional to the weights.
+    """
+
+    def __init__(self, weights):
+        self.cumulative_weights = np.cumsum(weights, dtype=np.float64)
+
+    def sample(self, n, rng):
+        positions = rng.random(n) * self.cumulative_weights[-1]
+        return np.searchsorted(self.cumulative_weights, positions, side="right").astype(np.int64)
+
+
+def format_uris(prefix, ids):
+    return prefix + pd.Series(ids).astype(str)
+
+
+def write_csv_triples(f, subjects, predicates, objects):
+    """
+    Writes triples as CSV lines with quoted values, like the CSV files exported with apoc.export.csv.query.
+    """
+    lines = '"' + subjects + '","' + predicates + '","' + objects + '"\n'
+    f.write("".join(lines.tolist()))
+
+
+def write_ttl_triples(f, subjects, predicates, objects):
+    """
+    Writes triples as lines of N-Triples, like the line-based Turtle files of the DBpedia dumps.
+    """
+    lines = "<" + subjects + "> <" + predicates + "> <" + objects + "> .\n"
+    f.write("".join(lines.tolist()))
+
+
+def chunk_sizes(n, chunksize):
+    return [min(chunksize, n - start) for start in range(0, n, chunksize)]
+
+
+def generate_synthetic_datasets(
+        output_dirpath,
+        n_triples=1000000,
+        n_entities=None,
+        n_properties=DBPEDIA_N_PROPERTIES,
+        n_types=772,
+        outside_fraction=0.02,
+        career_station_fraction=0.08,
+        redirected_fraction=0.02,
+        redirections_per_entity=1.0,
+        filtered_property_fraction=0.5,
+        random_state=42,
+        chunksize=1000000
+    ):
+    """
+    This function is used to generate a synthetic version of the datasets that are used in the data pre-processing:
+    the three CSV files of mutually wikilinked entity pairs, the CSV file of remaining triples, the types and
+    redirections TTL files and the CSV file of filtered property types (see DATASET_FILENAMES). The property triples
+    (n_triples) are distributed over the CSV files by DATASET_FRACTIONS, the numbers of type statements and
+    redirections depend on the number of entities. The entities of the triples are sampled with weights that follow
+    the degree distribution of DBpedia, the properties and types with weights that follow the distributions of their
+    numbers of triples and entities. The remaining triples contain entities outside of DBpedia and career stations,
+    and some entities are redirected, so all steps of the pre-processing have triples to remove or fix.
+
+    :param output_dirpath: directory in which the datasets are written
+    :type output_dirpath: str
+    :param n_triples: number of property triples in all CSV files together
+    :type n_triples: int
+    :param n_entities: number of entities (defaults to a fifth of the number of triples)
+    :type n_entities: int
+    :param n_properties: number of properties
+    :type n_properties: int
+    :param n_types: number of types
+    :type n_types: int
+    :param outside_fraction: fraction of the remaining triples with objects outside of DBpedia
+    :type outside_fraction: float
+    :param career_station_fraction: fraction of the remaining triples with career stations
+    :type career_station_fraction: float
+    :param redirected_fraction: fraction of the entities that are redirected to other entities
+    :type redirected_fraction: float
+    :param redirections_per_entity: number of redirections of URIs that don't appear in the datasets per entity
+    :type redirections_per_entity: float
+    :param filtered_property_fraction: fraction of the properties in the filtered property types
+    :type filtered_property_fraction: float
+    :param random_state: seed of the random number generator
+    :type random_state: int
+    :param chunksize: number of triples that are generated and written at once
+    :type chunksize: int
+    :return: dictionary with the file paths of the datasets (keys of DATASET_FILENAMES)
+    """
+    if n_entities is None:
+        n_entities = max(n_triples // 5, 2)
+    rng = np.random.default_rng(random_state)
+    os.makedirs(output_dirpath, exist_ok=True)
+    filepaths = {name: os.path.join(output_dirpath, filename) for name, filename in DATASET_FILENAMES.items()}
+
+    # entity weights follow the degree distribution, entities without links get a small weight, so they can still appear
+    print("sample entity and property weights...")
+    entity_sampler = WeightedSampler(np.maximum(sample_from_quantiles(n_entities, DEGREE_QUANTILES, DEGREE_VALUES, DBPEDIA_N_ENTITIES, rng), 0.1))
+    property_weights = np.sort(sample_from_quantiles(n_properties, PROPERTY_COUNT_QUANTILES, PROPERTY_COUNT_VALUES, DBPEDIA_N_PROPERTIES, rng))[::-1]
+    property_sampler = WeightedSampler(np.maximum(property_weights, 1))
+    properties = format_uris(PROPERTY_PREFIX, np.arange(n_properties)).to_numpy(dtype=object)
+
+    # redirected entities point to entities that are not redirected themselves
+    is_redirected = rng.random(n_entities) < redirected_fraction
+    not_redirected = np.flatnonzero(~is_redirected)
+    redirection_targets = np.full(n_entities, -1, dtype=np.int64)
+    redirection_targets[is_redirected] = not_redirected[rng.integers(0, len(not_redirected), is_redirected.sum())]
+    degrees = np.zeros(n_entities, dtype=np.int64)
+
+    def sample_pairs(n):
+        subjects = entity_sampler.sample(n, rng)
+        objects = entity_sampler.sample(n, rng)
+        # entities are not linked with themselves
+        same = subjects == objects
+        objects[same] = (objects[same] + 1) % n_entities
+        return subjects, objects
+
+    n_rows = {name: int(n_triples * fraction) for name, fraction in DATASET_FRACTIONS.items()}
+    n_rows["remaining_triples"] = n_triples - sum(n_rows.values()) + n_rows["remaining_triples"]
+
+    # remaining triples, some with objects outside of DBpedia or career stations as subjects
+    print(f"write {n_rows['remaining_triples']} remaining triples...")
+    with open(filepaths["remaining_triples"], "w", encoding="utf-8") as f:
+        f.write('"subject","predicate","object"\n')
+        for n in chunk_sizes(n_rows["remaining_triples"], chunksize):
+            subject_ids, object_ids = sample_pairs(n)
+            np.add.at(degrees, subject_ids, 1)
+            np.add.at(degrees, object_ids, 1)
+            subjects = format_uris(ENTITY_PREFIX, subject_ids)
+            predicates = pd.Series(properties[property_sampler.sample(n, rng)])
+            objects = format_uris(ENTITY_PREFIX, object_ids)
+            kind = rng.random(n)
+            is_outside = kind < outside_fraction
+            objects[is_outside] = format_uris(OUTSIDE_PREFIX, object_ids[is_outside]).to_numpy()
+            # career stations of the subjects, e.g. http://dbpedia.org/resource/Entity_1__CareerStation__3
+            is_career_station = (kind >= outside_fraction) & (kind < outside_fraction + career_station_fraction)
+            career_station_numbers = pd.Series(rng.integers(1, 20, n)).astype(str)
+            objects[is_career_station] = (subjects + "__CareerStation__" + career_station_numbers)[is_career_station].to_numpy()
+            predicates[is_career_station] = CAREER_STATION
+            write_csv_triples(f, subjects, predicates, objects)
+
+    # mutually wikilinked entity pairs, connected by properties in both directions, in one direction or not at all
+    for name in ["mw_both_sides", "mw_one_side", "mw_no_props"]:
+        print(f"write {n_rows[name]} triples of mutually wikilinked entities ({name})...")
+        with open(filepaths[name], "w", encoding="utf-8") as f:
+            f.write('"subject","predicate","object"\n')
+            for n in chunk_sizes(n_rows[name], chunksize):
+                if name == "mw_both_sides":
+                    # one triple per direction for each pair
+                    subject_ids, object_ids = sample_pairs(n // 2 + n % 2)
+                    subject_ids, object_ids = np.concatenate([subject_ids, object_ids])[:n], np.concatenate([object_ids, subject_ids])[:n]
+                else:
+                    subject_ids, object_ids = sample_pairs(n)
+                if name == "mw_no_props":
+                    predicates = pd.Series([WIKILINK] * n)
+                else:
+                    predicates = pd.Series(properties[property_sampler.sample(n, rng)])
+                write_csv_triples(
+                    f,
+                    format_uris(ENTITY_PREFIX, subject_ids),
+                    predicates,
+                    format_uris(ENTITY_PREFIX, object_ids)
+                )
+
+    # types: entities without links rarely have types, all typed entities are things
+    print("write types...")
+    n_entity_types = sample_from_quantiles(n_entities, TYPE_COUNT_QUANTILES, TYPE_COUNT_VALUES, DBPEDIA_N_ENTITIES, rng).astype(np.int64)
+    n_entity_types[degrees == 0] = 0
+    type_sampler = WeightedSampler(1 / np.arange(1, n_types + 1))
+    types = pd.Series([OWL_THING] + format_uris(TYPE_PREFIX, np.arange(1, n_types)).tolist()).to_numpy(dtype=object)
+    n_type_statements = 0
+    with open(filepaths["types"], "w", encoding="utf-8") as f:
+        for start in range(0, n_entities, chunksize):
+            entity_ids = np.arange(start, min(start + chunksize, n_entities))
+            entity_ids = np.repeat(entity_ids, n_entity_types[entity_ids])
+            type_ids = type_sampler.sample(len(entity_ids), rng)
+            # the first type of every entity is owl:Thing
+            is_first = np.ones(len(entity_ids), dtype=bool)
+            is_first[1:] = entity_ids[1:] != entity_ids[:-1]
+            type_ids[is_first] = 0
+            statements = pd.DataFrame({"entity": entity_ids, "type": type_ids}).drop_duplicates()
+            n_type_statements += len(statements)
+            write_ttl_triples(
+                f,
+                format_uris(ENTITY_PREFIX, statements["entity"].to_numpy()),
+                pd.Series([RDF_TYPE] * len(statements)),
+                pd.Series(types[statements["type"].to_numpy()])
+            )
+    print(f"{n_type_statements} type statements")
+
+    # redirections of the redirected entities and of URIs that don't appear in the datasets
+    print("write redirections...")
+    n_aliases = int(n_entities * redirections_per_entity)
+    with open(filepaths["redirections"], "w", encoding="utf-8") as f:
+        redirected_ids = np.flatnonzero(is_redirected)
+        for start in range(0, len(redirected_ids), chunksize):
+            ids = redirected_ids[start:start + chunksize]
+            write_ttl_triples(
+                f,
+                format_uris(ENTITY_PREFIX, ids),
+                pd.Series([REDIRECT] * len(ids)),
+                format_uris(ENTITY_PREFIX, redirection_targets[ids])
+            )
+        for n in chunk_sizes(n_aliases, chunksize):
+            alias_ids = rng.integers(0, np.iinfo(np.int64).max, n)
+            write_ttl_triples(
+                f,
+                format_uris(ALIAS_PREFIX, alias_ids),
+                pd.Series([REDIRECT] * n),
+                format_uris(ENTITY_PREFIX, not_redirected[rng.integers(0, len(not_redirected), n)])
+            )
+    print(f"{is_redirected.sum() + n_aliases} redirections")
+
+    # filtered property types: a random subset of the properties
+    filtered_properties = properties[rng.random(n_properties) < filtered_property_fraction]
+    pd.DataFrame({"filtered_property_types": filtered_properties}).to_csv(filepaths["filtered_property_types"], index=False)
+
+    print_degree_comparison(degrees)
+    return filepaths
+
+
+def print_degree_comparison(degrees):
+    """
+    Prints the quantiles of the undirected degrees of the generated entities next to the quantiles of DBpedia.
+    """
+    generated = np.quantile(degrees, DEGREE_QUANTILES)
+    print("\ndegree quantiles of the generated remaining triples and of DBpedia:")
+    print("quantile\tgenerated\tDBpedia")
+    for quantile, generated_value, value in zip(DEGREE_QUANTILES, generated, DEGREE_VALUES):
+        print(f"{quantile}\t\t{generated_value:.0f}\t\t{value}")
@@ -0,0 +1,276 @@
+import heapq
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from io_utility import read_triple_chunks
+
+# The URI dictionary maps every URI (entities, properties and types) of the datasets to an int32 ID.
+# It is stored in a directory as one file containing all UTF-8 encoded URIs in sorted order (uris.bin)
+# and one file with the start offset of each URI (offsets.npy). The ID of a URI is its position in the sorted
+# order, so the IDs don't depend on the order in which the datasets are read. URIs are encoded with a hash table:
+# the sorted 64-bit hashes of all URIs (hashes.npy) with the ID of each hash (hash_ids.npy) and a second,
+# independent hash of the URI (check_hashes.npy), which has to match as well, so URIs that are not in the
+# dictionary are not mistaken for URIs with the same first hash. All files are memory-mapped when the dictionary is
+# loaded and URIs are only decoded from the offsets when they are looked up, so the dictionary never holds all URIs
+# as Python strings. The file path, file type, size and modification time of the datasets the dictionary was built
+# from are stored in metadata.json, so dictionaries of outdated datasets are rebuilt (see update_uri_dictionary).
+URIS_FILENAME = "uris.bin"
+OFFSETS_FILENAME = "offsets.npy"
+HASHES_FILENAME = "hashes.npy"
+HASH_IDS_FILENAME = "hash_ids.npy"
+CHECK_HASHES_FILENAME = "check_hashes.npy"
+RUNS_DIRNAME = "runs"
+METADATA_FILENAME = "metadata.json"
+# keys of the two URI hashes (pd.util.hash_array requires 16 characters)
+HASH_KEY = "uri_dictionary_1"
+CHECK_HASH_KEY = "uri_dictionary_2"
+
+
+def hash_uris(uris, hash_key=HASH_KEY):
+    """
+    Returns the unsigned 64-bit hashes of URIs.
+    """
+    return pd.util.hash_array(np.asarray(uris, dtype=object), hash_key=hash_key)
+
+
+def write_run(uris, run_filepath):
+    """
+    Writes sorted unique URIs to a run file (one URI per line).
+    """
+    with open(run_filepath, "w", encoding="utf-8") as f:
+        f.write("".join(uri + "\n" for uri in uris))
+
+
+def read_run(run_filepath):
+    with open(run_filepath, encoding="utf-8") as f:
+        for line in f:
+            yield line[:-1]
+
+
+def build_uri_dictionary(filepaths, filetypes, dictionary_dirpath, chunksize=2000000, run_size=10000000, **csv_parsing_args):
+    """
+    This function is used to build the URI dictionary from datasets of triples. The unique URIs of the chunks are
+    collected in sorted runs of up to run_size URIs, which are written to disk and merged into the sorted URIs of the
+    dictionary, so the URIs of all datasets don't have to fit into memory at once.
+
+    :param filepaths: list of file paths (strings) of the datasets
+    :type filepaths: list
+    :param filetypes: list of filetypes (strings, either "csv" or "ttl")
+    :type filetypes: list
+    :param dictionary_dirpath: directory in which the dictionary is stored
+    :type dictionary_dirpath: str
+    :param chunksize: size of the chunks that are read when iterating over the files
+    :type chunksize: int
+    :param run_size: maximum number of URIs that are collected in memory before they are written to a sorted run
+    :type run_size: int
+    :param csv_parsing_args: additional arguments that are passed to pd.read_csv for CSV files
+    :return: number of URIs in the dictionary
+    """
+    # the metadata is written last, so a dictionary whose build was interrupted is never up to date
+    metadata_filepath = os.path.join(dictionary_dirpath, METADATA_FILENAME)
+    if os.path.isfile(metadata_filepath):
+        os.remove(metadata_filepath)
+    runs_dirpath = os.path.join(dictionary_dirpath, RUNS_DIRNAME)
+    shutil.rmtree(runs_dirpath, ignore_errors=True)
+    os.makedirs(runs_dirpath)
+
+    # write the unique URIs of all datasets to sorted runs
+    run_filepaths = []
+    uris = []
+    n_uris = 0
+    for i, (filepath, filetype) in enumerate(zip(filepaths, filetypes)):
+        for j, chunk in enumerate(read_triple_chunks(filepath, filetype, chunksize, **csv_parsing_args)):
+            print(f"build URI dictionary (file {i+1}, chunk {j+1})...")
+            uris.append(pd.unique(chunk[["subject", "predicate", "object"]].to_numpy().ravel()))
+            n_uris += len(uris[-1])
+            if n_uris >= run_size:
+                run_filepaths.append(os.path.join(runs_dirpath, f"run_{len(run_filepaths)}.txt"))
+                write_run(np.unique(np.concatenate(uris)), run_filepaths[-1])
+                uris = []
+                n_uris = 0
+    if len(uris) > 0 or len(run_filepaths) == 0:
+        run_filepaths.append(os.path.join(runs_dirpath, f"run_{len(run_filepaths)}.txt"))
+        write_run(np.unique(np.concatenate(uris)) if len(uris) > 0 else [], run_filepaths[-1])
+    uris = None
+
+    # merge the runs and store the URIs and their offsets
+    print("merge URI runs...")
+    offsets = [np.zeros(1, dtype=np.int64)]
+    n_bytes = 0
+    previous_uri = None
+    batch = []
+    with open(os.path.join(dictionary_dirpath, URIS_FILENAME), "wb") as f:
+        for uri in heapq.merge(*[read_run(run_filepath) for run_filepath in run_filepaths]):
+            if uri == previous_uri:
+                continue
+            previous_uri = uri
+            batch.append(uri.encode("utf-8"))
+            if len(batch) >= 1000000:
+                n_bytes = write_uri_batch(f, batch, offsets, n_bytes)
+                batch = []
+        write_uri_batch(f, batch, offsets, n_bytes)
+    offsets = np.concatenate(offsets)
+    n_uris = len(offsets) - 1
+    if n_uris > np.iinfo(np.int32).max:
+        raise ValueError(f"{n_uris} URIs don't fit into int32 IDs")
+    np.save(os.path.join(dictionary_dirpath, OFFSETS_FILENAME), offsets)
+    shutil.rmtree(runs_dirpath)
+
+    build_hash_table(dictionary_dirpath)
+    metadata = {"n_uris": n_uris, "sources": [uri_dictionary_source(filepath, filetype) for filepath, filetype in zip(filepaths, filetypes)]}
+    with open(metadata_filepath, "w") as f:
+        json.dump(metadata, f)
+    print(f"\nnumber of URIs in dictionary: {n_uris}")
+    return n_uris
+
+
+def uri_dictionary_source(filepath, filetype):
+    """
+    Returns the file path, file type, size and modification time of a dataset that is stored in the URI dictionary.
+    """
+    stat = os.stat(filepath)
+    return {"filepath": os.path.abspath(filepath), "filetype": filetype, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def uri_dictionary_up_to_date(dictionary_dirpath, filepaths, filetypes):
+    """
+    Returns whether the URI dictionary exists and was built from the current versions of the datasets. The dictionary
+    may contain the URIs of further datasets, e.g. if it is shared by several functions.
+    """
+    metadata_filepath = os.path.join(dictionary_dirpath, METADATA_FILENAME)
+    if not os.path.isfile(metadata_filepath):
+        return False
+    with open(metadata_filepath) as f:
+        sources = json.load(f)["sources"]
+    for filepath, filetype in zip(filepaths, filetypes):
+        if not os.path.isfile(filepath) or uri_dictionary_source(filepath, filetype) not in sources:
+            return False
+    return True
+
+
+def update_uri_dictionary(filepaths, filetypes, dictionary_dirpath, chunksize=2000000, **csv_parsing_args):
+    """
+    Builds the URI dictionary of the datasets (see build_uri_dictionary) unless it exists and was built from the
+    current versions of the datasets.
+    """
+    if uri_dictionary_up_to_date(dictionary_dirpath, filepaths, filetypes):
+        return
+    if os.path.isdir(dictionary_dirpath):
+        print("URI dictionary is outdated, rebuild URI dictionary...")
+    build_uri_dictionary(filepaths, filetypes, dictionary_dirpath, chunksize, **csv_parsing_args)
+
+
+def write_uri_batch(f, batch, offsets, n_bytes):
+    """
+    Writes a batch of encoded URIs to the URI file and appends their end offsets, returns the new number of bytes.
+    """
+    f.write(b"".join(batch))
+    offsets.append(n_bytes + np.cumsum([len(uri) for uri in batch], dtype=np.int64))
+    return n_bytes + sum(len(uri) for uri in batch)
+
+
+def build_hash_table(dictionary_dirpath, batch_size=1000000):
+    """
+    Stores the hash table of the URIs of a dictionary (see UriDictionary.encode). The URIs are decoded in batches.
+    """
+    uri_dictionary = UriDictionary(dictionary_dirpath, load_hash_table=False)
+    hashes = np.zeros(len(uri_dictionary), dtype=np.uint64)
+    check_hashes = np.zeros(len(uri_dictionary), dtype=np.uint64)
+    for start in range(0, len(uri_dictionary), batch_size):
+        uris = uri_dictionary.decode(np.arange(start, min(start + batch_size, len(uri_dictionary))))
+        hashes[start:start + batch_size] = hash_uris(uris)
+        check_hashes[start:start + batch_size] = hash_uris(uris, CHECK_HASH_KEY)
+    order = np.argsort(hashes, kind="stable")
+    hashes = hashes[order]
+    if (hashes[1:] == hashes[:-1]).any():
+        raise ValueError("URI hash collision, the URIs can't be encoded with the hash table")
+    np.save(os.path.join(dictionary_dirpath, HASHES_FILENAME), hashes)
+    np.save(os.path.join(dictionary_dirpath, HASH_IDS_FILENAME), order.astype(np.int32))
+    np.save(os.path.join(dictionary_dirpath, CHECK_HASHES_FILENAME), check_hashes[order])
+
+
+class UriDictionary:
+    """
+    Memory-mapped URI dictionary (see build_uri_dictionary) that encodes URIs to int32 IDs and decodes IDs back
+    to URIs. URIs are encoded by looking up their hashes in the memory-mapped hash table and decoded from their
+    offsets in the memory-mapped URI file, so loading the dictionary (e.g. in every worker process) only maps the
+    files. The hash table of dictionaries that were built without it is created when they are first loaded. When the
+    dictionary is sent to a worker process only the directory path is transferred.
+    """
+
+    def __init__(self, dictionary_dirpath, load_hash_table=True):
+        self.dictionary_dirpath = dictionary_dirpath
+        self.offsets = np.load(os.path.join(dictionary_dirpath, OFFSETS_FILENAME), mmap_mode="r")
+        self.blob = np.memmap(os.path.join(dictionary_dirpath, URIS_FILENAME), dtype=np.uint8, mode="r") \
+            if self.offsets[-1] > 0 else np.zeros(0, dtype=np.uint8)
+        if load_hash_table:
+            if not os.path.isfile(os.path.join(dictionary_dirpath, CHECK_HASHES_FILENAME)):
+                build_hash_table(dictionary_dirpath)
+            self.hashes = np.load(os.path.join(dictionary_dirpath, HASHES_FILENAME), mmap_mode="r")
+            self.hash_ids = np.load(os.path.join(dictionary_dirpath, HASH_IDS_FILENAME), mmap_mode="r")
+            self.check_hashes = np.load(os.path.join(dictionary_dirpath, CHECK_HASHES_FILENAME), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getstate__(self):
+        return {"dictionary_dirpath": self.dictionary_dirpath}
+
+    def __setstate__(self, state):
+        self.__init__(state["dictionary_dirpath"])
+
+    def encode(self, uris):
+        """
+        Returns the int32 IDs of the URIs, URIs that are not in the dictionary get the ID -1.
+        """
+        # each distinct URI is only hashed and looked up once
+        codes, uris = pd.factorize(np.asarray(uris, dtype=object), use_na_sentinel=False)
+        ids = np.full(len(uris), -1, dtype=np.int32)
+        if len(uris) > 0 and len(self) > 0:
+            hashes = hash_uris(uris)
+            positions = np.minimum(np.searchsorted(self.hashes, hashes), len(self) - 1)
+            found = np.flatnonzero(self.hashes[positions] == hashes)
+            found = found[hash_uris(uris[found], CHECK_HASH_KEY) == self.check_hashes[positions[found]]]
+            ids[found] = self.hash_ids[positions[found]]
+        return ids[codes]
+
+    def decode(self, ids):
+        """
+        Returns the URIs of the IDs as numpy array. Each distinct ID is decoded once.
+        """
+        inverse, unique_ids = pd.factorize(np.asarray(ids, dtype=np.int64).reshape(-1))
+        starts = self.offsets[unique_ids].tolist()
+        ends = self.offsets[unique_ids + 1].tolist()
+        blob = self.blob
+        uris = np.array([blob[start:end].tobytes().decode("utf-8") for start, end in zip(starts, ends)], dtype=object)
+        return uris[inverse]
+
+
+class UriEncoder:
+    """
+    Operator (see data_preprocessing_utility.run_pipeline) that replaces the URIs of a chunk with their IDs.
+    """
+
+    def __init__(self, uri_dictionary):
+        self.uri_dictionary = uri_dictionary
+
+    def __call__(self, chunk):
+        chunk = chunk.copy()
+        for col in chunk.columns:
+            ids = self.uri_dictionary.encode(chunk[col])
+            if (ids < 0).any():
+                raise ValueError(f"{(ids < 0).sum()} URIs in column {col} are not in the URI dictionary")
+            chunk[col] = ids
+        return chunk, {}
+
+
+def decode_triples(triples, uri_dictionary):
+    """
+    Replaces the IDs in a dataframe of encoded triples with their URIs.
+    """
+    triples = triples.copy()
+    for col in triples.columns:
+        triples[col] = uri_dictionary.decode(triples[col])
+    return triples
@@ -46,6 +46,8 @@ else
     ws_allocate $WORKSPACE_NAME 60
 
     # get RDF files
+    # lbzip2 or pbzip2 extract the bz2 dumps on all cores, bzip2 only uses one core (install lbzip2 if possible)
+    BZIP2=$(command -v lbzip2 || command -v pbzip2 || echo bzip2)
     cd $(ws_find $WORKSPACE_NAME)
     mkdir data
     cd data
@@ -55,22 +57,22 @@ else
     echo -e "\n[$(date +%T)] * Download wikilinks dataset...\n"
     curl -L -O https://databus.dbpedia.org/dbpedia/generic/wikilinks/2022.12.01/wikilinks_lang=en.ttl.bz2
     echo -e "\n[$(date +%T)] * Extract wikilinks dataset...\n"
-    bzip2 -d wikilinks_lang=en.ttl.bz2
+    $BZIP2 -d wikilinks_lang=en.ttl.bz2
     # cleaned object properties (en, 2022-12-01)
     echo -e "\n[$(date +%T)] * Download object properties dataset...\n"
     curl -L -O https://databus.dbpedia.org/dbpedia/mappings/mappingbased-objects/2022.12.01/mappingbased-objects_lang=en.ttl.bz2
     echo -e "\n[$(date +%T)] * Extract object properties dataset...\n"
-    bzip2 -d mappingbased-objects_lang=en.ttl.bz2
+    $BZIP2 -d mappingbased-objects_lang=en.ttl.bz2
     # types, specific inference (en, 2022-12-01)
     echo -e "\n[$(date +%T)] * Download instance types dataset (specific)...\n"
     curl -L -O https://databus.dbpedia.org/dbpedia/mappings/instance-types/2022.12.01/instance-types_inference=specific_lang=en.ttl.bz2
     echo -e "\n[$(date +%T)] * Extract instance types dataset (specific)...\n"
-    bzip2 -d instance-types_inference=specific_lang=en.ttl.bz2
+    $BZIP2 -d instance-types_inference=specific_lang=en.ttl.bz2
     # types, transitive inference (en, 2022-12-01)
     echo -e "\n[$(date +%T)] * Download instance types dataset (transitive)...\n"
     curl -L -O https://databus.dbpedia.org/dbpedia/mappings/instance-types/2022.12.01/instance-types_inference=transitive_lang=en.ttl.bz2
     echo -e "\n[$(date +%T)] * Extract instance types dataset (transitive)...\n"
-    bzip2 -d instance-types_inference=transitive_lang=en.ttl.bz2
+    $BZIP2 -d instance-types_inference=transitive_lang=en.ttl.bz2
     # ontology
     echo -e "\n[$(date +%T)] * Download ontology dataset...\n"
     curl -L -O https://databus.dbpedia.org/ontologies/dbpedia.org/ontology--DEV/2022.12.09-011003/ontology--DEV_type=parsed.nt
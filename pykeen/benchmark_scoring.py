@@ -0,0 +1,74 @@
+import sys
+import time
+import numpy as np
+import torch
+from pykeen.models import TransE
+from pykeen.triples import TriplesFactory
+from prediction_and_evaluation_utility import score_properties, score_properties_per_pair
+
+# Benchmark of the property scoring in prediction_and_evaluation_utility.py: scoring each entity pair with
+# predict_target (score_properties_per_pair) compared to scoring batches of pairs against all relations
+# (score_properties). The model is an untrained TransE model on random triples, as the scoring time doesn't depend on
+# the training. Run it with "python benchmark_scoring.py [n_pairs n_pairs_per_pair]" (CPU unless a GPU is available).
+
+
+def random_training_triples(n_triples=200000, n_entities=20000, n_properties=300, random_state=42):
+    """
+    Generates a triples factory of random triples with DBpedia-like URIs.
+    """
+    rng = np.random.default_rng(random_state)
+    entities = np.array([f"http://dbpedia.org/resource/Entity_{i}" for i in range(n_entities)], dtype=object)
+    properties = np.array([f"http://dbpedia.org/ontology/property{i}" for i in range(n_properties)], dtype=object)
+    triples = np.stack([
+        entities[rng.integers(0, n_entities, n_triples)],
+        properties[rng.integers(0, n_properties, n_triples)],
+        entities[rng.integers(0, n_entities, n_triples)]
+    ], axis=1).astype(str)
+    return TriplesFactory.from_labeled_triples(triples)
+
+
+def time_function(function, *args, **kwargs):
+    """
+    Returns the wall time in seconds of a single call of the function and its result.
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def benchmark_scoring(n_pairs=100000, n_pairs_per_pair=500, batch_size=4096, embedding_dim=256):
+    """
+    Compares the pairs per second of both scoring functions. The per-pair function only scores the first
+    n_pairs_per_pair pairs, as it is too slow for all pairs, and the scores of these pairs are compared.
+    """
+    training = random_training_triples()
+    model = TransE(triples_factory=training, embedding_dim=embedding_dim, random_seed=42)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = model.to(device)
+    relation_to_id_dict = training.relation_to_id
+    rng = np.random.default_rng(42)
+    entities = np.array(list(training.entity_to_id), dtype=object)
+    entity_pairs = np.stack([rng.choice(entities, n_pairs), rng.choice(entities, n_pairs)], axis=1)
+
+    per_pair_seconds, per_pair_scores = time_function(
+        score_properties_per_pair, entity_pairs[:n_pairs_per_pair], model, training, relation_to_id_dict
+    )
+    batched_seconds, batched_scores = time_function(
+        score_properties, entity_pairs, model, training, relation_to_id_dict, batch_size
+    )
+    props = batched_scores.columns[2:]
+    same = batched_scores[["subject", "object"]].iloc[:n_pairs_per_pair].equals(per_pair_scores[["subject", "object"]]) \
+        and np.allclose(
+            batched_scores[props].iloc[:n_pairs_per_pair].to_numpy(dtype=np.float64),
+            per_pair_scores[props].to_numpy(dtype=np.float64),
+            rtol=1e-4,
+            atol=1e-5
+        )
+    print(f"\nproperty scoring ({len(props)} properties, {device}, batch size {batch_size})\nmethod\t\tpairs\tseconds\tpairs per second")
+    print(f"per pair\t{n_pairs_per_pair}\t{per_pair_seconds:.3f}\t{n_pairs_per_pair / per_pair_seconds:.0f}")
+    print(f"batched\t\t{n_pairs}\t{batched_seconds:.3f}\t{n_pairs / batched_seconds:.0f}")
+    print(f"same result: {same}")
+
+
+if __name__ == "__main__":
+    benchmark_scoring(*[int(arg) for arg in sys.argv[1:3]])
@@ -1,7 +1,7 @@
 import sys
-import pandas as pd
 import numpy as np
 from prediction_and_evaluation_utility import find_thresholds
+from shared_utility import read_table, write_table
 
 # model name
 MODEL_NAME = sys.argv[1]
@@ -16,16 +16,16 @@ THRESHOLDS_BEFORE_FILTER_FILEPATH = f"{SCORES_DIR}thresholds_before_filter.csv"
 THRESHOLDS_AFTER_FILTER_FILEPATH = f"{SCORES_DIR}thresholds_after_filter.csv"
 
 # read scores and ground truth labels
-scores = pd.read_csv(VAL_PROPERTY_SCORES_FILEPATH)
-filter = pd.read_csv(VAL_FILTER_FILEPATH)
-labels = pd.read_csv(VAL_MATRIX_FILEPATH)
+scores = read_table(VAL_PROPERTY_SCORES_FILEPATH)
+filter = read_table(VAL_FILTER_FILEPATH)
+labels = read_table(VAL_MATRIX_FILEPATH)
 
 # calculate thresholds before applying the relation filter and save file
 thresholds_before_filter = find_thresholds(scores, labels, use_optuna=True, n_trials=300)
-thresholds_before_filter.to_csv(THRESHOLDS_BEFORE_FILTER_FILEPATH, index=False)
+write_table(thresholds_before_filter, THRESHOLDS_BEFORE_FILTER_FILEPATH)
 
 # calculate thresholds after applying the relation filter and save file
 props = np.setdiff1d(scores.columns, ["subject", "object"])
 scores[props] = filter[props] * scores[props]
 thresholds_after_filter = find_thresholds(scores, labels, use_optuna=True, n_trials=300)
-thresholds_after_filter.to_csv(THRESHOLDS_AFTER_FILTER_FILEPATH, index=False)
\ No newline at end of file
+write_table(thresholds_after_filter, THRESHOLDS_AFTER_FILTER_FILEPATH)
\ No newline at end of file
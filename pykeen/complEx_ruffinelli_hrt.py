@@ -1,7 +1,6 @@
 from pykeen.pipeline import pipeline
-from pykeen.triples import TriplesFactory
 from torch.nn.init import uniform_
-from pykeen_extensions import ComplexNegativeSampler, ComplEx_dropout_and_separate_regularizers
+from pykeen_extensions import ComplexNegativeSampler, ComplEx_dropout_and_separate_regularizers, load_triples_factories
 import torch
 
 # model name
@@ -11,26 +10,16 @@ MODEL_NAME = "complEx_ruffinelli_hrt"
 TRAIN_PATH = "../data/processed_data/train.tsv"
 VAL_PATH = "../data/processed_data/val.tsv"
 TEST_PATH = "../data/processed_data/test.tsv"
+# binary triples of the training, validation and test data (see create_binary_triples)
+BINARY_TRIPLES_DIR = "../data/processed_data/binary_triples"
 
 # results, tracker and checkpoint file paths
 RESULTS_DIR = f"../data/model_results/{MODEL_NAME}"
 RESULTS_TRACKER_PATH = f"{MODEL_NAME}.csv"
 CHECKPOINT_NAME = f"{MODEL_NAME}_checkpoint.pt"
 
-# create triple factories
-training = TriplesFactory.from_path(TRAIN_PATH)
-
-validation = TriplesFactory.from_path(
-    VAL_PATH,
-    entity_to_id=training.entity_to_id,
-    relation_to_id=training.relation_to_id,
-)
-
-testing = TriplesFactory.from_path(
-    TEST_PATH,
-    entity_to_id=training.entity_to_id,
-    relation_to_id=training.relation_to_id,
-)
+# create triple factories (from the binary triples if they are up to date)
+training, validation, testing = load_triples_factories(TRAIN_PATH, VAL_PATH, TEST_PATH, BINARY_TRIPLES_DIR)
 
 # overwrite torch dropout function so that pykeen is forced to use it
 original_torch_dropout = torch.nn.functional.dropout
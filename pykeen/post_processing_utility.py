@@ -1,8 +1,78 @@
+import hashlib
+import os
 import pandas as pd
 import numpy as np
+from scipy.sparse import csr_matrix
 from sklearn.metrics import accuracy_score, precision_score, recall_score
+from shared_utility import read_ntriples, update_entity_types_index, entity_types_index_version, EntityTypesIndex, instrumented
 
 
+SUBCLASS_OF = "http://www.w3.org/2000/01/rdf-schema#subClassOf"
+
+# compiled class hierarchies per ontology and expanded subclass relationships per (ontology, depth, blacklist)
+CLASS_HIERARCHY_CACHE = {}
+SUBCLASS_RELATIONSHIPS_CACHE = {}
+# entity types indexes per (index directory, name of the types dataset, version of the index)
+ENTITY_TYPES_INDEX_CACHE = {}
+
+
+class ClassHierarchy:
+    """
+    Subclass relationships of an ontology compiled to a sparse boolean adjacency matrix over integer class IDs
+    (one row per subclass, one column per direct superclass).
+
+    :param subclasses: dataframe containing the subClassOf triples of the ontology
+    :type subclasses: pd.DataFrame
+    """
+
+    def __init__(self, subclasses):
+        n_subclasses = len(subclasses)
+        ids, self.classes = pd.factorize(pd.concat([subclasses["subject"], subclasses["object"]], ignore_index=True))
+        self.superclasses = csr_matrix(
+            (np.ones(n_subclasses, dtype=bool), (ids[:n_subclasses], ids[n_subclasses:])),
+            shape=(len(self.classes), len(self.classes))
+        )
+
+    def expand_levels(self, depth_limit):
+        """
+        Yields the pairs of class IDs (subclass, superclass) whose shortest path has 1, 2, ... up to depth_limit
+        subclass relationships, one level at a time. The paths are followed by a breadth-first search from all classes
+        at once: the frontier contains the pairs at distance d, which are extended by one step and reduced to the
+        pairs that have not been reached before. The search stops early when no new pairs are reached.
+        """
+        reached = self.superclasses.copy()
+        frontier = self.superclasses
+        for depth in range(1, depth_limit + 1):
+            if depth > 1:
+                frontier = (frontier @ self.superclasses).astype(bool) > reached
+                if frontier.nnz == 0:
+                    return
+                reached = reached + frontier
+            frontier_pairs = frontier.tocoo()
+            yield frontier_pairs.row, frontier_pairs.col
+
+    def expand(self, depth_limit):
+        """
+        Returns the pairs of class IDs (subclass, superclass) that are connected by a path of 1 to depth_limit
+        subclass relationships (see expand_levels).
+        """
+        levels = list(self.expand_levels(depth_limit))
+        if len(levels) == 0:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        return np.concatenate([rows for rows, _ in levels]), np.concatenate([cols for _, cols in levels])
+
+
+def get_class_hierarchy(subclasses):
+    """
+    Returns the ClassHierarchy of the subClassOf triples, it is compiled once per ontology.
+    """
+    key = hashlib.sha1(pd.util.hash_pandas_object(subclasses[["subject", "object"]], index=False).to_numpy().tobytes()).hexdigest()
+    if key not in CLASS_HIERARCHY_CACHE:
+        CLASS_HIERARCHY_CACHE[key] = ClassHierarchy(subclasses)
+    return key, CLASS_HIERARCHY_CACHE[key]
+
+
+@instrumented
 def get_expanded_subclass_relationships(ontology_df, depth_limit=999, blacklist=[]):
     """
     This function recursively expands the subclass relationships in the ontology.
@@ -14,7 +84,8 @@ def get_expanded_subclass_relationships(ontology_df, depth_limit=999, blacklist=
     - Academic, subClassOf, Animal
     
     This procedure is repeated until no new subclass relationships can be added or for the specied number of recusions
-    (determined with depth_limit parameter).
+    (determined with depth_limit parameter). The class hierarchy is compiled to a sparse matrix once per ontology and
+    the results are cached per ontology, depth_limit and blacklist.
 
     :param ontology_df: dataframe containing ontology triples
     :type ontology_df: pd.DataFrame
@@ -24,67 +95,28 @@ def get_expanded_subclass_relationships(ontology_df, depth_limit=999, blacklist=
     :type_blacklist: list
     :return: dataframe containing pairs of subclass-superclass pairs
     """
-    subclasses = ontology_df[ontology_df["predicate"] == "http://www.w3.org/2000/01/rdf-schema#subClassOf"]
-    expanded_subclasses = subclasses.copy()
-    expanded_subclasses = expanded_subclasses.drop(columns="predicate")
-    expanded_subclasses = expanded_subclasses.rename(columns={"subject": "superclass0", "object": "superclass1"})
-    
-    # create chains of subclass relationships
-    expanded_classes = True
-    superclass_idx = 1
-    while expanded_classes == True and superclass_idx < depth_limit:
-        expanded_subclasses = expanded_subclasses.merge(subclasses, left_on=f"superclass{superclass_idx}", right_on="subject", how="left")
-        expanded_subclasses = expanded_subclasses.drop(columns=["predicate", "subject"])
-        superclass_idx += 1
-        expanded_subclasses = expanded_subclasses.rename(columns={"object": f"superclass{superclass_idx}"})
-        if (~expanded_subclasses[f"superclass{superclass_idx}"].isna()).sum() > 0:
-            expanded_classes = True
-        else:
-            expanded_classes = False
-        
-    # create every possible pair of subclass-class relations
-    expanded_subclass_pairs = pd.DataFrame()
-    for i in range(superclass_idx):
-        for j in range(i+1, superclass_idx+1):
-            subclass_col = f"superclass{i}"
-            superclass_col = f"superclass{j}"
-            pairs = expanded_subclasses[[subclass_col, superclass_col]]
-            pairs = pairs.rename(columns={subclass_col: "subclass", superclass_col: "superclass"})
-            pairs = pairs.dropna()
-            expanded_subclass_pairs = pd.concat([expanded_subclass_pairs, pairs], axis=0)
-            expanded_subclass_pairs = expanded_subclass_pairs.drop_duplicates()
-            expanded_subclass_pairs = expanded_subclass_pairs.reset_index(drop=True)
-
-    # remove blacklist types
-    expanded_subclass_pairs = expanded_subclass_pairs[~expanded_subclass_pairs["superclass"].isin(blacklist)]
-
-    return expanded_subclass_pairs
+    subclasses = ontology_df[ontology_df["predicate"] == SUBCLASS_OF]
+    ontology_key, class_hierarchy = get_class_hierarchy(subclasses)
+    # direct subclass relationships are always kept and paths longer than the number of classes add no pairs
+    depth_limit = min(max(depth_limit, 1), max(len(class_hierarchy.classes), 1))
+    key = (ontology_key, depth_limit, tuple(sorted(set(blacklist))))
+    if key not in SUBCLASS_RELATIONSHIPS_CACHE:
+        subclass_ids, superclass_ids = class_hierarchy.expand(depth_limit)
+        expanded_subclass_pairs = pd.DataFrame({
+            "subclass": class_hierarchy.classes[subclass_ids],
+            "superclass": class_hierarchy.classes[superclass_ids]
+        })
+        # remove blacklist types
+        expanded_subclass_pairs = expanded_subclass_pairs[~expanded_subclass_pairs["superclass"].isin(blacklist)]
+        SUBCLASS_RELATIONSHIPS_CACHE[key] = expanded_subclass_pairs.reset_index(drop=True)
 
+    return SUBCLASS_RELATIONSHIPS_CACHE[key].copy()
 
-def extract_domain_range_filter(
-    ontology_df,
-    filtered_property_types_df,
-    upwards_extension_depth_limit=999,
-    upwards_extension_blacklist=[]
-):
-    """
-    Creates two matrices that can be used for filtering relevant properties for subject and object entity type.
-    The filter is based on the domain and range restrictions in the ontology. The tolerated types (of the range
-    and domain) are first expanded downwards, meaning all subclasses of the type that is listed in the domain
-    or range restriction are tolerated as well. In an optional second step the tolerated types are expanded
-    upwards for a specified number of steps in the hierarchy (upwards_extension_depth_limit). To avoid this, set
-    the parameter to 0. In this upwards extension step, a blacklist can be provided to prevent too generic types
-    to be tolerated (e.g. owl:Thing).
 
-    :param ontology_df: dataframe containing the ontology triples
-    :type ontology_df: pd.DataFrame
-    :param filtered_property_types_df: dataframe containing the list of filtered property types
-    :type filtered_property_types_df: pd.DataFrame
-    :param upwards_extension_depth_limit: limits of the number of steps in the hierarchy that are followed upwards to extend the subclass relationships
-    :type upwards_extension_depth_limit: int
-    :param upwards_extension_blacklist: can be used to prevent too generic types from being introduced in the upwards expansion step
-    :type upwards_extension_blacklist: list
-    :return: two pandas dataframes containing the domain / range filter matrices
+def get_downwards_expanded_domain_range(ontology_df, filtered_property_types_df):
+    """
+    Returns the domain and range restriction triples of the filtered property types, expanded downwards with all
+    subclasses of the restricted types (see extract_domain_range_filter).
     """
     domain_range = ontology_df[
         (ontology_df["predicate"] == "http://www.w3.org/2000/01/rdf-schema#domain")
@@ -101,18 +133,29 @@ def extract_domain_range_filter(
     domain_range_downwards_expanded = domain_range_downwards_expanded.rename(columns={"subclass": "object"})
     domain_range = pd.concat([domain_range, domain_range_downwards_expanded])
     domain_range = domain_range.drop_duplicates()
-    # expand domain and range restrictions upwards with subclass relationships
-    if upwards_extension_depth_limit > 0:
-        expanded_subclass_relationships = get_expanded_subclass_relationships(
-            ontology_df,
-            depth_limit=upwards_extension_depth_limit,
-            blacklist=upwards_extension_blacklist
-        )
-        domain_range_upwards_expanded = domain_range.merge(expanded_subclass_relationships, left_on="object", right_on="subclass")
-        domain_range_upwards_expanded = domain_range_upwards_expanded.drop(columns=["object", "subclass"])
-        domain_range_upwards_expanded = domain_range_upwards_expanded.rename(columns={"superclass": "object"})
-        domain_range = pd.concat([domain_range, domain_range_upwards_expanded])
-        domain_range = domain_range.drop_duplicates()
+
+    return domain_range
+
+
+def expand_domain_range_upwards(domain_range, restrictions, subclass_pairs):
+    """
+    Adds the superclasses of the restricted types in restrictions (per subclass-superclass pair) to the domain and
+    range restriction triples in domain_range.
+    """
+    domain_range_upwards_expanded = restrictions.merge(subclass_pairs, left_on="object", right_on="subclass")
+    domain_range_upwards_expanded = domain_range_upwards_expanded.drop(columns=["object", "subclass"])
+    domain_range_upwards_expanded = domain_range_upwards_expanded.rename(columns={"superclass": "object"})
+    domain_range = pd.concat([domain_range, domain_range_upwards_expanded])
+    domain_range = domain_range.drop_duplicates()
+
+    return domain_range
+
+
+def get_domain_range_filter_matrices(domain_range):
+    """
+    Returns the domain and the range filter matrix (see extract_domain_range_filter) of domain and range restriction
+    triples.
+    """
     # create matrix for filtering relevant properties for each subject entity type
     domain_filter = domain_range[domain_range["predicate"] == "http://www.w3.org/2000/01/rdf-schema#domain"]
     domain_filter = domain_filter.drop(columns="predicate")
@@ -135,33 +178,224 @@ def extract_domain_range_filter(
     return domain_filter, range_filter
 
 
-def read_entity_types(triples_df, types_filepath):
+@instrumented
+def extract_domain_range_filter(
+    ontology_df,
+    filtered_property_types_df,
+    upwards_extension_depth_limit=999,
+    upwards_extension_blacklist=[]
+):
+    """
+    Creates two matrices that can be used for filtering relevant properties for subject and object entity type.
+    The filter is based on the domain and range restrictions in the ontology. The tolerated types (of the range
+    and domain) are first expanded downwards, meaning all subclasses of the type that is listed in the domain
+    or range restriction are tolerated as well. In an optional second step the tolerated types are expanded
+    upwards for a specified number of steps in the hierarchy (upwards_extension_depth_limit). To avoid this, set
+    the parameter to 0. In this upwards extension step, a blacklist can be provided to prevent too generic types
+    to be tolerated (e.g. owl:Thing).
+
+    :param ontology_df: dataframe containing the ontology triples
+    :type ontology_df: pd.DataFrame
+    :param filtered_property_types_df: dataframe containing the list of filtered property types
+    :type filtered_property_types_df: pd.DataFrame
+    :param upwards_extension_depth_limit: limits of the number of steps in the hierarchy that are followed upwards to extend the subclass relationships
+    :type upwards_extension_depth_limit: int
+    :param upwards_extension_blacklist: can be used to prevent too generic types from being introduced in the upwards expansion step
+    :type upwards_extension_blacklist: list
+    :return: two pandas dataframes containing the domain / range filter matrices
+    """
+    domain_range = get_downwards_expanded_domain_range(ontology_df, filtered_property_types_df)
+    # expand domain and range restrictions upwards with subclass relationships
+    if upwards_extension_depth_limit > 0:
+        expanded_subclass_relationships = get_expanded_subclass_relationships(
+            ontology_df,
+            depth_limit=upwards_extension_depth_limit,
+            blacklist=upwards_extension_blacklist
+        )
+        domain_range = expand_domain_range_upwards(domain_range, domain_range, expanded_subclass_relationships)
+
+    return get_domain_range_filter_matrices(domain_range)
+
+
+class DomainRangeFilter:
+    """
+    Domain and range filter matrices (see extract_domain_range_filter) compiled to packed bitsets with one bit per
+    property (in sorted order, 8 properties per byte). Each entity type has a domain and a range bitset, the bitsets of
+    an entity are the OR of the bitsets of its types and the bitset of an entity pair is the AND of the subject's domain
+    bitset and the object's range bitset. Properties without domain (or range) restrictions are set for every entity.
+
+    :param domain_filter: domain filter matrix (column entity_type and one column per restricted property)
+    :type domain_filter: pd.DataFrame
+    :param range_filter: range filter matrix (column entity_type and one column per restricted property)
+    :type range_filter: pd.DataFrame
+    :param properties: all properties of the filter
+    :type properties: list
+    """
+
+    def __init__(self, domain_filter, range_filter, properties):
+        self.properties = np.unique(properties)
+        self.domain_types, self.domain_type_bits, self.unrestricted_domain_bits = self.compile(domain_filter)
+        self.range_types, self.range_type_bits, self.unrestricted_range_bits = self.compile(range_filter)
+
+    def pack(self, matrix):
+        return np.packbits(np.asarray(matrix, dtype=bool), axis=-1, bitorder="little")
+
+    def unpack(self, bits):
+        """
+        Returns the boolean matrix (one column per property) of packed bitsets.
+        """
+        return np.unpackbits(bits, axis=-1, count=len(self.properties), bitorder="little").astype(bool)
+
+    def compile(self, filter_df):
+        """
+        Returns the entity types of a filter matrix, their bitsets and the bitset of the unrestricted properties. The
+        bitsets have an additional last row for entity types without restrictions.
+        """
+        restricted = np.isin(self.properties, filter_df.columns)
+        matrix = np.zeros((len(filter_df) + 1, len(self.properties)), dtype=bool)
+        matrix[:-1, restricted] = filter_df[self.properties[restricted]].to_numpy() == 1
+        matrix[:, ~restricted] = True
+        return pd.Index(filter_df["entity_type"]), self.pack(matrix), self.pack(~restricted)
+
+    def entity_bits(self, entities, entity_types, untyped_entities_fill_value=0):
+        """
+        Returns the domain and range bitsets of the entities (one row per entity). The bitsets of entities without
+        types have all restricted properties set to untyped_entities_fill_value.
+
+        :param entities: index of the entities
+        :type entities: pd.Index
+        :param entity_types: dataframe of pairs of entity and entity type
+        :type entity_types: pd.DataFrame
+        :param untyped_entities_fill_value: value of the restricted properties of entities without types (0 or 1)
+        :type untyped_entities_fill_value: int
+        :return: tuple of the packed domain and range bitsets
+        """
+        entity_ids = entities.get_indexer(entity_types["entity"])
+        entity_types = entity_types[entity_ids >= 0]
+        entity_ids = entity_ids[entity_ids >= 0]
+        order = np.argsort(entity_ids, kind="stable")
+        type_uris = entity_types["entity_type"].to_numpy()[order]
+        # types without restrictions get the ID -1, which is the last row of the bitsets
+        return self.combine_type_bits(
+            len(entities),
+            entity_ids[order],
+            self.domain_types.get_indexer(type_uris),
+            self.range_types.get_indexer(type_uris),
+            untyped_entities_fill_value
+        )
+
+    def combine_type_bits(self, n_entities, entity_ids, domain_rows, range_rows, untyped_entities_fill_value=0):
+        """
+        Returns the domain and range bitsets of n_entities entities from the bitset rows of their types, the sorted
+        entity_ids contain the entity of each type (row -1 for types without restrictions).
+        """
+        typed_entity_ids, starts = np.unique(entity_ids, return_index=True)
+        bits = []
+        for type_ids, type_bits, unrestricted_bits in [
+            (domain_rows, self.domain_type_bits, self.unrestricted_domain_bits),
+            (range_rows, self.range_type_bits, self.unrestricted_range_bits)
+        ]:
+            untyped_bits = unrestricted_bits if untyped_entities_fill_value == 0 else self.pack(np.ones(len(self.properties)))
+            entity_bits = np.tile(untyped_bits, (n_entities, 1))
+            if len(type_ids) > 0:
+                entity_bits[typed_entity_ids] = np.bitwise_or.reduceat(type_bits[type_ids], starts, axis=0)
+            bits.append(entity_bits)
+        return bits[0], bits[1]
+
+    def filter_pairs(self, domain_bits, range_bits, subject_ids, object_ids):
+        """
+        Returns the bitsets of the properties that are allowed for the entity pairs (subject_ids[i], object_ids[i]).
+        """
+        return domain_bits[subject_ids] & range_bits[object_ids]
+
+
+def get_entity_types_index(types_index_dirpath, types_index_name, types_filepath):
+    """
+    Returns the EntityTypesIndex of a types dataset. The index is updated if the file changed and kept in memory until
+    the index is rebuilt, so the URI dictionary is only loaded on the first lookup.
+    """
+    update_entity_types_index(types_index_dirpath, {types_index_name: types_filepath})
+    key = (os.path.abspath(types_index_dirpath), types_index_name, entity_types_index_version(types_index_dirpath))
+    if key not in ENTITY_TYPES_INDEX_CACHE:
+        ENTITY_TYPES_INDEX_CACHE[key] = EntityTypesIndex(types_index_dirpath, types_index_name)
+    return ENTITY_TYPES_INDEX_CACHE[key]
+
+
+@instrumented
+def read_entity_types(triples_df, types_filepath, types_index_dirpath=None, types_index_name="specific"):
     """
     Reads the file of type triples and filters entity types for all entities that are part of the
-    provided dataset (triples_df).
+    provided dataset (triples_df). With an entity types index directory, the types are looked up in the index
+    instead (see entity_types_utility.py), which is built once and rebuilt when the file changes.
     
     :param triples_df: dataframe of triples containing the entities whose types are returned
     :type triples_df: pd.DataFrame
     :param types_filepath: file path of the types dataset
     :type types_filepath: str
+    :param types_index_dirpath: directory of the entity types index, None reads the whole file
+    :type types_index_dirpath: str
+    :param types_index_name: name of the types dataset in the index
+    :type types_index_name: str
     :return: dataframe containing pairs of entity and entity type
     """
     entities = np.union1d(triples_df["subject"], triples_df["object"])
+    if types_index_dirpath is not None:
+        return get_entity_types_index(types_index_dirpath, types_index_name, types_filepath).lookup(entities)
+
     entities = pd.Series(entities, name="entity")
-    entity_types = pd.DataFrame()
-    for i, chunk in enumerate(pd.read_csv(types_filepath, sep=" ", header=None, names=["subject", "predicate", "object", "."], chunksize=200000)):
-        chunk = chunk.drop(columns=".")
-        # remove "<" and ">"
-        for col in chunk.columns:
-            chunk[col] = chunk[col].str[1:-1]
+    entity_types = []
+    for i, chunk in enumerate(read_ntriples(types_filepath, chunksize=200000)):
         chunk = chunk.drop(columns="predicate")
         chunk = chunk.rename(columns={"subject": "entity", "object": "entity_type"})
         chunk = chunk.merge(entities, on="entity")
-        entity_types = entity_types._append(chunk, ignore_index=True)
+        entity_types.append(chunk)
+    entity_types = pd.concat(entity_types, ignore_index=True) if len(entity_types) > 0 else pd.DataFrame(columns=["entity", "entity_type"])
     
     return entity_types
 
 
+def get_untyped_entities_fill_value(handle_untyped_entities):
+    """
+    Returns the filter value of restricted properties for untyped entities ("strict": 0, "flexible": 1) or None if
+    the argument is invalid.
+    """
+    if handle_untyped_entities == "strict":
+        return 0
+    if handle_untyped_entities == "flexible":
+        return 1
+    print('ERROR: handle_untyped_enities argument can only be "strict" or "flexible"')
+    return None
+
+
+def filter_entity_pairs(pairs, entity_types, domain_range_filter, untyped_entities_fill_value):
+    """
+    Returns the filter (see domain_range_filter_triples) of unique entity pairs (dataframe with subject and object).
+    """
+    # filter each entity pair once, with the bitsets of the entities' types
+    entities = pd.Index(np.union1d(pairs["subject"], pairs["object"]))
+    domain_bits, range_bits = domain_range_filter.entity_bits(entities, entity_types, untyped_entities_fill_value)
+    pair_bits = domain_range_filter.filter_pairs(
+        domain_bits,
+        range_bits,
+        entities.get_indexer(pairs["subject"]),
+        entities.get_indexer(pairs["object"])
+    )
+    # int8 columns (a view of the unpacked booleans) keep the filter 8 times smaller than int64 columns
+    triple_restrictions = pd.DataFrame(
+        domain_range_filter.unpack(pair_bits).view(np.int8),
+        columns=domain_range_filter.properties,
+        index=pairs.index
+    )
+    triple_restrictions = pd.concat([pairs, triple_restrictions], axis=1)
+
+    # sort rows
+    triple_restrictions = triple_restrictions.sort_values(["subject", "object"])
+    triple_restrictions = triple_restrictions.reset_index(drop=True)
+
+    return triple_restrictions
+
+
+@instrumented
 def domain_range_filter_triples(
         triples_df,
         specific_types_filepath,
@@ -169,7 +403,8 @@ def domain_range_filter_triples(
         filtered_property_types_df,
         handle_untyped_entities="strict",
         upwards_extension_depth_limit=999,
-        upwards_extension_blacklist=[]
+        upwards_extension_blacklist=[],
+        types_index_dirpath=None
     ):
     """
     Creates a matrix indicating which properties are relevant to a pair of entities (depending on their types).
@@ -192,18 +427,16 @@ def domain_range_filter_triples(
     :type upwards_extension_depth_limit: int
     :param upwards_extension_blacklist: can be used to prevent too generic types from being introduced in the upwards expansion step
     :type upwards_extension_blacklist: list
+    :param types_index_dirpath: directory of the entity types index (see read_entity_types), None reads the whole specific types file
+    :type types_index_dirpath: str
     :return: dataframe annotating which properties (columns) are relevant for a pair of entities (rows)
     """
-    if handle_untyped_entities == "strict":
-        untyped_entities_fill_value = 0
-    elif handle_untyped_entities == "flexible":
-        untyped_entities_fill_value = 1
-    else:
-        print('ERROR: handle_untyped_enities argument can only be "strict" or "flexible"')
+    untyped_entities_fill_value = get_untyped_entities_fill_value(handle_untyped_entities)
+    if untyped_entities_fill_value is None:
         return None
     
     # read entity types
-    entity_types = read_entity_types(triples_df, specific_types_filepath)
+    entity_types = read_entity_types(triples_df, specific_types_filepath, types_index_dirpath)
     
     # extract domain and range restrictions from ontology
     domain_filter, range_filter = extract_domain_range_filter(
@@ -212,80 +445,301 @@ def domain_range_filter_triples(
         upwards_extension_depth_limit=upwards_extension_depth_limit,
         upwards_extension_blacklist=upwards_extension_blacklist
     )
-    
-    # add entity types that don't appear in the domain restrictions and set their values to 0
-    remaining_entity_types = pd.DataFrame(columns=domain_filter.columns)
-    remaining_entity_types["entity_type"] = np.setdiff1d(entity_types["entity_type"].unique(), domain_filter["entity_type"])
-    remaining_entity_types = remaining_entity_types.fillna(0)
-    domain_filter = domain_filter._append(remaining_entity_types, ignore_index=True)
-    # add entity types that don't appear in the range restrictions and set their values to 0
-    remaining_entity_types = pd.DataFrame(columns=range_filter.columns)
-    remaining_entity_types["entity_type"] = np.setdiff1d(entity_types["entity_type"].unique(), range_filter["entity_type"])
-    remaining_entity_types = remaining_entity_types.fillna(0)
-    range_filter = range_filter._append(remaining_entity_types, ignore_index=True)
-    
-    # add properties without domain restricions and set to 1 for every entity type
-    no_domain_restrictions_props = np.setdiff1d(
-        filtered_property_types_df["filtered_property_types"].values,
-        np.setdiff1d(domain_filter.columns, ["entity_type"])
+    domain_range_filter = DomainRangeFilter(
+        domain_filter,
+        range_filter,
+        filtered_property_types_df["filtered_property_types"].values
     )
-    no_domain_restrictions_props = pd.DataFrame(index=domain_filter.index, columns=no_domain_restrictions_props)
-    no_domain_restrictions_props = no_domain_restrictions_props.fillna(1)
-    domain_filter = pd.concat([domain_filter, no_domain_restrictions_props], axis=1)
-    # add properties without range restricions and set to 1 for every entity type
-    no_range_restrictions_props = np.setdiff1d(
-        filtered_property_types_df["filtered_property_types"].values,
-        np.setdiff1d(range_filter.columns, ["entity_type"])
+
+    return filter_entity_pairs(
+        triples_df[["subject", "object"]].drop_duplicates(),
+        entity_types,
+        domain_range_filter,
+        untyped_entities_fill_value
     )
-    no_range_restrictions_props = pd.DataFrame(index=range_filter.index, columns=no_range_restrictions_props)
-    no_range_restrictions_props = no_range_restrictions_props.fillna(1)
-    range_filter = pd.concat([range_filter, no_range_restrictions_props], axis=1)
-
-    # merge with entity types and set possible property types to 1 if entity has at least one of the required entity types
-    entities_domain_filter = entity_types.merge(domain_filter, on="entity_type")
-    entities_domain_filter = entities_domain_filter.drop(columns="entity_type")
-    entities_domain_filter = entities_domain_filter.groupby("entity").max()
-    entities_domain_filter = entities_domain_filter.reset_index()
-    entities_range_filter = entity_types.merge(range_filter, on="entity_type")
-    entities_range_filter = entities_range_filter.drop(columns="entity_type")
-    entities_range_filter = entities_range_filter.groupby("entity").max()
-    entities_range_filter = entities_range_filter.reset_index()
-
-    # combine subject and object restrictions for each triple
-    subject_restrictions = triples_df["subject"].rename("entity").to_frame()
-    subject_restrictions = subject_restrictions.merge(entities_domain_filter, on="entity", how="left")
-    object_restrictions = triples_df["object"].rename("entity").to_frame()
-    object_restrictions = object_restrictions.merge(entities_range_filter, on="entity", how="left")
-    # fill rows of entities without types
-    subject_restrictions[no_domain_restrictions_props.columns] = subject_restrictions[no_domain_restrictions_props.columns].fillna(1)
-    object_restrictions[no_range_restrictions_props.columns] = object_restrictions[no_range_restrictions_props.columns].fillna(1)
-    subject_restrictions = subject_restrictions.fillna(untyped_entities_fill_value)
-    object_restrictions = object_restrictions.fillna(untyped_entities_fill_value)
-    triple_restrictions = subject_restrictions.add(object_restrictions)
-    # set property types to 1 if the range and domain restrictions are fullfilled, otherwise set to 0
-    prop_cols = np.setdiff1d(triple_restrictions.columns, ["entity"])
-    triple_restrictions[prop_cols] = triple_restrictions[prop_cols] == 2
-    triple_restrictions[prop_cols] = triple_restrictions[prop_cols].astype(int)
-    triple_restrictions = pd.concat([
-        triples_df[["subject", "object"]],
-        triple_restrictions[np.setdiff1d(triple_restrictions.columns, ["entity"])]
-    ], axis=1)
-
-    # drop duplicated rows
-    triple_restrictions = triple_restrictions.drop_duplicates()
-    # sort columns
-    cols = np.setdiff1d(triple_restrictions.columns, ["subject", "object"])
-    cols.sort()
-    cols = np.insert(cols, 0, "subject")
-    cols = np.insert(cols, 1, "object")
-    triple_restrictions = triple_restrictions.reindex(cols, axis=1)
-    # sort rows
-    triple_restrictions = triple_restrictions.sort_values(["subject", "object"])
-    triple_restrictions = triple_restrictions.reset_index(drop=True)
 
-    return triple_restrictions
+
+@instrumented
+def domain_range_filter_sweep(
+        triples_df,
+        specific_types_filepath,
+        ontology_df,
+        filtered_property_types_df,
+        upwards_extension_depth_limits,
+        handle_untyped_entities="strict",
+        upwards_extension_blacklist=[],
+        types_index_dirpath=None,
+        ground_truth=None
+    ):
+    """
+    Creates the filters of domain_range_filter_triples for several upwards extension depth limits at once. The entity
+    types, the entity pairs and the downwards expanded domain and range restrictions are only computed once and the
+    upwards expansion grows one level of the class hierarchy at a time (see ClassHierarchy.expand_levels), so each
+    depth only adds the superclasses at exactly this distance to the restrictions of the previous depth.
+
+    :param triples_df: triples for whose entity pairs the subsets of relevant property types are returned
+    :type triples_df: pd.DataFrame
+    :param specific_types_filepath: file path of the specific types dataset
+    :type specific_types_filepath: str
+    :param ontology_df: dataframe containing ontology triples
+    :type ontology_df: pd.DataFrame
+    :param filtered_property_types_df: dataframe containing list of filtered property types
+    :type filtered_property_types_df: pd.DataFrame
+    :param upwards_extension_depth_limits: depth limits of the upwards extension (see domain_range_filter_triples)
+    :type upwards_extension_depth_limits: list
+    :param handle_untyped_entities: "strict" or "flexible" (see domain_range_filter_triples)
+    :type handle_untyped_entities: str
+    :param upwards_extension_blacklist: can be used to prevent too generic types from being introduced in the upwards expansion step
+    :type upwards_extension_blacklist: list
+    :param types_index_dirpath: directory of the entity types index (see read_entity_types), None reads the whole specific types file
+    :type types_index_dirpath: str
+    :param ground_truth: ground truth data in matrix form, if provided the filters are evaluated (see evaluate_filter)
+    :type ground_truth: pd.DataFrame
+    :return: dictionary of depth limit and filter (or scores of the filter if ground_truth is provided)
+    """
+    untyped_entities_fill_value = get_untyped_entities_fill_value(handle_untyped_entities)
+    if untyped_entities_fill_value is None:
+        return None
+
+    # read entity types and extract downwards expanded domain and range restrictions once
+    entity_types = read_entity_types(triples_df, specific_types_filepath, types_index_dirpath)
+    pairs = triples_df[["subject", "object"]].drop_duplicates()
+    properties = filtered_property_types_df["filtered_property_types"].values
+    downwards_expanded = get_downwards_expanded_domain_range(ontology_df, filtered_property_types_df)
+    subclasses = ontology_df[ontology_df["predicate"] == SUBCLASS_OF]
+    _, class_hierarchy = get_class_hierarchy(subclasses)
+
+    def create_filter(domain_range):
+        domain_filter, range_filter = get_domain_range_filter_matrices(domain_range)
+        domain_range_filter = DomainRangeFilter(domain_filter, range_filter, properties)
+        filter = filter_entity_pairs(pairs, entity_types, domain_range_filter, untyped_entities_fill_value)
+        return filter if ground_truth is None else evaluate_filter(ground_truth, filter)
+
+    # grow the upwards expansion level by level and create the filter at each depth limit
+    depth_limits = sorted(set(upwards_extension_depth_limits))
+    levels = class_hierarchy.expand_levels(max(depth_limits[-1], 0))
+    domain_range = downwards_expanded
+    depth = 0
+    results = {}
+    filter = None
+    for depth_limit in depth_limits:
+        while depth < depth_limit:
+            level = next(levels, None)
+            if level is None:
+                break
+            subclass_ids, superclass_ids = level
+            depth += 1
+            print(f"upwards extension depth {depth}...")
+            level_subclass_pairs = pd.DataFrame({
+                "subclass": class_hierarchy.classes[subclass_ids],
+                "superclass": class_hierarchy.classes[superclass_ids]
+            })
+            level_subclass_pairs = level_subclass_pairs[~level_subclass_pairs["superclass"].isin(upwards_extension_blacklist)]
+            domain_range = expand_domain_range_upwards(domain_range, downwards_expanded, level_subclass_pairs)
+            filter = None
+        # the filter is only created again if a level was added since the previous depth limit
+        if filter is None:
+            filter = create_filter(domain_range)
+        results[depth_limit] = filter
+    
+    return {depth_limit: results[depth_limit] for depth_limit in upwards_extension_depth_limits}
+
+
+class RelationFilter:
+    """
+    In-process relation filter for single entity pairs or batches of pairs that are not part of a precomputed filter
+    file. It combines a compiled domain and range filter (see DomainRangeFilter) with an entity types index (see
+    entity_types_utility.py): the entity types are mapped to the dictionary IDs of the index once, so a lookup only
+    encodes the entities, gathers their type IDs and combines the bitsets of the types. The bitsets of single entities
+    are cached unpacked (up to cache_size entities), so repeated lookups of the same entities only take dictionary
+    lookups. The masks are aligned with the relation IDs of a model (relation_to_id), relations that are not filtered are
+    admissible for every pair.
+
+    :param domain_range_filter: compiled domain and range filter
+    :type domain_range_filter: DomainRangeFilter
+    :param types_index_dirpath: directory of the entity types index
+    :type types_index_dirpath: str
+    :param types_index_name: name of the types dataset in the index
+    :type types_index_name: str
+    :param relation_to_id: mapping of relation labels (property URIs) to relation IDs, defaults to the sorted properties of the filter
+    :type relation_to_id: dict
+    :param untyped_entities_fill_value: value of the restricted properties of entities without types (0 or 1)
+    :type untyped_entities_fill_value: int
+    :param cache_size: maximum number of entities whose bitsets are cached for single lookups
+    :type cache_size: int
+    """
+
+    def __init__(
+            self,
+            domain_range_filter,
+            types_index_dirpath,
+            types_index_name="specific",
+            relation_to_id=None,
+            untyped_entities_fill_value=0,
+            cache_size=100000
+        ):
+        self.domain_range_filter = domain_range_filter
+        self.properties = domain_range_filter.properties
+        self.types_index = EntityTypesIndex(types_index_dirpath, types_index_name)
+        self.uri_dictionary = self.types_index.uri_dictionary
+        self.untyped_entities_fill_value = untyped_entities_fill_value
+        # bitset rows of the entity types, ordered by their dictionary IDs
+        self.domain_type_ids, self.domain_rows = self.type_rows(domain_range_filter.domain_types)
+        self.range_type_ids, self.range_rows = self.type_rows(domain_range_filter.range_types)
+        # position of each relation ID in the properties, unfiltered relations point to an additional column of ones
+        if relation_to_id is None:
+            relation_to_id = {prop: i for i, prop in enumerate(self.properties)}
+        self.relation_to_id = relation_to_id
+        self.relation_columns = np.full(max(relation_to_id.values(), default=-1) + 1, len(self.properties), dtype=np.int64)
+        positions = pd.Index(self.properties).get_indexer(list(relation_to_id.keys()))
+        relation_ids = np.fromiter(relation_to_id.values(), dtype=np.int64, count=len(relation_to_id))
+        self.relation_columns[relation_ids[positions >= 0]] = positions[positions >= 0]
+        self.cache_size = cache_size
+        self.entity_masks_cache = {}
+
+    def type_rows(self, types):
+        """
+        Returns the sorted dictionary IDs of the entity types (of a filter matrix) and their rows in the bitsets.
+        """
+        type_ids = self.uri_dictionary.encode(types)
+        rows = np.arange(len(types))[type_ids >= 0]
+        type_ids = type_ids[type_ids >= 0]
+        order = np.argsort(type_ids)
+        return type_ids[order], rows[order]
+
+    def lookup_rows(self, type_ids, sorted_type_ids, rows):
+        """
+        Returns the bitset rows of type IDs, -1 (the row of types without restrictions) for types that aren't restricted.
+        """
+        if len(sorted_type_ids) == 0:
+            return np.full(len(type_ids), -1)
+        positions = np.minimum(np.searchsorted(sorted_type_ids, type_ids), len(sorted_type_ids) - 1)
+        return np.where(sorted_type_ids[positions] == type_ids, rows[positions], -1)
+
+    def entity_bits(self, entities):
+        """
+        Returns the packed domain and range bitsets of the entities (URIs).
+        """
+        positions, type_ids = self.types_index.lookup_ids(self.uri_dictionary.encode(entities))
+        return self.domain_range_filter.combine_type_bits(
+            len(entities),
+            positions,
+            self.lookup_rows(type_ids, self.domain_type_ids, self.domain_rows),
+            self.lookup_rows(type_ids, self.range_type_ids, self.range_rows),
+            self.untyped_entities_fill_value
+        )
+
+    def pair_bits(self, subjects, objects):
+        """
+        Returns the packed bitsets of the admissible properties of the pairs (subjects[i], objects[i]). Each entity is
+        looked up once per batch.
+        """
+        entity_ids, entities = pd.factorize(np.concatenate([np.asarray(subjects, dtype=object), np.asarray(objects, dtype=object)]))
+        domain_bits, range_bits = self.entity_bits(entities)
+        return self.domain_range_filter.filter_pairs(
+            domain_bits,
+            range_bits,
+            entity_ids[:len(subjects)],
+            entity_ids[len(subjects):]
+        )
+
+    def mask(self, subjects, objects):
+        """
+        Returns a boolean matrix with one row per pair (subjects[i], objects[i]) and one column per relation ID that
+        indicates which relations are admissible for the pair.
+        """
+        property_mask = self.domain_range_filter.unpack(self.pair_bits(subjects, objects))
+        property_mask = np.concatenate([property_mask, np.ones((len(property_mask), 1), dtype=bool)], axis=1)
+        return property_mask[:, self.relation_columns]
+
+    def cached_entity_masks(self, entity):
+        """
+        Returns the unpacked domain and range bitsets of a single entity with an additional last entry for unfiltered
+        relations, cached for repeated lookups.
+        """
+        if entity not in self.entity_masks_cache:
+            if len(self.entity_masks_cache) >= self.cache_size:
+                self.entity_masks_cache.clear()
+            domain_bits, range_bits = self.entity_bits([entity])
+            self.entity_masks_cache[entity] = (
+                np.append(self.domain_range_filter.unpack(domain_bits[0]), True),
+                np.append(self.domain_range_filter.unpack(range_bits[0]), True)
+            )
+        return self.entity_masks_cache[entity]
+
+    def pair_mask(self, subject, object):
+        """
+        Returns the boolean mask of the admissible relations (one entry per relation ID) of a single pair.
+        """
+        return (self.cached_entity_masks(subject)[0] & self.cached_entity_masks(object)[1])[self.relation_columns]
+
+    def admissible_properties(self, subject, object):
+        """
+        Returns the list of filtered properties that are admissible for a single pair.
+        """
+        property_mask = self.cached_entity_masks(subject)[0][:-1] & self.cached_entity_masks(object)[1][:-1]
+        return self.properties[property_mask].tolist()
+
+
+@instrumented
+def load_relation_filter(
+        ontology_df,
+        filtered_property_types_df,
+        types_index_dirpath,
+        types_index_name="specific",
+        relation_to_id=None,
+        handle_untyped_entities="strict",
+        upwards_extension_depth_limit=999,
+        upwards_extension_blacklist=[]
+    ):
+    """
+    Compiles the domain and range filter of the ontology (see extract_domain_range_filter) and returns a
+    RelationFilter that looks up the entity types in an entity types index. The index has to be built beforehand
+    (see update_entity_types_index).
+
+    :param ontology_df: dataframe containing ontology triples
+    :type ontology_df: pd.DataFrame
+    :param filtered_property_types_df: dataframe containing list of filtered property types
+    :type filtered_property_types_df: pd.DataFrame
+    :param types_index_dirpath: directory of the entity types index
+    :type types_index_dirpath: str
+    :param types_index_name: name of the types dataset in the index
+    :type types_index_name: str
+    :param relation_to_id: mapping of relation labels (property URIs) to relation IDs of the model
+    :type relation_to_id: dict
+    :param handle_untyped_entities: "strict" or "flexible" (see domain_range_filter_triples)
+    :type handle_untyped_entities: str
+    :param upwards_extension_depth_limit: limits of the number of steps in the hierarchy that are followed upwards to extend the subclass relationships
+    :type upwards_extension_depth_limit: int
+    :param upwards_extension_blacklist: can be used to prevent too generic types from being introduced in the upwards expansion step
+    :type upwards_extension_blacklist: list
+    :return: relation filter
+    """
+    untyped_entities_fill_value = get_untyped_entities_fill_value(handle_untyped_entities)
+    if untyped_entities_fill_value is None:
+        return None
+
+    domain_filter, range_filter = extract_domain_range_filter(
+        ontology_df,
+        filtered_property_types_df,
+        upwards_extension_depth_limit=upwards_extension_depth_limit,
+        upwards_extension_blacklist=upwards_extension_blacklist
+    )
+    domain_range_filter = DomainRangeFilter(
+        domain_filter,
+        range_filter,
+        filtered_property_types_df["filtered_property_types"].values
+    )
+    return RelationFilter(
+        domain_range_filter,
+        types_index_dirpath,
+        types_index_name,
+        relation_to_id,
+        untyped_entities_fill_value
+    )
 
 
+@instrumented
 def evaluate_filter(ground_truth, filter):
     """
     Returns a pandas dataframe containing accuracy, precision and recall of a domain and range filter
@@ -303,6 +757,6 @@ def evaluate_filter(ground_truth, filter):
         scores.loc[prop, "accuracy"] = accuracy_score(ground_truth[prop], filter[prop])
         scores.loc[prop, "precision"] = precision_score(ground_truth[prop], filter[prop])
         scores.loc[prop, "recall"] = recall_score(ground_truth[prop], filter[prop])
-    scores = scores._append(scores.mean().rename("mean"))
+    scores = pd.concat([scores, scores.mean().rename("mean").to_frame().T])
     
     return scores
\ No newline at end of file
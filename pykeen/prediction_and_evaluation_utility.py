@@ -1,13 +1,17 @@
 import pandas as pd
 import numpy as np
+import torch
 from pykeen.predict import predict_target
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 import optuna
+from shared_utility import read_table
 
 
-def score_properties(entity_pairs, model, triples_factory, relation_to_id_dict):
+def score_properties(entity_pairs, model, triples_factory, relation_to_id_dict, batch_size=4096):
     """
-    This function computes scores of all properties for all suplied entity pairs.
+    This function computes scores of all properties for all suplied entity pairs. The entity pairs are mapped to IDs
+    up front and each forward pass scores a batch of pairs against all relations (the model's predict_r, which uses
+    score_r and applies the same sigmoid as predict_target). The scores are written to a preallocated float32 matrix.
 
     :param entity_pairs: list containing tuples of entity pairs
     :type entity_pairs: list
@@ -17,11 +21,56 @@ def score_properties(entity_pairs, model, triples_factory, relation_to_id_dict):
     :type triples_factory: pykeen triples factory
     :param relation_to_id_dict: dictionary containing mappings of relation IDs to names
     :type relation_to_id_dict: dict
+    :param batch_size: number of entity pairs that are scored per forward pass
+    :type batch_size: int
     :return: pandas dataframe containing the subject-object pair and scores for all property types
     """
-    # initiate empty dataframe for storing scores
-    scores = pd.DataFrame()
-    # iterate over provided subject-object pairs and predict scores for all properties
+    entity_pairs = np.asarray(entity_pairs, dtype=object).reshape(-1, 2)
+    # map entity pairs to IDs
+    entity_to_id = pd.Series(triples_factory.entity_to_id)
+    entity_ids = pd.Index(entity_to_id.index).get_indexer(entity_pairs.ravel())
+    if (entity_ids < 0).any():
+        unknown_entities = np.unique(entity_pairs.ravel()[entity_ids < 0]).tolist()
+        raise KeyError(f"{len(unknown_entities)} entities are not part of the training triples: {unknown_entities}")
+    ht_ids = torch.as_tensor(entity_to_id.to_numpy()[entity_ids].reshape(-1, 2), dtype=torch.long)
+
+    # score batches of pairs against all relations
+    scores = np.empty((len(entity_pairs), model.num_relations), dtype=np.float32)
+    model.eval()
+    with torch.inference_mode():
+        for start in range(0, len(entity_pairs), batch_size):
+            ht_batch = ht_ids[start:start + batch_size].to(model.device)
+            scores[start:start + batch_size] = model.predict_r(ht_batch).float().cpu().numpy()
+
+    # replace property IDs with names and sort columns
+    id_to_relation = {val: key for key, val in relation_to_id_dict.items()}
+    relations = np.array([id_to_relation.get(i, i) for i in range(model.num_relations)], dtype=object)
+    order = np.argsort(relations.astype(str), kind="stable")
+    scores = pd.DataFrame(scores[:, order], columns=relations[order])
+    scores.insert(0, "subject", entity_pairs[:, 0])
+    scores.insert(1, "object", entity_pairs[:, 1])
+
+    return scores
+
+
+def score_properties_per_pair(entity_pairs, model, triples_factory, relation_to_id_dict):
+    """
+    This function computes scores of all properties for all suplied entity pairs with one prediction per pair
+    (pykeen's predict_target). It is kept as reference for score_properties (see benchmark_scoring.py).
+
+    :param entity_pairs: list containing tuples of entity pairs
+    :type entity_pairs: list
+    :param model: model that is used to generate scores
+    :type model: pykeen model
+    :param triples_factory: triples factory that was used to train the model
+    :type triples_factory: pykeen triples factory
+    :param relation_to_id_dict: dictionary containing mappings of relation IDs to names
+    :type relation_to_id_dict: dict
+    :return: pandas dataframe containing the subject-object pair and scores for all property types
+    """
+    # iterate over provided subject-object pairs and predict scores for all properties, the rows are collected
+    # and the dataframe is created once
+    rows = []
     for subject, object in entity_pairs:
         pred = predict_target(
             model=model,
@@ -29,11 +78,12 @@ def score_properties(entity_pairs, model, triples_factory, relation_to_id_dict):
             tail=object,
             triples_factory=triples_factory
         )
-        pred = pred.df
-        pred = pred["score"]
-        pred = pred._append(pd.Series({"subject": subject, "object": object}))
-        scores = scores._append(pred, ignore_index=True)
-    
+        row = pred.df["score"].to_dict()
+        row["subject"] = subject
+        row["object"] = object
+        rows.append(row)
+    scores = pd.DataFrame(rows)
+
     # replace property IDs with names
     scores = scores.rename(columns={val: key for key, val in relation_to_id_dict.items()})
     # sort columns
@@ -51,11 +101,11 @@ def true_properties_matrix(filepath):
     This funtion generates a pandas dataframe containing a row for each entity pair and a column for each property type in the provided dataset.
     If an entity pair is linked with a property the corresponding field contains a 1 otherwise a 0.
 
-    :param filepath: file path to a TSV file containing triples that are used to generate the matrix
+    :param filepath: file path to a TSV (or Parquet / Arrow) file containing triples that are used to generate the matrix
     :type filepath: str
     :return: pandas dataframe containing property occurences
     """
-    true_props = pd.read_csv(filepath, sep="\t", names=["subject", "predicate", "object"])
+    true_props = read_table(filepath, sep="\t", names=["subject", "predicate", "object"])
     true_props["dummy"] = 1
     true_props = true_props.pivot_table(index=["subject", "object"], columns="predicate", values="dummy")
     true_props = true_props.fillna(0)
@@ -8,7 +8,9 @@ from pykeen.nn import TransEInteraction, ComplExInteraction
 from pykeen.nn.init import xavier_uniform_, xavier_uniform_norm_
 from pykeen.regularizers import Regularizer
 from pykeen.typing import Constrainer, Initializer
+from pykeen.triples import TriplesFactory
 from typing import Optional
+from shared_utility import read_binary_triples, binary_triples_up_to_date
 
 
 class ComplexNegativeSampler(NegativeSampler):
@@ -144,4 +146,84 @@ class ComplEx_dropout_and_separate_regularizers(ERModel):
                 dropout=relation_dropout,
             ),
             **kwargs,
-        )
\ No newline at end of file
+        )
+
+
+def load_triples_factories(train_path, val_path, test_path, binary_dirpath=None):
+    """
+    Creates the training, validation and testing triples factories. If the binary triples in binary_dirpath were
+    created from the current TSV files (see data_preprocessing_utility.create_binary_triples), the factories are
+    created from the memory-mapped binary triples, which is a lot faster than TriplesFactory.from_path. Otherwise the
+    TSV files are parsed. In both cases the validation and testing factories use the mappings of the training factory.
+
+    :param train_path: file path of the training set
+    :type train_path: str
+    :param val_path: file path of the validation set
+    :type val_path: str
+    :param test_path: file path of the testing set
+    :type test_path: str
+    :param binary_dirpath: directory of the binary triples
+    :type binary_dirpath: str
+    :return: tuple of the training, validation and testing triples factories
+    """
+    filepaths = {"train": train_path, "val": val_path, "test": test_path}
+    if binary_dirpath is not None and binary_triples_up_to_date(binary_dirpath, filepaths):
+        mapped_triples, entity_to_id, relation_to_id = read_binary_triples(binary_dirpath)
+        return tuple(
+            TriplesFactory(
+                mapped_triples=torch.from_numpy(mapped_triples[split]),
+                entity_to_id=entity_to_id,
+                relation_to_id=relation_to_id,
+            )
+            for split in ["train", "val", "test"]
+        )
+
+    print("binary triples are missing or outdated, the TSV files are parsed")
+    training = TriplesFactory.from_path(train_path)
+    validation = TriplesFactory.from_path(
+        val_path,
+        entity_to_id=training.entity_to_id,
+        relation_to_id=training.relation_to_id,
+    )
+    testing = TriplesFactory.from_path(
+        test_path,
+        entity_to_id=training.entity_to_id,
+        relation_to_id=training.relation_to_id,
+    )
+    return training, validation, testing
+
+
+def load_training_triples_factory(train_path, entity_to_id, relation_to_id, binary_dirpath=None):
+    """
+    Creates the training triples factory with the mappings of a trained model, from the binary triples if they were
+    created from the current training set (see load_triples_factories) or by parsing the TSV file.
+
+    :param train_path: file path of the training set
+    :type train_path: str
+    :param entity_to_id: mapping of entity labels to IDs of the model
+    :type entity_to_id: dict
+    :param relation_to_id: mapping of relation labels to IDs of the model
+    :type relation_to_id: dict
+    :param binary_dirpath: directory of the binary triples
+    :type binary_dirpath: str
+    :return: triples factory
+    """
+    if binary_dirpath is not None and binary_triples_up_to_date(binary_dirpath, {"train": train_path}):
+        mapped_triples, entity_to_id, relation_to_id = read_binary_triples(
+            binary_dirpath,
+            splits=["train"],
+            entity_to_id=entity_to_id,
+            relation_to_id=relation_to_id
+        )
+        return TriplesFactory(
+            mapped_triples=torch.from_numpy(mapped_triples["train"]),
+            entity_to_id=entity_to_id,
+            relation_to_id=relation_to_id,
+        )
+
+    print("binary triples are missing or outdated, the TSV file is parsed")
+    return TriplesFactory.from_path(
+        path=train_path,
+        entity_to_id=entity_to_id,
+        relation_to_id=relation_to_id,
+    )
@@ -2,8 +2,9 @@ import sys
 import os
 import pandas as pd
 import torch
-from pykeen.triples import TriplesFactory
+from pykeen_extensions import load_training_triples_factory
 from prediction_and_evaluation_utility import true_properties_matrix, score_properties
+from shared_utility import read_table, write_table
 
 # model name
 MODEL_NAME = sys.argv[1]
@@ -12,6 +13,7 @@ MODEL_NAME = sys.argv[1]
 TRAIN_PATH = "../data/processed_data/train.tsv"
 VAL_PATH = "../data/processed_data/val.tsv"
 TEST_PATH = "../data/processed_data/test.tsv"
+BINARY_TRIPLES_DIR = "../data/processed_data/binary_triples"
 TEST_UNLABELED_FILEPATH = "../data/processed_data/test_unlabeled.tsv"
 VAL_MATRIX_FILEPATH = "../data/processed_data/val_matrix.csv"
 TEST_MATRIX_FILEPATH = "../data/processed_data/test_matrix.csv"
@@ -30,22 +32,22 @@ if not os.path.isdir(SCORES_DIR):
 
 # load validation matrix file or create it if it doesn't exist yet
 if os.path.isfile(VAL_MATRIX_FILEPATH):
-    true_properties_val = pd.read_csv(VAL_MATRIX_FILEPATH)
+    true_properties_val = read_table(VAL_MATRIX_FILEPATH)
 else:
     true_properties_val = true_properties_matrix(VAL_PATH)
-    true_properties_val.to_csv(VAL_MATRIX_FILEPATH, index=False)
+    write_table(true_properties_val, VAL_MATRIX_FILEPATH)
 
 # load testing matrix file or create it if it doesn't exist yet
 if os.path.isfile(TEST_MATRIX_FILEPATH):
-    true_properties_test = pd.read_csv(TEST_MATRIX_FILEPATH)
+    true_properties_test = read_table(TEST_MATRIX_FILEPATH)
 else:
     true_properties_test = true_properties_matrix(TEST_PATH)
-    true_properties_test.to_csv(TEST_MATRIX_FILEPATH, index=False)
+    write_table(true_properties_test, TEST_MATRIX_FILEPATH)
 
 # take entity pairs from validation and testing sets
 entity_pairs_val = true_properties_val[["subject", "object"]].to_numpy()
 entity_pairs_test = true_properties_test[["subject", "object"]].to_numpy()
-entity_pairs_test_unlabeled = pd.read_csv(TEST_UNLABELED_FILEPATH, sep="\t", names=["subject", "predicate", "object"])
+entity_pairs_test_unlabeled = read_table(TEST_UNLABELED_FILEPATH, sep="\t", names=["subject", "predicate", "object"])
 entity_pairs_test_unlabeled = entity_pairs_test_unlabeled[["subject", "object"]].to_numpy()
 
 # load training triples factory and model
@@ -53,21 +55,22 @@ entity_to_id_dict = pd.read_csv(ENTITY_TO_ID_FILEPATH, compression="gzip", sep="
 entity_to_id_dict = dict(zip(entity_to_id_dict["label"], entity_to_id_dict["id"]))
 relation_to_id_dict = pd.read_csv(RELATION_TO_ID_FILEPATH, compression="gzip", sep="\t")
 relation_to_id_dict = dict(zip(relation_to_id_dict["label"], relation_to_id_dict["id"]))
-training = TriplesFactory.from_path(
-    path=TRAIN_PATH,
+training = load_training_triples_factory(
+    TRAIN_PATH,
     entity_to_id=entity_to_id_dict,
     relation_to_id=relation_to_id_dict,
+    binary_dirpath=BINARY_TRIPLES_DIR,
 )
 model = torch.load(MODEL_FILEPATH)
 
 # generate property scores for validation set
 property_scores_val = score_properties(entity_pairs_val, model, training, relation_to_id_dict)
-property_scores_val.to_csv(VAL_PROPERTY_SCORES_FILEPATH, index=False)
+write_table(property_scores_val, VAL_PROPERTY_SCORES_FILEPATH)
 
 # generate property scores for testing set
 property_scores_test = score_properties(entity_pairs_test, model, training, relation_to_id_dict)
-property_scores_test.to_csv(TEST_PROPERTY_SCORES_FILEPATH, index=False)
+write_table(property_scores_test, TEST_PROPERTY_SCORES_FILEPATH)
 
 # generate property scores for unlabeled testing set
 property_scores_test_unlabeled = score_properties(entity_pairs_test_unlabeled, model, training, relation_to_id_dict)
-property_scores_test_unlabeled.to_csv(TEST_UNLABELED_PROPERTY_SCORES_FILEPATH, index=False)
\ No newline at end of file
+write_table(property_scores_test_unlabeled, TEST_UNLABELED_PROPERTY_SCORES_FILEPATH)
\ No newline at end of file
@@ -0,0 +1,14 @@
+import os
+import sys
+
+# The readers and writers of the CSV, Parquet and Arrow files, the binary triples, the entity types index and the
+# instrumentation are shared with the data preprocessing. This is the only module that adds data_preprocessing/ to the
+# module search path, the modules and scripts in this folder import the shared functions from here.
+DATA_PREPROCESSING_DIRPATH = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data_preprocessing"))
+if DATA_PREPROCESSING_DIRPATH not in sys.path:
+    sys.path.append(DATA_PREPROCESSING_DIRPATH)
+
+from io_utility import read_table, write_table, read_ntriples
+from data_preprocessing_utility import read_binary_triples, binary_triples_up_to_date
+from entity_types_utility import update_entity_types_index, entity_types_index_version, EntityTypesIndex
+from instrumentation_utility import instrumented